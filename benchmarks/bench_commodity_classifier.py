@@ -0,0 +1,105 @@
+"""
+Benchmark: keyword classifier vs the original CASE expression of dim_product.
+
+Generates synthetic products (category list + ingredient text) and reports
+throughput of the former `LOWER(category) LIKE '%...%'` CASE in DuckDB and
+of classify_products() (weighted multi-label, with negations), each on the
+same inputs: the first category only (what the CASE used to read), then
+the full categories and ingredients. The classifier also runs on a process
+pool for the full text.
+
+    uv run python -m benchmarks.bench_commodity_classifier --products 500000
+"""
+import argparse
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from src.transform.commodity_classifier import classify_products
+
+CATEGORY_TERMS = ["Snacks", "Snacks sucrés", "Chocolats noirs", "Cafés moulus", "Pains de mie", "Boissons",
+                  "Eaux minérales", "Céréales pour petit-déjeuner", "Biscuits", "Confitures", "Produits laitiers",
+                  "Fromages", "Plats préparés", "Pâtes alimentaires", "Sauces", "Bonbons"]
+INGREDIENT_TERMS = ["sucre", "farine de blé", "eau", "sel", "huile de tournesol", "lait écrémé en poudre",
+                    "beurre de cacao", "pâte de cacao", "café", "sirop de glucose", "levure", "arômes",
+                    "émulsifiant (lécithine de soja)", "oeufs", "amidon de maïs", "tomates", "crème"]
+
+LEGACY_CASE = """
+    CASE
+        WHEN LOWER(category) LIKE '%chocolate%'
+          OR LOWER(category) LIKE '%cacao%'
+          OR LOWER(category) LIKE '%cocoa%'       THEN 'Cocoa'
+        WHEN LOWER(category) LIKE '%coffee%'
+          OR LOWER(category) LIKE '%café%'        THEN 'Coffee'
+        WHEN LOWER(category) LIKE '%sugar%'
+          OR LOWER(category) LIKE '%sucre%'
+          OR LOWER(category) LIKE '%confiture%'
+          OR LOWER(category) LIKE '%bonbon%'
+          OR LOWER(category) LIKE '%candy%'       THEN 'Sugar'
+        WHEN LOWER(category) LIKE '%bread%'
+          OR LOWER(category) LIKE '%pain%'
+          OR LOWER(category) LIKE '%cereal%'
+          OR LOWER(category) LIKE '%céréal%'
+          OR LOWER(category) LIKE '%flour%'
+          OR LOWER(category) LIKE '%farine%'
+          OR LOWER(category) LIKE '%wheat%'
+          OR LOWER(category) LIKE '%biscuit%'     THEN 'Wheat'
+        ELSE 'Other'
+    END
+"""
+
+
+def make_products(n, seed=3):
+    """Synthetic OFF-like products with 2-4 categories and 4-10 ingredients each."""
+    rng = np.random.default_rng(seed)
+    categories = [", ".join(rng.choice(CATEGORY_TERMS, rng.integers(2, 5), replace=False)) for _ in range(n)]
+    ingredients = [", ".join(rng.choice(INGREDIENT_TERMS, rng.integers(4, 11), replace=False)) for _ in range(n)]
+    return pd.DataFrame({
+        "product_id": [str(i) for i in range(n)],
+        "category": [c.split(",")[0] for c in categories],
+        "categories": categories,
+        "ingredients_text": ingredients,
+    })
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    text_mb = (products["categories"].str.len().sum() + products["ingredients_text"].str.len().sum()) / 1e6
+    print(f"{args.products:,} products, {text_mb:.0f} MB of category + ingredient text")
+
+    con = duckdb.connect()
+    con.register("products", products)
+    first_category = products[["product_id"]].assign(categories=products["category"])
+    full_text = "LOWER(categories || ' ' || ingredients_text)"
+    runs = [
+        ("CASE LIKE, first category", lambda: con.execute(f"SELECT product_id, {LEGACY_CASE} FROM products").df()),
+        ("classifier, first category", lambda: classify_products(first_category, workers=1)),
+        ("CASE LIKE, full text", lambda: con.execute(
+            f"SELECT product_id, {LEGACY_CASE.replace('LOWER(category)', full_text)} FROM products").df()),
+        ("classifier, full text", lambda: classify_products(products, workers=1)),
+        ("classifier, full text, pool", lambda: classify_products(products, workers=args.workers)),
+    ]
+
+    print(f"{'method':<34}{'time (s)':>10}{'products/s':>14}")
+    for label, run in runs:
+        bridge, t = _timed(run)
+        print(f"{label:<34}{t:>10.2f}{args.products / t:>14,.0f}")
+    labels = bridge.groupby("product_id").size()
+    print(f"{len(bridge):,} bridge rows, {labels.gt(1).mean():.0%} of products with several commodities")
+
+
+if __name__ == "__main__":
+    main()
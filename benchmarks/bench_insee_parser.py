@@ -0,0 +1,95 @@
+"""
+Benchmark: streaming SDMX parser vs the original ElementTree parser.
+
+Generates a synthetic StructureSpecificData payload (many idbanks × monthly
+observations) and reports parse time and peak Python memory for both.
+
+    uv run python -m benchmarks.bench_insee_parser --series 400 --months 300
+"""
+import argparse
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+from src.extract.insee_api import parse_sdmx_observations
+
+
+def make_payload(n_series, n_months):
+    """Synthetic INSEE-style SDMX payload and its series map."""
+    series_map = {f"{1763000 + i:09d}": f"Category {i}" for i in range(n_series)}
+    periods = pd.period_range("2000-01", periods=n_months, freq="M").strftime("%Y-%m")
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<message:StructureSpecificData xmlns:message="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message" '
+        'xmlns:ss="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/data/structurespecific">'
+        '<message:DataSet ss:dataScope="DataStructure">'
+    ]
+    for i, idbank in enumerate(series_map):
+        parts.append(f'<Series IDBANK="{idbank}" FREQ="M" TITLE_FR="Serie {i}" UNIT_MEASURE="SO">')
+        parts.extend(
+            f'<Obs TIME_PERIOD="{p}" OBS_VALUE="{100 + (i + j) % 50 * 0.37:.2f}" OBS_STATUS="A" OBS_QUAL="DEF"/>'
+            for j, p in enumerate(periods)
+        )
+        parts.append("</Series>")
+    parts.append("</message:DataSet></message:StructureSpecificData>")
+    return "".join(parts).encode("utf-8"), series_map
+
+
+def legacy_parse(content, series_map):
+    """The pre-streaming parser from fetch_insee_cpi, kept for comparison."""
+    root = ET.fromstring(content)
+    records = []
+    current_idbank = None
+    for el in root.iter():
+        tag = el.tag.split("}")[-1] if "}" in el.tag else el.tag
+        if tag == "Series":
+            current_idbank = el.attrib.get("IDBANK")
+            current_category = series_map.get(current_idbank, f"Unknown ({current_idbank})")
+        elif tag == "Obs":
+            period = el.attrib.get("TIME_PERIOD")
+            value = el.attrib.get("OBS_VALUE")
+            if period and value and current_idbank in series_map:
+                records.append({
+                    "date": period,
+                    "cpi_index": float(value),
+                    "category": current_category,
+                    "idbank": current_idbank,
+                })
+    df = pd.DataFrame(records)
+    df["date"] = pd.to_datetime(df["date"], format="mixed")
+    return df
+
+
+def _measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--series", type=int, default=400)
+    parser.add_argument("--months", type=int, default=300)
+    args = parser.parse_args()
+
+    content, series_map = make_payload(args.series, args.months)
+    print(f"Payload: {len(content) / 1e6:.1f} MB, {args.series * args.months:,} observations")
+
+    old, old_t, old_mem = _measure(legacy_parse, content, series_map)
+    new, new_t, new_mem = _measure(parse_sdmx_observations, content, series_map)
+    pd.testing.assert_frame_equal(old, new, check_dtype=False)
+
+    print(f"{'parser':<12}{'time (s)':>10}{'peak MB':>10}")
+    print(f"{'legacy':<12}{old_t:>10.2f}{old_mem / 1e6:>10.1f}")
+    print(f"{'streaming':<12}{new_t:>10.2f}{new_mem / 1e6:>10.1f}")
+    print(f"speed-up ×{old_t / new_t:.1f}, memory ×{old_mem / new_mem:.1f} lower")
+
+
+if __name__ == "__main__":
+    main()
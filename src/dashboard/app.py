@@ -1,20 +1,14 @@
 """
 European FMCG Cost Pressure Monitor — Main Dash Application.
 Reads from DuckDB-processed Parquet mart files and serves an interactive,
-multi-page dashboard.
+multi-page dashboard. Run from the repository root:
+
+    python -m src.dashboard.app
 """
 import os
 import dash
-from dash import dcc, html, Input, Output
+from dash import html
 import dash_bootstrap_components as dbc
-import pandas as pd
-
-# ── Data Loading ─────────────────────────────────────────────────────────
-MARTS = os.path.join(os.path.dirname(__file__), "..", "..", "data", "marts")
-
-def load(filename):
-    return pd.read_parquet(os.path.join(MARTS, filename))
-
 
 # ── App Init ─────────────────────────────────────────────────────────────
 app = dash.Dash(
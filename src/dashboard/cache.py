@@ -0,0 +1,142 @@
+"""
+Memoisation of dashboard callbacks, keyed by their inputs and the versions
+of the marts they read (src.dashboard.data.mart_version).
+
+Results are kept in an in-process LRU of `maxsize` entries, optionally
+expiring after `ttl` seconds. When FMCG_DASH_CACHE_DIR is set (or
+`cache_dir` is given), results are also pickled to that directory, so every
+worker of a multi-process server reuses them. A rebuilt mart changes its
+version, hence the key: stale results are never served, they just age out
+(the directory keeps the `disk_maxsize` most recently written entries).
+"""
+import functools
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from src.dashboard.data import mart_version
+
+CACHE_DIR_ENV = "FMCG_DASH_CACHE_DIR"
+
+
+class _DiskStore:
+    """
+    One pickle file per key, written through a temp file so readers never see
+    a partial entry. Each write prunes the entries older than `ttl` and, past
+    `maxsize` entries, the oldest written ones.
+    """
+
+    def __init__(self, path, maxsize=1024, ttl=None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.pkl")
+
+    def get(self, key, ttl):
+        path = self._file(key)
+        try:
+            if ttl is not None and time.time() - os.stat(path).st_mtime > ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def set(self, key, value):
+        path = self._file(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.prune()
+
+    def prune(self):
+        """Remove expired entries, then the oldest ones beyond maxsize."""
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".pkl"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+        entries.sort(reverse=True)
+        now = time.time()
+        for rank, (mtime, path) in enumerate(entries):
+            if rank >= self.maxsize or (self.ttl is not None and now - mtime > self.ttl):
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def memoize(*marts, maxsize=128, ttl=None, cache_dir=None, disk_maxsize=1024):
+    """
+    Decorator caching a callback's result per (arguments, versions of `marts`).
+
+    `maxsize` bounds the in-process LRU and `disk_maxsize` the disk store,
+    `ttl` (seconds) expires entries in both stores. Arguments are keyed by
+    their JSON form, so the lists and dicts Dash passes (multi-value dropdowns,
+    relayoutData) are fine; a dict's key order does not matter.
+    The wrapped function has `cache_info()` and `cache_clear()`.
+    """
+    def decorator(func):
+        lock = threading.Lock()
+        entries = OrderedDict()  # key -> (time stored, result)
+        stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        name = f"{func.__module__}.{func.__qualname__}"
+        path = cache_dir or os.environ.get(CACHE_DIR_ENV)
+        disk = _DiskStore(os.path.join(path, func.__qualname__), disk_maxsize, ttl) if path else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = json.dumps([args, kwargs, [mart_version(m) for m in marts]], sort_keys=True, default=str)
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and (ttl is None or now - entry[0] <= ttl):
+                    entries.move_to_end(key)
+                    stats["hits"] += 1
+                    return entry[1]
+            digest = hashlib.sha256(f"{name}:{key}".encode()).hexdigest() if disk else None
+            result = disk.get(digest, ttl) if disk else None
+            from_disk = result is not None
+            if not from_disk:
+                result = func(*args, **kwargs)
+                if disk:
+                    disk.set(digest, result)
+            with lock:
+                stats["disk_hits" if from_disk else "misses"] += 1
+                entries[key] = (now, result)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return result
+
+        def cache_info():
+            with lock:
+                return {**stats, "size": len(entries), "disk": disk.path if disk else None}
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
@@ -0,0 +1,166 @@
+"""
+Shared, hot-reloadable mart access for the dashboard.
+
+Every page and callback reads marts through mart(name): each mart is loaded
+once per process and the same DataFrame is shared by all pages. A mart's
+version is the identity of its parquet file (or partition directory, see
+MART_LAYOUT), which build_marts replaces atomically, plus the node hash
+recorded in the build state. Versions are re-checked at most every
+CHECK_INTERVAL seconds; when a rebuild publishes a new mart, the next access
+reloads it and drops the old copy, so the app serves fresh data without a
+restart and holds one copy of each table.
+
+Callbacks that slice a mart by key use mart_index(name, *keys): a MartIndex
+built once per mart version, holding the row order of the shared mart sorted
+by the keys and date and the range of that order covered by every key
+prefix, so a slice costs O(slice) rather than a boolean mask over the whole
+table, without a second copy of the mart.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.transform.warehouse import MARTS_DIR, STATE_FILE, read_mart
+
+# Seconds between two stat() checks of the same mart.
+CHECK_INTERVAL = 5.0
+
+
+class MartIndex:
+    """
+    Row positions of a mart sorted by `keys` then `order`, with the range of
+    every key prefix: get("Bread & Cereals") is a category's rows and
+    get("Bread & Cereals", "Wheat") one (category, commodity) series, in date
+    order. The mart itself is the shared frame, not a sorted copy.
+    """
+
+    def __init__(self, df, keys, order="date"):
+        self.keys = tuple(keys)
+        self.frame = df
+        # Only the key columns are copied, to sort them.
+        columns = df[[*self.keys, order]].reset_index(drop=True)
+        self.positions = columns.sort_values([*self.keys, order], kind="stable").index.to_numpy()
+        columns = columns.take(self.positions)
+        self._ranges = {}
+        self._children = {}
+        for depth in range(1, len(self.keys) + 1):
+            prefix = columns[list(self.keys[:depth])]
+            starts = np.flatnonzero(prefix.ne(prefix.shift()).any(axis=1).to_numpy())
+            stops = np.append(starts[1:], len(prefix))
+            for start, stop, key in zip(starts, stops, prefix.iloc[starts].itertuples(index=False, name=None)):
+                self._ranges[key] = (start, stop)
+                self._children.setdefault(key[:-1], []).append(key[-1])
+
+    def get(self, *key):
+        """Rows of a key prefix (empty frame if absent), taken from the shared frame."""
+        start, stop = self._ranges.get(key, (0, 0))
+        return self.frame.take(self.positions[start:stop])
+
+    def children(self, *key):
+        """Values of the next key under a prefix, in sort order (top-level keys for no prefix)."""
+        return list(self._children.get(key, []))
+
+
+class MartCache:
+    """Process-wide cache of mart DataFrames, invalidated by mart version."""
+
+    def __init__(self, marts_dir=MARTS_DIR, check_interval=CHECK_INTERVAL):
+        self.marts_dir = marts_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loading = {}   # name -> lock held while the mart is read
+        self._tables = {}    # name -> (version, DataFrame)
+        self._indexes = {}   # (name, keys) -> (version, MartIndex)
+        self._checked = {}   # name -> (monotonic time of the check, version)
+        self._state = (None, {})  # (state file mtime, node hashes)
+
+    def version(self, name):
+        """Version of a mart, None if it has not been built."""
+        now = time.monotonic()
+        checked = self._checked.get(name)
+        if checked is not None and now - checked[0] < self.check_interval:
+            return checked[1]
+        try:
+            stat = os.stat(os.path.join(self.marts_dir, f"{name}.parquet"))
+        except FileNotFoundError:
+            version = None
+        else:
+            version = (stat.st_ino, stat.st_mtime_ns, self._node_hashes().get(name))
+        self._checked[name] = (now, version)
+        return version
+
+    def get(self, name):
+        """The mart as a DataFrame, reloaded if it changed since it was last read."""
+        version = self.version(name)
+        cached = self._tables.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if version is None:
+            raise FileNotFoundError(f"Mart {name} has not been built — run build_marts first.")
+        with self._lock:
+            loading = self._loading.setdefault(name, threading.Lock())
+        # Concurrent requests for a stale mart wait for a single reload.
+        with loading:
+            cached = self._tables.get(name)
+            if cached is None or cached[0] != version:
+                self._tables.pop(name, None)
+                for key in [k for k in self._indexes if k[0] == name]:
+                    self._indexes.pop(key, None)
+                # The published parquet, whose file identity is the version (the warehouse may be mid-build).
+                cached = (version, read_mart(name, marts_dir=self.marts_dir, warehouse=False))
+                self._tables[name] = cached
+        return cached[1]
+
+    def index(self, name, keys):
+        """MartIndex of a mart on `keys`, built once per mart version."""
+        version = self.version(name)
+        cached = self._indexes.get((name, keys))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = self.get(name)
+        with self._lock:
+            loading = self._loading.setdefault((name, keys), threading.Lock())
+        with loading:
+            cached = self._indexes.get((name, keys))
+            if cached is None or cached[0] != version:
+                cached = (version, MartIndex(df, keys))
+                self._indexes[(name, keys)] = cached
+        return cached[1]
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._indexes.clear()
+            self._checked.clear()
+
+    def _node_hashes(self):
+        path = os.path.join(self.marts_dir, STATE_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if self._state[0] != mtime:
+            with open(path, encoding="utf-8") as f:
+                nodes = json.load(f).get("nodes", {})
+            self._state = (mtime, {name: node.get("hash") for name, node in nodes.items()})
+        return self._state[1]
+
+
+marts = MartCache()
+
+
+def mart(name):
+    """Shared DataFrame of a mart (see MartCache.get)."""
+    return marts.get(name)
+
+
+def mart_index(name, *keys):
+    """Shared MartIndex of a mart on `keys` (see MartIndex)."""
+    return marts.index(name, keys)
+
+
+def mart_version(name):
+    return marts.version(name)
@@ -0,0 +1,92 @@
+"""
+Largest-Triangle-Three-Buckets (LTTB) downsampling of chart series.
+
+lttb() keeps the first and last points and, in each of n_out - 2 equal
+buckets of the points between, the point forming the largest triangle with
+the point kept in the previous bucket and the average of the next bucket.
+Peaks, troughs and turning points survive, so a line keeps its visual
+shape at a fixed point budget. Bucket bounds, averages and candidates are
+computed with array operations; only the choice of one point per bucket,
+which depends on the previous choice, is a loop over buckets.
+
+downsample() applies it per trace (one series per `by` value), optionally
+within an x range: charts plot POINTS_PER_TRACE points of the visible range
+and re-downsample it at full resolution on zoom (see relayout_range()).
+"""
+import numpy as np
+import pandas as pd
+
+POINTS_PER_TRACE = 1_000
+
+
+def lttb(x, y, n_out):
+    """Sorted indices of the `n_out` points of (x, y) kept by LTTB; `x` ascending, no NaN."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Buckets of the points between the first and the last.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    starts, stops = edges[:-1], edges[1:]
+    sum_x = np.concatenate([[0.0], np.cumsum(x)])
+    sum_y = np.concatenate([[0.0], np.cumsum(y)])
+    size = stops - starts
+    # Third vertex of each bucket's triangles: the next bucket's average (the last point for the last bucket).
+    next_x = np.append(((sum_x[stops] - sum_x[starts]) / size)[1:], x[-1])
+    next_y = np.append(((sum_y[stops] - sum_y[starts]) / size)[1:], y[-1])
+
+    # (bucket, candidate) matrices, padded to the widest bucket.
+    candidates = starts[:, None] + np.arange(size.max())
+    padded = candidates >= stops[:, None]
+    candidates = np.minimum(candidates, n - 1)
+    cand_x, cand_y = x[candidates], y[candidates]
+
+    kept = np.empty(n_out, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        ax, ay, nx, ny = x[previous], y[previous], next_x[i], next_y[i]
+        # Twice the triangle area, as a linear function of the candidate point.
+        area = np.abs((ny - ay) * cand_x[i] + (ax - nx) * cand_y[i] + (nx * ay - ax * ny))
+        area[padded[i]] = -1.0
+        previous = candidates[i, area.argmax()]
+        kept[i + 1] = previous
+    return kept
+
+
+def downsample(df, x, y, n_out=POINTS_PER_TRACE, by=None, x_range=None):
+    """
+    Rows of `df` kept by LTTB on (x, y), at most `n_out` per `by` group.
+
+    Rows with a missing `y` are dropped, groups are sorted by `x`. With
+    `x_range` = (start, end), only rows in that range are considered.
+    """
+    df = df.dropna(subset=[y])
+    if x_range is not None:
+        start, end = pd.to_datetime(x_range) if pd.api.types.is_datetime64_any_dtype(df[x]) else x_range
+        df = df[(df[x] >= start) & (df[x] <= end)]
+    groups = [df] if by is None else [group for _, group in df.groupby(by, sort=False)]
+    kept = []
+    for group in groups:
+        group = group.sort_values(x, kind="stable")
+        values = group[x].to_numpy()
+        if np.issubdtype(values.dtype, np.datetime64):
+            values = (values - values[0]) / np.timedelta64(1, "s")
+        kept.append(group.iloc[lttb(values, group[y].to_numpy(), n_out)])
+    return pd.concat(kept) if kept else df
+
+
+def relayout_range(relayout):
+    """
+    x range of a Plotly relayoutData event: (start, end) after a zoom or
+    pan, None after an autorange reset, False if the x axis did not change.
+    """
+    relayout = relayout or {}
+    if relayout.get("xaxis.autorange"):
+        return None
+    if "xaxis.range[0]" in relayout:
+        return relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+    if "xaxis.range" in relayout:
+        return tuple(relayout["xaxis.range"])
+    return False
@@ -7,6 +7,9 @@ import json
 import os
 from datetime import datetime, timezone
 
+from src.dashboard.downsample import POINTS_PER_TRACE, downsample
+from src.transform.warehouse import has_mart, read_mart
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
 MARTS = os.path.join(DATA_DIR, "marts")
 
@@ -110,39 +113,42 @@ def _build_summary(latest_comm, latest_inf, pressure, fx_sorted, momentum):
 
 
 def build_portfolio_data():
-    commodities = pd.read_parquet(os.path.join(MARTS, "fact_commodities.parquet"))
-    fx = pd.read_parquet(os.path.join(MARTS, "fact_fx.parquet"))
-    inflation = pd.read_parquet(os.path.join(MARTS, "fact_inflation.parquet"))
-    pressure = pd.read_parquet(os.path.join(MARTS, "mart_category_pressure.parquet"))
+    commodities = read_mart("fact_commodities", marts_dir=MARTS)
+    fx = read_mart("fact_fx", marts_dir=MARTS)
+    inflation = read_mart("fact_inflation", marts_dir=MARTS)
+    pressure = read_mart("mart_category_pressure", marts_dir=MARTS)
 
     commodities["date"] = pd.to_datetime(commodities["date"])
     fx["date"] = pd.to_datetime(fx["date"])
     inflation["date"] = pd.to_datetime(inflation["date"])
 
     # Try loading momentum (may not exist on first run)
-    momentum_path = os.path.join(MARTS, "mart_momentum.parquet")
-    momentum = pd.read_parquet(momentum_path) if os.path.exists(momentum_path) else None
+    momentum = read_mart("mart_momentum", marts_dir=MARTS) if has_mart("mart_momentum", marts_dir=MARTS) else None
     if momentum is not None:
         momentum["date"] = pd.to_datetime(momentum["date"])
 
     # FX Data
     fx_sorted = fx.sort_values("date")
     kpi_fx = float(fx_sorted.iloc[-1]["fx_eur_usd"]) if len(fx_sorted) > 0 else 0.0
-    fx_dates = fx_sorted["date"].dt.strftime("%Y-%m-%d").tolist()
-    fx_values = fx_sorted["fx_eur_usd"].tolist()
+    # Long series are LTTB-downsampled so the payload stays bounded as history grows.
+    fx_chart = downsample(fx_sorted, "date", "fx_eur_usd", POINTS_PER_TRACE)
+    fx_dates = fx_chart["date"].dt.strftime("%Y-%m-%d").tolist()
+    fx_values = fx_chart["fx_eur_usd"].tolist()
 
-    # Commodities Data — resample weekly to monthly for the base‑100 chart
+    # Commodities Data — monthly closes from the price pyramid for the base‑100 chart
+    monthly = read_mart("fact_price_pyramid", columns=["date", "commodity", "close_usd"],
+                        where="resolution = 'month'", marts_dir=MARTS)
+    monthly["date"] = pd.to_datetime(monthly["date"])
     comm_data = {}
     kpis = {}
     for c in ["Cocoa", "Coffee", "Sugar", "Wheat"]:
         d = commodities[commodities["commodity"] == c].sort_values("date")
         if len(d) > 0:
             kpis[c] = float(d.iloc[-1]["price_usd"])
-            # Resample to month-end (last observation per month) for the base‑100 chart
-            d_monthly = d.set_index("date").resample("MS").last().dropna(subset=["price_usd"]).reset_index()
+            d_monthly = downsample(monthly[monthly["commodity"] == c], "date", "close_usd", POINTS_PER_TRACE)
             comm_data[c] = {
                 "dates": d_monthly["date"].dt.strftime("%Y-%m-%d").tolist(),
-                "prices": d_monthly["price_usd"].tolist()
+                "prices": d_monthly["close_usd"].tolist()
             }
 
     # YoY Commodity Change
@@ -164,8 +170,7 @@ def build_portfolio_data():
     # Inflation Time Series (YoY % per category over time)
     inf_timeseries = {}
     for cat in inflation["category"].dropna().unique():
-        d = inflation[inflation["category"] == cat].sort_values("date")
-        d = d.dropna(subset=["yoy_inflation_pct"])
+        d = downsample(inflation[inflation["category"] == cat], "date", "yoy_inflation_pct", POINTS_PER_TRACE)
         if len(d) > 0:
             inf_timeseries[cat] = {
                 "dates": d["date"].dt.strftime("%Y-%m-%d").tolist(),
@@ -186,6 +191,17 @@ def build_portfolio_data():
                     "change_12w": round(float(d.iloc[-1].get("change_12w_pct", 0) or 0), 1),
                 }
 
+    # Forward squeeze distributions (Monte Carlo scenarios, may not exist on first run)
+    scenario_data = {}
+    if has_mart("mart_squeeze_scenarios", marts_dir=MARTS):
+        scenarios = read_mart("mart_squeeze_scenarios", marts_dir=MARTS).sort_values("horizon_months")
+        for cat, d in scenarios.groupby("inflation_category"):
+            scenario_data[cat] = {
+                "horizons": d["horizon_months"].tolist(),
+                **{q: [round(v, 2) for v in d[f"{q}_squeeze"]] for q in ["p05", "p25", "p50", "p75", "p95"]},
+                "prob_squeeze": [round(v, 3) for v in d["prob_squeeze"]],
+            }
+
     # Final Payload
     payload = {
         "metadata": {
@@ -225,7 +241,8 @@ def build_portfolio_data():
                 "y_labels": pivot.index.tolist(),
                 "z_values": pivot.values.tolist()
             },
-            "momentum": momentum_data
+            "momentum": momentum_data,
+            "squeeze_scenarios": scenario_data
         }
     }
 
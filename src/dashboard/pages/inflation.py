@@ -2,62 +2,70 @@
 Page 3 — Consumer Inflation Translation
 Overlays commodity input costs with INSEE's Food CPI to show
 whether raw material increases are being passed on to consumers.
+
+With FMCG_DASH_CLIENTSIDE=1 the page ships every category's series once,
+in columnar form, in a dcc.Store, and a clientside (JavaScript) callback
+draws the charts of the selected category: switching categories then costs
+no server round trip.
 """
-import os, dash, pandas as pd, plotly.express as px, plotly.graph_objects as go
-from dash import html, dcc, callback, Input, Output
+import os, dash, plotly.express as px, plotly.graph_objects as go
+from dash import html, dcc, callback, clientside_callback, Input, Output, State
 import dash_bootstrap_components as dbc
 
+from src.dashboard.cache import memoize
+from src.dashboard.data import mart_index
+
 dash.register_page(__name__, path="/inflation", name="🏷️ Inflation Translation", order=2)
 
-MARTS = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "marts")
-
-df_mart = pd.read_parquet(os.path.join(MARTS, "mart_category_pressure.parquet"))
-df_infl = pd.read_parquet(os.path.join(MARTS, "fact_inflation.parquet"))
-
-# ── Dropdown options: inflation categories ───────────────────────────────
-categories = sorted(df_mart["inflation_category"].unique())
-
-layout = html.Div([
-    html.H3("Consumer Inflation Translation", className="text-white mb-3"),
-    html.P("Are input cost increases being passed through to French consumers?",
-           className="text-secondary mb-4"),
-
-    dbc.Row([
-        dbc.Col([
-            html.Label("Select CPI Category", className="text-white"),
-            dcc.Dropdown(
-                id="inflation-cat-dropdown",
-                options=[{"label": c, "value": c} for c in categories],
-                value=categories[0] if categories else None,
-                clearable=False,
-                className="mb-3",
-            ),
-        ], md=4),
-    ]),
-
-    dbc.Row([
-        dbc.Col(dcc.Graph(id="inflation-vs-commodity-chart"), md=12),
-    ], className="mb-4"),
-
-    dbc.Row([
-        dbc.Col(dcc.Graph(id="squeeze-score-chart"), md=12),
-    ]),
-])
-
-
-@callback(
-    Output("inflation-vs-commodity-chart", "figure"),
-    Output("squeeze-score-chart", "figure"),
-    Input("inflation-cat-dropdown", "value"),
-)
+CLIENTSIDE = os.environ.get("FMCG_DASH_CLIENTSIDE") == "1"
+
+
+def layout(**kwargs):
+    """Built on each page load, from the current marts."""
+    # ── Dropdown options: inflation categories ───────────────────────────
+    categories = mart_index("mart_category_pressure", "inflation_category", "commodity").children()
+
+    return html.Div([
+        html.H3("Consumer Inflation Translation", className="text-white mb-3"),
+        html.P("Are input cost increases being passed through to French consumers?",
+               className="text-secondary mb-4"),
+
+        dbc.Row([
+            dbc.Col([
+                html.Label("Select CPI Category", className="text-white"),
+                dcc.Dropdown(
+                    id="inflation-cat-dropdown",
+                    options=[{"label": c, "value": c} for c in categories],
+                    value=categories[0] if categories else None,
+                    clearable=False,
+                    className="mb-3",
+                ),
+            ], md=4),
+        ]),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="inflation-vs-commodity-chart"), md=12),
+        ], className="mb-4"),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="squeeze-score-chart"), md=12),
+        ]),
+
+        *([dcc.Store(id="inflation-series", data=series_payload())] if CLIENTSIDE else []),
+    ])
+
+
+@memoize("mart_category_pressure")
 def update_charts(selected_category):
-    filtered = df_mart[df_mart["inflation_category"] == selected_category].copy()
-    filtered = filtered.sort_values("date")
+    # Slices of the pre-sorted mart: O(rows of the category), no table scan.
+    index = mart_index("mart_category_pressure", "inflation_category", "commodity")
+    filtered = index.get(selected_category)
+    cpi = filtered.drop_duplicates("date").sort_values("date")
 
     # ── Dual-axis: commodity price vs CPI ────────────────────────────────
     fig = go.Figure()
-    for commodity in filtered["commodity"].unique():
-        sub = filtered[filtered["commodity"] == commodity]
+    for commodity in index.children(selected_category):
+        sub = index.get(selected_category, commodity)
         fig.add_trace(go.Scatter(
             x=sub["date"], y=sub["commodity_yoy_pct"],
             name=f"{commodity} (Input Cost YoY %)",
@@ -66,7 +74,7 @@ def update_charts(selected_category):
         ))
 
     fig.add_trace(go.Scatter(
-        x=filtered["date"], y=filtered["yoy_inflation_pct"],
+        x=cpi["date"], y=cpi["yoy_inflation_pct"],
         name=f"CPI: {selected_category} (YoY %)",
         mode="lines",
         line=dict(width=3, dash="dash", color="white"),
@@ -93,3 +101,84 @@ def update_charts(selected_category):
                        legend=dict(orientation="h", y=-0.2))
 
     return fig, fig2
+
+
+# ── Clientside mode ──────────────────────────────────────────────────────
+def _values(series):
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def _dates(series):
+    return series.dt.strftime("%Y-%m-%d").tolist()
+
+@memoize("mart_category_pressure", maxsize=1)
+def series_payload():
+    """
+    Every category's CPI and per-commodity series, columnar, plus the shared
+    figure layout (dark template included, as Plotly.js has no named templates).
+    """
+    index = mart_index("mart_category_pressure", "inflation_category", "commodity")
+    categories = {}
+    for category in index.children():
+        cpi = index.get(category).drop_duplicates("date").sort_values("date")
+        categories[category] = {
+            "dates": _dates(cpi["date"]),
+            "cpi": _values(cpi["yoy_inflation_pct"]),
+            "commodities": [
+                {"name": commodity, "dates": _dates(sub["date"]),
+                 "yoy": _values(sub["commodity_yoy_pct"]), "squeeze": _values(sub["cost_squeeze_score"])}
+                for commodity in index.children(category)
+                for sub in [index.get(category, commodity)]
+            ],
+        }
+    layout = go.Figure().update_layout(template="plotly_dark", paper_bgcolor="rgba(0,0,0,0)",
+                                       plot_bgcolor="rgba(0,0,0,0)").to_plotly_json()["layout"]
+    return {"layout": layout, "categories": categories}
+
+# Same figures as update_charts(), built in the browser from series_payload().
+CLIENTSIDE_UPDATE = """
+function (category, store) {
+    var series = store && store.categories[category];
+    if (!series) {
+        return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+    }
+    function layout(extra) {
+        return Object.assign({}, store.layout, {legend: {orientation: "h", y: -0.2}}, extra);
+    }
+    var lines = series.commodities.map(function (c) {
+        return {type: "scatter", x: c.dates, y: c.yoy, name: c.name + " (Input Cost YoY %)",
+                mode: "lines+markers", line: {width: 2}};
+    });
+    lines.push({type: "scatter", x: series.dates, y: series.cpi, name: "CPI: " + category + " (YoY %)",
+                mode: "lines", line: {width: 3, dash: "dash", color: "white"}});
+    var bars = series.commodities.map(function (c) {
+        return {type: "bar", x: c.dates, y: c.squeeze, name: c.name, legendgroup: c.name};
+    });
+    return [
+        {data: lines, layout: layout({
+            title: {text: "Input Costs vs Consumer Inflation: " + category},
+            yaxis: {title: {text: "YoY Change %"}}})},
+        {data: bars, layout: layout({
+            title: {text: "Cost Squeeze Score: " + category},
+            barmode: "group",
+            xaxis: {title: {text: ""}},
+            yaxis: {title: {text: "Squeeze Score (Input - CPI)"}},
+            shapes: [{type: "line", xref: "x domain", x0: 0, x1: 1, y0: 0, y1: 0,
+                      line: {dash: "dash", color: "grey"}}]})}
+    ];
+}
+"""
+
+if CLIENTSIDE:
+    clientside_callback(
+        CLIENTSIDE_UPDATE,
+        Output("inflation-vs-commodity-chart", "figure"),
+        Output("squeeze-score-chart", "figure"),
+        Input("inflation-cat-dropdown", "value"),
+        State("inflation-series", "data"),
+    )
+else:
+    callback(
+        Output("inflation-vs-commodity-chart", "figure"),
+        Output("squeeze-score-chart", "figure"),
+        Input("inflation-cat-dropdown", "value"),
+    )(update_charts)
@@ -2,19 +2,16 @@
 Page 1 — Global Macro Environment
 KPIs and trend charts for commodities and EUR/USD.
 """
-import os, dash, pandas as pd, plotly.express as px, plotly.graph_objects as go
+import dash, plotly.express as px
 from dash import html, dcc, callback, Input, Output
 import dash_bootstrap_components as dbc
 
-dash.register_page(__name__, path="/", name="🌍 Macro Overview", order=0)
+from src.dashboard.data import mart, mart_index
+from src.dashboard.downsample import downsample, relayout_range
 
-MARTS = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "marts")
+dash.register_page(__name__, path="/", name="🌍 Macro Overview", order=0)
 
-df_comm = pd.read_parquet(os.path.join(MARTS, "fact_commodities.parquet"))
-df_fx   = pd.read_parquet(os.path.join(MARTS, "fact_fx.parquet"))
-df_infl = pd.read_parquet(os.path.join(MARTS, "fact_inflation.parquet"))
 
-# Latest values for KPIs
 def _kpi(label, value, delta=None):
     delta_el = []
     if delta is not None:
@@ -29,66 +26,105 @@ def _kpi(label, value, delta=None):
         className="bg-dark border-secondary",
     )
 
-latest_fx = df_fx.dropna(subset=["fx_eur_usd"]).iloc[-1]
-latest_infl = df_infl[df_infl["category"] == "All Items"].dropna(subset=["yoy_inflation_pct"]).iloc[-1]
-
-# Build KPI cards
-kpi_cards = dbc.Row([
-    dbc.Col(_kpi("EUR / USD", f"{latest_fx['fx_eur_usd']:.4f}",
-                 latest_fx.get("yoy_change_pct")), md=3),
-    dbc.Col(_kpi("France CPI (All Items)", f"{latest_infl['cpi_index']:.1f}",
-                 latest_infl.get("yoy_inflation_pct")), md=3),
-], className="mb-4 g-3")
-
-# Add commodity KPIs dynamically
-for commodity in df_comm["commodity"].unique():
-    sub = df_comm[df_comm["commodity"] == commodity].dropna(subset=["price_usd"])
-    if sub.empty:
-        continue
-    row = sub.iloc[-1]
-    kpi_cards.children.append(
-        dbc.Col(_kpi(f"{commodity} (USD)", f"{row['price_usd']:.1f}", row.get("yoy_change_pct")), md=3)
+# ── Trend charts: LTTB-downsampled, re-downsampled on zoom ──────────────
+def _zoomed(fig, x_range):
+    # uirevision keeps the user's zoom and legend state when a zoom callback swaps the figure.
+    fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", uirevision="overview")
+    if x_range:
+        fig.update_xaxes(range=list(x_range))
+    return fig
+
+def _fig_commodities(x_range=None):
+    fig = px.line(
+        downsample(mart("fact_commodities"), "date", "price_usd", by="commodity", x_range=x_range),
+        x="date", y="price_usd", color="commodity",
+        title="Agricultural Commodity Prices (USD)",
+        template="plotly_dark",
+        labels={"price_usd": "Price (USD)", "date": ""},
+    )
+    fig.update_layout(legend=dict(orientation="h", y=-0.15))
+    return _zoomed(fig, x_range)
+
+def _fig_fx(x_range=None):
+    fig = px.line(
+        downsample(mart("fact_fx"), "date", "fx_eur_usd", x_range=x_range),
+        x="date", y="fx_eur_usd",
+        title="EUR/USD Exchange Rate",
+        template="plotly_dark",
+        labels={"fx_eur_usd": "EUR/USD", "date": ""},
+    )
+    return _zoomed(fig, x_range)
+
+def _fig_inflation(x_range=None):
+    fig = px.line(
+        downsample(mart("fact_inflation"), "date", "yoy_inflation_pct", by="category", x_range=x_range),
+        x="date", y="yoy_inflation_pct", color="category",
+        title="France CPI — Year-over-Year Inflation (%)",
+        template="plotly_dark",
+        labels={"yoy_inflation_pct": "YoY Inflation %", "date": ""},
     )
+    fig.update_layout(legend=dict(orientation="h", y=-0.25))
+    return _zoomed(fig, x_range)
+
+TREND_CHARTS = {
+    "overview-commodities": _fig_commodities,
+    "overview-fx": _fig_fx,
+    "overview-inflation": _fig_inflation,
+}
 
-# Commodity trend chart
-fig_comm = px.line(
-    df_comm, x="date", y="price_usd", color="commodity",
-    title="Agricultural Commodity Prices (USD)",
-    template="plotly_dark",
-    labels={"price_usd": "Price (USD)", "date": ""},
-)
-fig_comm.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
-                       legend=dict(orientation="h", y=-0.15))
-
-# FX trend chart
-fig_fx = px.line(
-    df_fx, x="date", y="fx_eur_usd",
-    title="EUR/USD Exchange Rate",
-    template="plotly_dark",
-    labels={"fx_eur_usd": "EUR/USD", "date": ""},
-)
-fig_fx.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-
-# Inflation trend chart
-fig_infl = px.line(
-    df_infl, x="date", y="yoy_inflation_pct", color="category",
-    title="France CPI — Year-over-Year Inflation (%)",
-    template="plotly_dark",
-    labels={"yoy_inflation_pct": "YoY Inflation %", "date": ""},
-)
-fig_infl.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
-                       legend=dict(orientation="h", y=-0.25))
-
-layout = html.Div([
-    html.H3("Global Macro Environment", className="text-white mb-3"),
-    html.P("Real-time macroeconomic indicators impacting the French FMCG sector.",
-           className="text-secondary mb-4"),
-    kpi_cards,
-    dbc.Row([
-        dbc.Col(dcc.Graph(figure=fig_comm, config={"displayModeBar": False}), md=6),
-        dbc.Col(dcc.Graph(figure=fig_fx, config={"displayModeBar": False}), md=6),
-    ], className="mb-4"),
-    dbc.Row([
-        dbc.Col(dcc.Graph(figure=fig_infl, config={"displayModeBar": False}), md=12),
-    ]),
-])
+def _on_zoom(build):
+    def zoom(relayout):
+        x_range = relayout_range(relayout)
+        if x_range is False:
+            return dash.no_update
+        return build(x_range)
+    return zoom
+
+for graph_id, build in TREND_CHARTS.items():
+    callback(Output(graph_id, "figure"), Input(graph_id, "relayoutData"),
+             prevent_initial_call=True)(_on_zoom(build))
+
+
+def layout(**kwargs):
+    """Built on each page load, from the current marts."""
+    df_fx = mart("fact_fx")
+    df_infl = mart("fact_inflation")
+
+    # Latest values for KPIs
+    latest_fx = df_fx.dropna(subset=["fx_eur_usd"]).iloc[-1]
+    latest_infl = df_infl[df_infl["category"] == "All Items"].dropna(subset=["yoy_inflation_pct"]).iloc[-1]
+
+    # Build KPI cards
+    kpi_cards = dbc.Row([
+        dbc.Col(_kpi("EUR / USD", f"{latest_fx['fx_eur_usd']:.4f}",
+                     latest_fx.get("yoy_change_pct")), md=3),
+        dbc.Col(_kpi("France CPI (All Items)", f"{latest_infl['cpi_index']:.1f}",
+                     latest_infl.get("yoy_inflation_pct")), md=3),
+    ], className="mb-4 g-3")
+
+    # Add commodity KPIs dynamically
+    commodities = mart_index("fact_commodities", "commodity")
+    for commodity in commodities.children():
+        sub = commodities.get(commodity).dropna(subset=["price_usd"])
+        if sub.empty:
+            continue
+        row = sub.iloc[-1]
+        kpi_cards.children.append(
+            dbc.Col(_kpi(f"{commodity} (USD)", f"{row['price_usd']:.1f}", row.get("yoy_change_pct")), md=3)
+        )
+
+    return html.Div([
+        html.H3("Global Macro Environment", className="text-white mb-3"),
+        html.P("Real-time macroeconomic indicators impacting the French FMCG sector.",
+               className="text-secondary mb-4"),
+        kpi_cards,
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="overview-commodities", figure=_fig_commodities(),
+                              config={"displayModeBar": False}), md=6),
+            dbc.Col(dcc.Graph(id="overview-fx", figure=_fig_fx(), config={"displayModeBar": False}), md=6),
+        ], className="mb-4"),
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="overview-inflation", figure=_fig_inflation(),
+                              config={"displayModeBar": False}), md=12),
+        ]),
+    ])
@@ -1,56 +1,113 @@
 import yfinance as yf
 import pandas as pd
+import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-def fetch_commodities_data():
+from src.extract.raw_store import read_snapshot, write_raw
+
+# Stored in append mode: each run adds the fetched tail, and the snapshot
+# keeps the latest row per KEYS, so restated prices replace old ones.
+SOURCE = "commodities"
+KEYS = ["commodity", "date"]
+
+# Days re-fetched before the last stored date so late restatements
+# (and the still-open daily bar) overwrite what we already have.
+OVERLAP_DAYS = 14
+
+# Daily bars; build_marts aggregates them into the weekly/monthly price
+# pyramid. Older weekly parts in the lake are read as one bar per week.
+INTERVAL = "1d"
+
+# Define the tickers for key commodities
+# CC=F : Cocoa
+# KC=F : Coffee
+# SB=F : Sugar
+# ZW=F : Wheat
+COMMODITIES = {
+    'Cocoa': 'CC=F',
+    'Coffee': 'KC=F',
+    'Sugar': 'SB=F',
+    'Wheat': 'ZW=F'
+}
+
+# Quoted in US cents by Yahoo Finance, normalised to dollars on download.
+CENTS_TICKERS = {"KC=F", "SB=F", "ZW=F"}
+
+# Upper bound on simultaneous Yahoo Finance requests.
+MAX_WORKERS = int(os.environ.get("COMMODITIES_MAX_WORKERS", "4"))
+
+def load_watermarks(raw_dir=None):
+    """
+    Returns the last stored date per commodity from the raw snapshot,
+    or an empty dict when there is nothing stored yet.
+    """
+    existing = read_snapshot(SOURCE, columns=["commodity", "date"], raw_dir=raw_dir)
+    if existing.empty:
+        return {}
+    return existing.groupby("commodity")["date"].max().to_dict()
+
+def _download_ticker(name, ticker, start_date, end_date):
+    """
+    Downloads one ticker and returns it in the raw long format.
+    Errors are reported and swallowed so one bad ticker never sinks the batch.
+    """
+    print(f"Downloading {name} ({ticker}) from {start_date:%Y-%m-%d}...")
+    try:
+        t = yf.Ticker(ticker)
+        df = t.history(start=start_date, end=end_date, interval=INTERVAL, auto_adjust=True)
+    except Exception as e:
+        print(f"Error fetching {name}: {e}")
+        return None
+
+    if df.empty:
+        return None
+
+    if ticker in CENTS_TICKERS:
+        df[["Open", "High", "Low", "Close"]] /= 100
+
+    return pd.DataFrame({
+        'date': df.index,
+        'open_usd': df['Open'].values,
+        'high_usd': df['High'].values,
+        'low_usd': df['Low'].values,
+        'price_usd': df['Close'].values,
+        'commodity': name
+    })
+
+def fetch_commodities_data(watermarks=None, commodities=None, max_workers=None):
     """
-    Fetches historical monthly data for key agricultural commodities using Yahoo Finance.
+    Fetches daily OHLC bars for key agricultural commodities using Yahoo Finance
+    (`price_usd` is the close).
     These represent raw material costs for the FMCG industry.
+
+    When `watermarks` maps a commodity to its last stored date, only the tail
+    since that date (minus OVERLAP_DAYS) is downloaded for that commodity.
+    Tickers are downloaded concurrently, at most `max_workers` at a time.
     """
     print("Fetching Commodities Data from Yahoo Finance...")
-    
-    # Define the tickers for key commodities
-    # CC=F : Cocoa
-    # KC=F : Coffee
-    # SB=F : Sugar
-    # ZW=F : Wheat
-    
-    commodities = {
-        'Cocoa': 'CC=F',
-        'Coffee': 'KC=F',
-        'Sugar': 'SB=F',
-        'Wheat': 'ZW=F'
-    }
-    
-    CENTS_TICKERS = {"KC=F", "SB=F", "ZW=F"}
+    watermarks = watermarks or {}
+    commodities = commodities or COMMODITIES
+    max_workers = max_workers or MAX_WORKERS
     
     # We want ~3 years of data to see the recent inflation shocks
     end_date = datetime.today()
-    start_date = end_date - timedelta(days=3*365)
-    
-    all_data = []
+    full_start_date = end_date - timedelta(days=3*365)
     
+    jobs = []
     for name, ticker in commodities.items():
-        print(f"Downloading {name} ({ticker})...")
-        try:
-            t = yf.Ticker(ticker)
-            # Use interval="1wk" to match the original download params
-            df = t.history(start=start_date, end=end_date, interval="1wk", auto_adjust=True)
-            
-            if not df.empty:
-                if ticker in CENTS_TICKERS:
-                    df[["Open", "High", "Low", "Close"]] /= 100
-                
-                temp_df = pd.DataFrame({
-                    'date': df.index,
-                    'price_usd': df['Close'].values,
-                    'commodity': name
-                })
-                all_data.append(temp_df)
-        except Exception as e:
-            print(f"Error fetching {name}: {e}")
-            
+        start_date = full_start_date
+        if name in watermarks:
+            start_date = max(pd.Timestamp(watermarks[name]).to_pydatetime() - timedelta(days=OVERLAP_DAYS),
+                             full_start_date)
+        jobs.append((name, ticker, start_date, end_date))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+        results = list(pool.map(lambda job: _download_ticker(*job), jobs))
+
+    all_data = [df for df in results if df is not None]
+    
     if all_data:
         final_df = pd.concat(all_data, ignore_index=True)
         # Clean up timezone and NaNs
@@ -63,9 +120,25 @@ def fetch_commodities_data():
     
     return pd.DataFrame()
 
+def extract_commodities(full=False, max_workers=None):
+    """
+    Runs the commodities extract and returns the rows to append: the tail
+    since each commodity's watermark, or a fresh 3-year download when `full`
+    is set or nothing is stored yet.
+    """
+    watermarks = {} if full else load_watermarks()
+    if watermarks:
+        print(f"Incremental mode: {len(watermarks)} commodities already stored.")
+    return fetch_commodities_data(watermarks, max_workers=max_workers)
+
 if __name__ == "__main__":
-    df = fetch_commodities_data()
+    parser = argparse.ArgumentParser(description="Extract commodity prices from Yahoo Finance.")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-download the full history instead of only the missing tail.")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS,
+                        help="Maximum number of tickers downloaded concurrently.")
+    args = parser.parse_args()
+
+    df = extract_commodities(full=args.full, max_workers=args.max_workers)
     if not df.empty:
-        os.makedirs("data/raw", exist_ok=True)
-        df.to_parquet("data/raw/commodities_prices.parquet", index=False)
-        print("Saved to data/raw/commodities_prices.parquet")
+        write_raw(df, SOURCE, mode="append", keys=KEYS)
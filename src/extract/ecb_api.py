@@ -1,34 +1,50 @@
 from datetime import datetime, timedelta, timezone
 from io import BytesIO
-import os
 
 import pandas as pd
-import requests
 
-def fetch_ecb_fx():
+from src.extract.http_cache import cached_get, save_pending
+from src.extract.raw_store import has_snapshot, write_raw
+
+SOURCE = "ecb"
+ECB_URL = "https://data-api.ecb.europa.eu/service/data/EXR/D.USD.EUR.SP00.A"
+
+def fetch_ecb_fx(session=None, use_cache=True, pending=None):
     """
     Fetches the EUR/USD exchange rate from the European Central Bank (ECB) Data Portal API.
     Identifier: EXR.D.USD.EUR.SP00.A (Daily Spot Exchange Rate)
+    Uses the shared pooled `session` when given, a one-off request otherwise.
+
+    Requests go through the conditional-GET cache; returns None when the
+    upstream series is unchanged and the raw file already exists. With a
+    `pending` list, the cache entry is left for the caller to save once the
+    frame is written (see http_cache.save_pending).
     """
     print("Fetching ECB FX Data (EUR/USD)...")
-    url = "https://data-api.ecb.europa.eu/service/data/EXR/D.USD.EUR.SP00.A"
     end_date = datetime.now(timezone.utc).date()
-    start_date = end_date - timedelta(days=3 * 365)
+    # Anchor the window to the start of the month and leave it open-ended so
+    # the request (and its cache key) stays stable between refreshes.
+    start_date = (end_date - timedelta(days=3 * 365)).replace(day=1)
     params = {
         "format": "csvdata",
         "startPeriod": start_date.isoformat(),
-        "endPeriod": end_date.isoformat(),
     }
 
     headers = {"Accept": "text/csv"}
 
-    response = requests.get(url, params=params, headers=headers, timeout=30)
+    revalidate = use_cache and has_snapshot(SOURCE)
+    status, content, changed = cached_get(ECB_URL, params=params, headers=headers,
+                                          session=session, revalidate=revalidate, pending=pending)
 
-    if response.status_code != 200:
-        print(f"Failed to fetch ECB data: {response.status_code}")
+    if status != 200:
+        print(f"Failed to fetch ECB data: {status}")
         return pd.DataFrame()
 
-    df = pd.read_csv(BytesIO(response.content))
+    if not changed:
+        print("ECB series unchanged since last run — keeping existing raw file.")
+        return None
+
+    df = pd.read_csv(BytesIO(content))
 
     df = df[["TIME_PERIOD", "OBS_VALUE"]].rename(columns={
         "TIME_PERIOD": "date",
@@ -43,9 +59,8 @@ def fetch_ecb_fx():
     return df
 
 if __name__ == "__main__":
-    df = fetch_ecb_fx()
-    if not df.empty:
-        os.makedirs("data/raw", exist_ok=True)
-        # Save as parquet
-        df.to_parquet("data/raw/ecb_fx_eur_usd.parquet", index=False)
-        print("Saved to data/raw/ecb_fx_eur_usd.parquet")
+    pending = []
+    df = fetch_ecb_fx(pending=pending)
+    if df is not None and not df.empty:
+        write_raw(df, SOURCE)
+        save_pending(pending)
@@ -0,0 +1,113 @@
+"""
+On-disk conditional-GET cache for slow-moving endpoints (ECB, INSEE).
+Responses are keyed by URL + params and stored with their ETag,
+Last-Modified and a content hash. Later requests are sent conditionally;
+a 304 or a byte-identical body is reported as unchanged so callers can
+skip parsing and rewriting their raw file.
+
+An entry must only be saved once its content is stored downstream, or a
+failed parse or raw write would be reported as unchanged on the next run.
+Callers that write later pass a `pending` list to cached_get() and call
+save_pending() on it after the raw write succeeds.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import requests
+
+CACHE_DIR = os.path.join("data", "cache", "http")
+
+
+def cache_key(url, params=None):
+    """Stable key for a URL and its query parameters (order-insensitive)."""
+    query = urlencode(sorted((params or {}).items()))
+    return hashlib.sha256(f"{url}?{query}".encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _load(cache_dir, key):
+    meta_path = os.path.join(cache_dir, f"{key}.json")
+    body_path = os.path.join(cache_dir, f"{key}.body")
+    if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+        return None, None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    with open(body_path, "rb") as f:
+        body = f.read()
+    return meta, body
+
+
+def save_pending(pending):
+    """Save the cache entries deferred by cached_get(pending=...)."""
+    for meta_path, body_path, meta, body in pending or []:
+        if body is not None:
+            _write_atomic(body_path, body)
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+
+def cached_get(url, params=None, headers=None, session=None, timeout=30,
+               revalidate=True, cache_dir=None, pending=None):
+    """
+    GET `url` through the on-disk cache.
+
+    Returns (status_code, content, changed). `changed` is False only when
+    `revalidate` is set and the upstream answered 304 or sent the same bytes
+    as last time; pass revalidate=False when the caller has nothing stored
+    and needs the content parsed regardless. With a `pending` list, a new
+    entry is appended to it instead of being saved (see save_pending()).
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    key = cache_key(url, params)
+    meta, cached_body = _load(cache_dir, key)
+
+    request_headers = dict(headers or {})
+    if meta is not None:
+        if meta.get("etag"):
+            request_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            request_headers["If-Modified-Since"] = meta["last_modified"]
+
+    http = session or requests
+    response = http.get(url, params=params, headers=request_headers, timeout=timeout)
+
+    if response.status_code == 304 and cached_body is not None:
+        return 200, cached_body, not revalidate
+    if response.status_code != 200:
+        return response.status_code, response.content, True
+
+    body = response.content
+    digest = hashlib.sha256(body).hexdigest()
+    unchanged = meta is not None and meta.get("sha256") == digest
+
+    new_meta = {
+        "url": url,
+        "params": params or {},
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": digest,
+        "fetched_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    entry = (os.path.join(cache_dir, f"{key}.json"), os.path.join(cache_dir, f"{key}.body"),
+             new_meta, None if unchanged else body)
+    if pending is None:
+        save_pending([entry])
+    else:
+        pending.append(entry)
+
+    return 200, body, not (revalidate and unchanged)
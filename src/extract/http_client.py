@@ -0,0 +1,92 @@
+"""
+Shared HTTP session for the extractors.
+One pooled, keep-alive session with retries (exponential backoff + jitter)
+and a cap on concurrent requests per host.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = "FMCGCostMonitor/1.0 (https://github.com/R-midolli/fmcg_pricing_macro_monitor)"
+
+# Max simultaneous requests per host; anything not listed uses the default.
+HOST_CONCURRENCY = {
+    "world.openfoodfacts.org": 2,
+}
+DEFAULT_HOST_CONCURRENCY = 4
+
+
+class HostLimitedSession(requests.Session):
+    """requests.Session that blocks while a host already has its quota of requests in flight."""
+
+    def __init__(self, host_concurrency=None, default_concurrency=DEFAULT_HOST_CONCURRENCY):
+        super().__init__()
+        self._host_concurrency = dict(HOST_CONCURRENCY, **(host_concurrency or {}))
+        self._default_concurrency = default_concurrency
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                limit = self._host_concurrency.get(host, self._default_concurrency)
+                self._semaphores[host] = threading.BoundedSemaphore(limit)
+            return self._semaphores[host]
+
+    def request(self, method, url, *args, **kwargs):
+        with self._semaphore(urlsplit(url).hostname):
+            return super().request(method, url, *args, **kwargs)
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter: `rate` tokens per second refill a
+    bucket holding at most `capacity` tokens; acquire() blocks until one is free.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def build_session(pool_size=16, retries=4, backoff_factor=0.5, backoff_jitter=0.5,
+                  host_concurrency=None):
+    """
+    Returns a HostLimitedSession with a keep-alive connection pool and retries
+    on connection errors, 429 and 5xx responses.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = HostLimitedSession(host_concurrency=host_concurrency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
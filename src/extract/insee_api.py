@@ -1,94 +1,180 @@
 import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from io import BytesIO
 import xml.etree.ElementTree as ET
 
+import numpy as np
 import pandas as pd
-import requests
 
-def fetch_insee_cpi():
+from src.extract.http_cache import cached_get, save_pending
+from src.extract.insee_series import SERIES_REGISTRY, series_map
+from src.extract.raw_store import has_snapshot, write_raw
+
+SOURCE = "insee"
+INSEE_URL = "https://bdm.insee.fr/series/sdmx/data/SERIES_BDM"
+
+# Keep request URLs well under common proxy/server limits.
+MAX_URL_LENGTH = 1800
+MAX_SERIES_PER_REQUEST = 100
+MAX_WORKERS = int(os.environ.get("INSEE_MAX_WORKERS", "4"))
+
+def chunk_idbanks(idbanks, max_url_length=MAX_URL_LENGTH, max_series=MAX_SERIES_PER_REQUEST):
+    """
+    Splits idbanks into groups whose joined request URL stays under
+    `max_url_length` characters and `max_series` series.
+    """
+    chunks, current, length = [], [], len(INSEE_URL) + 1
+    for idbank in idbanks:
+        extra = len(idbank) + (1 if current else 0)
+        if current and (length + extra > max_url_length or len(current) >= max_series):
+            chunks.append(current)
+            current, length, extra = [], len(INSEE_URL) + 1, len(idbank)
+        current.append(idbank)
+        length += extra
+    if current:
+        chunks.append(current)
+    return chunks
+
+def fetch_insee_cpi(session=None, use_cache=True, registry=None, max_workers=None, pending=None):
     """
     Fetches Consumer Price Index (IPC) data from INSEE BDM SDMX API.
     Uses StructureSpecificData format.
-    
-    Series IDs (idbanks) - Base 2015, All households, Metropolitan France:
-      - 001763852 : IPC - Ensemble (All items)
-      - 001764565 : IPC - Produits alimentaires (Food products)
-      - 001764217 : IPC - Pain et céréales (Bread & Cereals)
-      - 001764229 : IPC - Viandes (Meat)
-      - 001764241 : IPC - Lait, fromage et oeufs (Dairy, Cheese & Eggs)
-      - 001764253 : IPC - Huiles et graisses (Oils & Fats)
-      - 001764277 : IPC - Sucre, confiture, miel, chocolat (Sugar, Jam, Honey, Chocolate)
-      - 001764289 : IPC - Café, thé, cacao (Coffee, Tea, Cocoa)
+
+    The series come from insee_series.SERIES_REGISTRY. They are split into
+    URL-safe chunks fetched concurrently (at most `max_workers` at a time),
+    so a large registry costs about one round trip of latency. Each row
+    carries the registry metadata (category, category_group).
+
+    Uses the shared pooled `session` when given, a one-off request otherwise.
+    Requests go through the conditional-GET cache; returns None when the
+    upstream series are unchanged and the raw file already exists. With a
+    `pending` list, the cache entries are left for the caller to save once
+    the frame is written (see http_cache.save_pending), so a failed chunk,
+    parse or write leaves every chunk to be fetched again.
     """
     print("Fetching INSEE CPI Data (French Inflation by Food Category)...")
 
-    series_map = {
-        "001763852": "All Items",
-        "001764565": "Food Products",
-        "001764217": "Bread & Cereals",
-        "001764229": "Meat",
-        "001764241": "Dairy, Cheese & Eggs",
-        "001764253": "Oils & Fats",
-        "001764277": "Sugar, Jam, Honey, Chocolate",
-        "001764289": "Coffee, Tea, Cocoa",
-    }
-
-    ids = "+".join(series_map.keys())
-    url = f"https://bdm.insee.fr/series/sdmx/data/SERIES_BDM/{ids}"
+    registry = SERIES_REGISTRY if registry is None else registry
+    categories = series_map(registry)
+    chunks = chunk_idbanks(list(registry))
     params = {
         "startPeriod": "2020-01",
         "endPeriod": date.today().replace(day=1).strftime("%Y-%m"),
     }
 
-    response = requests.get(url, params=params, timeout=30)
+    revalidate = use_cache and has_snapshot(SOURCE)
 
-    if response.status_code != 200:
-        print(f"Failed to fetch INSEE data: HTTP {response.status_code}")
-        print(response.text[:500])
+    def fetch_chunk(ids):
+        return cached_get(f"{INSEE_URL}/{'+'.join(ids)}", params=params,
+                          session=session, revalidate=revalidate, pending=pending)
+
+    max_workers = max_workers or MAX_WORKERS
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        responses = list(pool.map(fetch_chunk, chunks))
+
+    failed = [status for status, _, _ in responses if status != 200]
+    if failed:
+        status, content, _ = next(r for r in responses if r[0] != 200)
+        print(f"Failed to fetch INSEE data: HTTP {status} ({len(failed)}/{len(chunks)} chunks)")
+        print(content[:500].decode("utf-8", errors="replace"))
         return pd.DataFrame()
 
-    # Parse the SDMX StructureSpecificData XML
-    root = ET.fromstring(response.content)
-    
-    records = []
+    if not any(changed for _, _, changed in responses):
+        print("INSEE series unchanged since last run — keeping existing raw file.")
+        return None
 
-    # INSEE uses StructureSpecificData format where Series has IDBANK attribute
-    # and Obs elements have TIME_PERIOD and OBS_VALUE as direct attributes.
-    # Tags have namespace prefixes, so we iterate and match by local name.
-    current_idbank = None
-    for el in root.iter():
-        tag = el.tag.split("}")[-1] if "}" in el.tag else el.tag
-
-        if tag == "Series":
-            current_idbank = el.attrib.get("IDBANK")
-            current_category = series_map.get(current_idbank, f"Unknown ({current_idbank})")
-
-        elif tag == "Obs":
-            period = el.attrib.get("TIME_PERIOD")
-            value = el.attrib.get("OBS_VALUE")
-            if period and value and current_idbank in series_map:
-                records.append({
-                    "date": period,
-                    "cpi_index": float(value),
-                    "category": current_category,
-                    "idbank": current_idbank,
-                })
-
-    if not records:
+    frames = [parse_sdmx_observations(content, categories) for _, content, _ in responses]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
         print("No observations found in INSEE response.")
         return pd.DataFrame()
 
-    df = pd.DataFrame(records)
-    df["date"] = pd.to_datetime(df["date"], format="mixed")
+    df = pd.concat(frames, ignore_index=True)
+    df["category_group"] = df["idbank"].map({i: meta["group"] for i, meta in registry.items()})
     df = df.sort_values(by=["category", "date"]).reset_index(drop=True)
 
-    print(f"Successfully fetched {len(df)} CPI records across {df['category'].nunique()} categories.")
+    print(f"Successfully fetched {len(df)} CPI records across {df['category'].nunique()} categories "
+          f"in {len(chunks)} request(s).")
     return df
 
 
+def parse_sdmx_observations(content, series_map):
+    """
+    Streams an SDMX StructureSpecificData payload into a DataFrame with
+    columns date, cpi_index, category, idbank.
+
+    INSEE uses StructureSpecificData format where Series has IDBANK attribute
+    and Obs elements have TIME_PERIOD and OBS_VALUE as direct attributes.
+    The document is read with iterparse and each Series is cleared once
+    consumed, so memory stays flat however many idbanks are requested.
+    Observations go straight into typed column buffers (no per-row dicts);
+    series outside `series_map` are skipped.
+    """
+    periods = []
+    values = array("d")
+    series_ids = []
+    series_counts = []
+
+    local_names = {}
+    container = None
+    current_idbank = None
+    count = 0
+
+    for event, el in ET.iterparse(BytesIO(content), events=("start", "end")):
+        # Tags have namespace prefixes, so we match by (cached) local name.
+        tag = local_names.get(el.tag)
+        if tag is None:
+            tag = local_names[el.tag] = el.tag.rpartition("}")[2]
+
+        if event == "start":
+            if tag == "Obs":
+                if current_idbank is not None:
+                    attrib = el.attrib
+                    period = attrib.get("TIME_PERIOD")
+                    value = attrib.get("OBS_VALUE")
+                    if period and value:
+                        periods.append(period)
+                        values.append(float(value))
+                        count += 1
+            elif tag == "Series":
+                idbank = el.attrib.get("IDBANK")
+                current_idbank = idbank if idbank in series_map else None
+                count = 0
+            elif tag == "DataSet":
+                container = el
+        elif tag == "Series":
+            if current_idbank is not None and count:
+                series_ids.append(current_idbank)
+                series_counts.append(count)
+            current_idbank = None
+            el.clear()
+            if container is not None:
+                # Drop consumed Series so the partial tree never grows.
+                container.clear()
+
+    if not periods:
+        return pd.DataFrame(columns=["date", "cpi_index", "category", "idbank"])
+
+    idbanks = np.repeat(np.array(series_ids, dtype=object), series_counts)
+    categories = np.repeat(np.array([series_map[i] for i in series_ids], dtype=object), series_counts)
+    try:
+        dates = pd.to_datetime(periods, format="%Y-%m")
+    except ValueError:
+        dates = pd.to_datetime(periods, format="mixed")
+
+    return pd.DataFrame({
+        "date": dates,
+        "cpi_index": np.frombuffer(values, dtype=np.float64).copy(),
+        "category": categories,
+        "idbank": idbanks,
+    })
+
+
 if __name__ == "__main__":
-    df = fetch_insee_cpi()
-    if not df.empty:
-        os.makedirs("data/raw", exist_ok=True)
-        df.to_parquet("data/raw/insee_cpi_france.parquet", index=False)
-        print("Saved to data/raw/insee_cpi_france.parquet")
+    pending = []
+    df = fetch_insee_cpi(pending=pending)
+    if df is not None and not df.empty:
+        write_raw(df, SOURCE)
+        save_pending(pending)
@@ -0,0 +1,26 @@
+"""
+Registry of the INSEE BDM series (idbanks) pulled by insee_api.
+
+Series IDs (idbanks) - Base 2015, All households, Metropolitan France.
+Each entry carries the English category used across the marts, the INSEE
+label and a group used to organise the series. Add new idbanks here; the
+extractor splits them into URL-safe chunks on its own.
+"""
+
+SERIES_REGISTRY = {
+    "001763852": {"category": "All Items", "label_fr": "IPC - Ensemble", "group": "Headline"},
+    "001764565": {"category": "Food Products", "label_fr": "IPC - Produits alimentaires", "group": "Food"},
+    "001764217": {"category": "Bread & Cereals", "label_fr": "IPC - Pain et céréales", "group": "Food"},
+    "001764229": {"category": "Meat", "label_fr": "IPC - Viandes", "group": "Food"},
+    "001764241": {"category": "Dairy, Cheese & Eggs", "label_fr": "IPC - Lait, fromage et oeufs", "group": "Food"},
+    "001764253": {"category": "Oils & Fats", "label_fr": "IPC - Huiles et graisses", "group": "Food"},
+    "001764277": {"category": "Sugar, Jam, Honey, Chocolate",
+                  "label_fr": "IPC - Sucre, confiture, miel, chocolat", "group": "Food"},
+    "001764289": {"category": "Coffee, Tea, Cocoa", "label_fr": "IPC - Café, thé, cacao", "group": "Food"},
+}
+
+
+def series_map(registry=None):
+    """Return {idbank: category} for the given registry (default: SERIES_REGISTRY)."""
+    registry = SERIES_REGISTRY if registry is None else registry
+    return {idbank: meta["category"] for idbank, meta in registry.items()}
@@ -1,65 +1,240 @@
+import argparse
+import json
+import math
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
 import pandas as pd
-import os
 
-def fetch_open_food_facts(country="france", page_size=250):
-    """
-    Fetches a selection of products from Open Food Facts API to act as our product dimension.
-    We will filter for beverages, snacks, dairy to simulate FMCG.
-    """
-    print(f"Fetching Open Food Facts Data for {country}...")
-    
-    # We use the search API
-    url = "https://world.openfoodfacts.org/cgi/search.pl"
-    
-    params = {
+from src.extract.http_client import USER_AGENT, TokenBucket, build_session
+from src.extract.raw_store import commit_raw_file, new_part_tmp_path, raw_path, write_raw
+
+SOURCE = "openfoodfacts"
+CRAWL_DIR = "openfoodfacts_crawl"
+OFF_SEARCH_URL = "https://world.openfoodfacts.org/cgi/search.pl"
+
+# Open Food Facts allows ~10 search requests per minute per client.
+SEARCH_RATE_PER_MIN = 10
+
+PRODUCT_SCHEMA = pa.schema([
+    ("product_id", pa.string()),
+    ("product_name", pa.string()),
+    ("brand", pa.string()),
+    ("category", pa.string()),
+    ("nutriscore", pa.string()),
+    ("origin_country", pa.string()),
+    ("categories", pa.string()),
+    ("ingredients_text", pa.string()),
+])
+
+def _search_params(country, page_size, page=1):
+    return {
         "search_terms": "",
         "search_simple": 1,
         "action": "process",
         "json": 1,
         "page_size": page_size,
+        "page": page,
         "sort_by": "popularity_key",
         "countries_tags_en": country
     }
+
+def clean_products(products):
+    """
+    Turns raw search API products into product-dimension rows.
+    Keeps the first brand/category, upper-cases the Nutri-Score and drops
+    rows without a name or brand. The full category list and ingredient
+    text are kept for the commodity classifier.
+    """
+    df = pd.DataFrame({
+        "product_id": [p.get("_id") for p in products],
+        "product_name": [p.get("product_name") for p in products],
+        "brand": [p.get("brands") for p in products],
+        "category": [p.get("categories") for p in products],
+        "nutriscore": [p.get("nutriscore_grade") for p in products],
+        "origin_country": [p.get("origins", "Unknown") for p in products],
+        "categories": [p.get("categories") for p in products],
+        "ingredients_text": [p.get("ingredients_text") for p in products],
+    }, dtype=object)
+    
+    # Clean up some messy categories/brands (just take the first one)
+    df['brand'] = df['brand'].str.split(',').str[0].str.strip()
+    df['category'] = df['category'].str.split(',').str[0].str.strip()
+    df['nutriscore'] = df['nutriscore'].str.upper()
     
-    response = requests.get(url, params=params, timeout=30, headers={
-        "User-Agent": "FMCGCostMonitor/1.0 (https://github.com/R-midolli/fmcg_pricing_macro_monitor)"
-    })
+    # Drop rows where we lack basic info
+    return df.dropna(subset=['product_name', 'brand'])
+
+def fetch_open_food_facts(country="france", page_size=250, session=None):
+    """
+    Fetches a selection of products from Open Food Facts API to act as our product dimension.
+    We will filter for beverages, snacks, dairy to simulate FMCG.
+    Uses the shared pooled `session` when given, a one-off request otherwise.
+    """
+    print(f"Fetching Open Food Facts Data for {country}...")
+    
+    # We use the search API
+    http = session or requests
+    response = http.get(OFF_SEARCH_URL, params=_search_params(country, page_size), timeout=30,
+                        headers={"User-Agent": USER_AGENT})
     
     if response.status_code == 200:
-        data = response.json()
-        products = data.get("products", [])
-        
-        extracted_data = []
-        for p in products:
-            extracted_data.append({
-                "product_id": p.get("_id"),
-                "product_name": p.get("product_name"),
-                "brand": p.get("brands"),
-                "category": p.get("categories"),
-                "nutriscore": p.get("nutriscore_grade"),
-                "origin_country": p.get("origins", "Unknown")
-            })
-            
-        df = pd.DataFrame(extracted_data)
-        
-        # Clean up some messy categories/brands (just take the first one)
-        df['brand'] = df['brand'].str.split(',').str[0].str.strip()
-        df['category'] = df['category'].str.split(',').str[0].str.strip()
-        df['nutriscore'] = df['nutriscore'].str.upper()
-        
-        # Drop rows where we lack basic info
-        df = df.dropna(subset=['product_name', 'brand'])
-        
+        df = clean_products(response.json().get("products", []))
         print(f"Successfully fetched {len(df)} products.")
         return df
     else:
         print(f"Failed to fetch Open Food Facts data: {response.status_code}")
         return pd.DataFrame()
 
+def _load_checkpoint(path):
+    if not os.path.exists(path):
+        return {"total_pages": None, "completed": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def _compact_pages(page_paths, out_path):
+    """
+    Streams the per-page files into one parquet file (one row group per page),
+    skipping products already seen on an earlier page. Returns the row count.
+    """
+    seen = set()
+    rows = 0
+    with pq.ParquetWriter(out_path, PRODUCT_SCHEMA) as writer:
+        for path in page_paths:
+            table = pq.read_table(path, schema=PRODUCT_SCHEMA)
+            ids = table.column("product_id").to_pylist()
+            keep = [i not in seen for i in ids]
+            seen.update(ids)
+            table = table.filter(pa.array(keep))
+            if table.num_rows:
+                writer.write_table(table)
+                rows += table.num_rows
+    return rows
+
+def crawl_open_food_facts(country="france", page_size=100, max_pages=None, workers=4,
+                          rate_per_min=SEARCH_RATE_PER_MIN, session=None):
+    """
+    Paginated crawl of the search API for the product dimension.
+
+    Pages are fetched concurrently (`workers` threads) under a token-bucket
+    limiter of `rate_per_min` requests. Each page is written to its own
+    parquet file as soon as it arrives and recorded in a checkpoint, so only
+    one page per worker is ever held in memory and a rerun resumes with the
+    pages still missing. Once every page is in, they are streamed into one
+    new raw part of the openfoodfacts source, one row group per page, and the
+    page files and checkpoint are removed.
+
+    Returns the number of products written, or None if some pages failed
+    (rerun to resume).
+    """
+    crawl_dir = raw_path(os.path.join(CRAWL_DIR, country))
+    os.makedirs(crawl_dir, exist_ok=True)
+    checkpoint_path = os.path.join(crawl_dir, "_checkpoint.json")
+    checkpoint = _load_checkpoint(checkpoint_path)
+    if checkpoint.get("page_size") not in (None, page_size):
+        print("Page size changed since last crawl — starting over.")
+        checkpoint = {"total_pages": None, "completed": []}
+    checkpoint["page_size"] = page_size
+
+    if session is None:
+        with build_session() as session:
+            return crawl_open_food_facts(country, page_size, max_pages, workers, rate_per_min, session)
+    bucket = TokenBucket(rate_per_min / 60.0, capacity=workers)
+
+    def page_file(page):
+        return os.path.join(crawl_dir, f"page-{page:06d}.parquet")
+
+    def fetch_page(page):
+        bucket.acquire()
+        response = session.get(OFF_SEARCH_URL, params=_search_params(country, page_size, page),
+                               timeout=60, headers={"User-Agent": USER_AGENT})
+        response.raise_for_status()
+        data = response.json()
+        df = clean_products(data.get("products", []))
+        table = pa.Table.from_pandas(df, schema=PRODUCT_SCHEMA, preserve_index=False)
+        tmp_path = f"{page_file(page)}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, page_file(page))
+        return data.get("count")
+
+    completed = set(checkpoint["completed"])
+    if checkpoint["total_pages"] is None:
+        try:
+            count = int(fetch_page(1) or 0)
+        except Exception as e:
+            print(f"Page 1 failed: {e}")
+            print("Could not read the page count — rerun to resume from the checkpoint.")
+            return None
+        completed.add(1)
+        checkpoint["total_pages"] = max(1, math.ceil(count / page_size))
+        checkpoint["completed"] = sorted(completed)
+        _save_checkpoint(checkpoint_path, checkpoint)
+
+    total_pages = checkpoint["total_pages"]
+    if max_pages:
+        total_pages = min(total_pages, max_pages)
+    pending = [p for p in range(1, total_pages + 1) if p not in completed]
+    print(f"Crawling Open Food Facts ({country}): {total_pages} pages, "
+          f"{len(completed)} already done, {len(pending)} to fetch...")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_page, page): page for page in pending}
+        for future in as_completed(futures):
+            page = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Page {page} failed: {e}")
+                failed.append(page)
+                continue
+            completed.add(page)
+            checkpoint["completed"] = sorted(completed)
+            _save_checkpoint(checkpoint_path, checkpoint)
+
+    if failed:
+        print(f"{len(failed)} pages failed — rerun to resume from the checkpoint.")
+        return None
+
+    pages = [page_file(p) for p in range(1, total_pages + 1)]
+    tmp_path = new_part_tmp_path(SOURCE)
+    try:
+        rows = _compact_pages(pages, tmp_path)
+        entry = commit_raw_file(tmp_path, SOURCE, rows=rows)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if entry is not None:
+        print(f"Saved {rows} products to {raw_path(entry['path'])}")
+    # The crawl is in the lake: the next one starts from scratch and refreshes every page.
+    shutil.rmtree(crawl_dir)
+    return rows
+
 if __name__ == "__main__":
-    df = fetch_open_food_facts(page_size=500)
-    if not df.empty:
-        os.makedirs("data/raw", exist_ok=True)
-        df.to_parquet("data/raw/openfoodfacts_products.parquet", index=False)
-        print("Saved to data/raw/openfoodfacts_products.parquet")
+    parser = argparse.ArgumentParser(description="Extract the Open Food Facts product catalogue.")
+    parser.add_argument("--crawl", action="store_true",
+                        help="Paginated, resumable crawl instead of a single search page.")
+    parser.add_argument("--country", default="france")
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate-per-min", type=float, default=SEARCH_RATE_PER_MIN)
+    args = parser.parse_args()
+
+    if args.crawl:
+        crawl_open_food_facts(args.country, max_pages=args.max_pages, workers=args.workers,
+                              rate_per_min=args.rate_per_min)
+    else:
+        df = fetch_open_food_facts(args.country, page_size=500)
+        if not df.empty:
+            write_raw(df, SOURCE)
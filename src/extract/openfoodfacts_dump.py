@@ -0,0 +1,180 @@
+"""
+Bulk ingestion of the official Open Food Facts export, no API calls.
+
+Reads the JSONL (openfoodfacts-products.jsonl.gz) or CSV
+(en.openfoodfacts.org.products.csv.gz, tab-separated) dump from a local
+file as a stream, keeps only the fields dim_product needs for products
+sold in one country, and writes partitioned parquet:
+
+    data/raw/openfoodfacts_dump/country=<country>/part-00000.parquet
+
+Batches of lines, capped at BATCH_BYTES of text (full OFF records run to
+10-20 KB each), are parsed on a process pool (one part file per batch),
+with a bounded number of batches in flight so memory stays flat on
+multi-GB dumps.
+
+    uv run python -m src.extract.openfoodfacts_dump path/to/openfoodfacts-products.jsonl.gz
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.extract.openfoodfacts_api import PRODUCT_SCHEMA, clean_products
+from src.extract.raw_store import raw_path
+
+DUMP_DIR = "openfoodfacts_dump"
+STAGING_DIR = "_staging"
+
+# Characters of dump text per batch; at most 2 × workers batches are in flight.
+BATCH_BYTES = 16 * 2**20
+
+# Dump column -> search API key expected by clean_products.
+FIELDS = {
+    "code": "_id",
+    "product_name": "product_name",
+    "brands": "brands",
+    "categories": "categories",
+    "nutriscore_grade": "nutriscore_grade",
+    "origins": "origins",
+    "ingredients_text": "ingredients_text",
+}
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, encoding="utf-8", errors="replace", newline="")
+
+
+def _has_country(tags, country_tag):
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return country_tag in (tags or ())
+
+
+def _jsonl_products(lines, country_tag):
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if _has_country(record.get("countries_tags"), country_tag):
+            product = {key: record.get(field) for field, key in FIELDS.items()}
+            if not product["origins"]:
+                product.pop("origins")
+            yield product
+
+
+def _csv_products(lines, country_tag, header):
+    csv.field_size_limit(sys.maxsize)
+    columns = {name: header.index(name) for name in (*FIELDS, "countries_tags") if name in header}
+    country_col = columns["countries_tags"]
+    for row in csv.reader(lines, delimiter="\t", quoting=csv.QUOTE_NONE):
+        if len(row) <= country_col or not _has_country(row[country_col], country_tag):
+            continue
+        product = {}
+        for field, key in FIELDS.items():
+            idx = columns.get(field)
+            product[key] = (row[idx] or None) if idx is not None and idx < len(row) else None
+        if not product["origins"]:
+            product.pop("origins")
+        yield product
+
+
+def _read_batch(f, max_chars):
+    """Next lines of `f`, about `max_chars` characters of them (at least one line unless at the end)."""
+    lines, size = [], 0
+    for line in f:
+        lines.append(line)
+        size += len(line)
+        if size >= max_chars:
+            break
+    return lines
+
+
+def _process_batch(lines, fmt, country_tag, header, out_path):
+    """Parse one batch of dump lines and write the kept products to `out_path`."""
+    if fmt == "jsonl":
+        products = list(_jsonl_products(lines, country_tag))
+    else:
+        products = list(_csv_products(lines, country_tag, header))
+    if not products:
+        return 0
+    df = clean_products(products)
+    table = pa.Table.from_pandas(df, schema=PRODUCT_SCHEMA, preserve_index=False)
+    pq.write_table(table, out_path, compression="zstd")
+    return table.num_rows
+
+
+def ingest_off_dump(path, country="france", workers=None, batch_bytes=BATCH_BYTES):
+    """
+    Ingest a local OFF dump into data/raw/openfoodfacts_dump/country=<country>/.
+
+    The partition is built in a staging directory outside DUMP_DIR and
+    swapped into place at the end, so readers never see a half-written
+    partition; a failed or interrupted ingest removes its staging directory.
+    Each batch holds about `batch_bytes` characters of dump lines.
+    Returns the number of products written.
+    """
+    fmt = "jsonl" if ".jsonl" in os.path.basename(path) else "csv"
+    country_tag = f"en:{country}"
+    workers = workers or os.cpu_count() or 1
+
+    partition = raw_path(os.path.join(DUMP_DIR, f"country={country}"))
+    # Staged outside DUMP_DIR, so builds reading country=*/ never see a partial partition.
+    staging = raw_path(os.path.join(STAGING_DIR, f"{DUMP_DIR}-{country}-{os.getpid()}"))
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    print(f"Ingesting Open Food Facts dump {path} ({fmt}, {country_tag}) on {workers} workers...")
+    start = time.perf_counter()
+    rows = 0
+    batch_no = 0
+    try:
+        with _open_text(path) as f, ProcessPoolExecutor(max_workers=workers) as pool:
+            header = next(csv.reader([f.readline()], delimiter="\t")) if fmt == "csv" else None
+            in_flight = set()
+            while True:
+                lines = _read_batch(f, batch_bytes)
+                if not lines:
+                    break
+                out_path = os.path.join(staging, f"part-{batch_no:05d}.parquet")
+                in_flight.add(pool.submit(_process_batch, lines, fmt, country_tag, header, out_path))
+                batch_no += 1
+                if len(in_flight) >= 2 * workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    rows += sum(fut.result() for fut in done)
+            rows += sum(fut.result() for fut in in_flight)
+
+        os.makedirs(os.path.dirname(partition), exist_ok=True)
+        old = f"{staging}.old"
+        if os.path.exists(partition):
+            os.replace(partition, old)
+        os.replace(staging, partition)
+        shutil.rmtree(old, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    print(f"Wrote {rows} products from {batch_no} batches to {partition} "
+          f"in {time.perf_counter() - start:.1f}s")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a local Open Food Facts bulk export.")
+    parser.add_argument("path", help="openfoodfacts-products.jsonl(.gz) or en.openfoodfacts.org.products.csv(.gz)")
+    parser.add_argument("--country", default="france")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-mb", type=float, default=BATCH_BYTES / 2**20,
+                        help="Megabytes of dump text per batch.")
+    args = parser.parse_args()
+    ingest_off_dump(args.path, args.country, args.workers, int(args.batch_mb * 2**20))
@@ -0,0 +1,252 @@
+"""
+Raw storage layer: a Hive-partitioned parquet lake under data/raw/.
+
+    data/raw/source=<source>/ingest_date=YYYY-MM-DD/part-<time>-<hash>.parquet
+    data/raw/_manifest.json
+
+Every write goes to a temporary file that is renamed into place, then is
+recorded in the manifest (rows, min/max dates, sha256). Readers only trust
+files listed in the manifest, so a crash at any point leaves the previous
+snapshot intact.
+
+Two write modes:
+  - snapshot: each write is the full dataset; the latest entry wins.
+  - append:   each write is a delta; the snapshot is the union of all parts,
+              deduplicated on `keys` (latest write wins). Once a source
+              holds more than COMPACT_AFTER parts they are compacted into one.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+RAW_DIR = "data/raw"
+MANIFEST_FILE = "_manifest.json"
+COMPACT_AFTER = 8
+
+_manifest_lock = threading.Lock()
+
+
+def raw_path(filename, raw_dir=None):
+    """Return the path of a file or directory under data/raw/."""
+    return os.path.join(raw_dir or RAW_DIR, filename)
+
+
+def write_parquet_atomic(df, path):
+    """Write `df` to `path` via write-to-temp-then-rename."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".parquet.tmp", dir=directory)
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+# ── manifest ─────────────────────────────────────────────────────────────
+def load_manifest(raw_dir=None):
+    """Return the list of manifest entries (oldest first)."""
+    path = raw_path(MANIFEST_FILE, raw_dir)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["entries"]
+
+
+def _save_manifest(entries, raw_dir=None):
+    path = raw_path(MANIFEST_FILE, raw_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"entries": entries}, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def source_entries(source, raw_dir=None):
+    """Manifest entries of one source, oldest first."""
+    return [e for e in load_manifest(raw_dir) if e["source"] == source]
+
+
+def snapshot_entries(source, raw_dir=None):
+    """
+    Entries making up the latest consistent snapshot of `source`:
+    the last write for snapshot sources, every part for append sources.
+    """
+    entries = source_entries(source, raw_dir)
+    if not entries:
+        return []
+    if entries[-1]["mode"] == "snapshot":
+        return entries[-1:]
+    return entries
+
+
+def has_snapshot(source, raw_dir=None):
+    return bool(snapshot_entries(source, raw_dir))
+
+
+def source_glob(source, raw_dir=None):
+    """Glob matching every part file of `source` (forward slashes, for DuckDB)."""
+    return raw_path(os.path.join(f"source={source}", "*", "*.parquet"), raw_dir).replace("\\", "/")
+
+
+# ── writes ───────────────────────────────────────────────────────────────
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _date_bounds(df, date_column):
+    if date_column not in df.columns or df.empty:
+        return None, None
+    dates = pd.to_datetime(df[date_column])
+    return dates.min().strftime("%Y-%m-%d"), dates.max().strftime("%Y-%m-%d")
+
+
+def _partition(source, now):
+    return os.path.join(f"source={source}", f"ingest_date={now:%Y-%m-%d}")
+
+
+def new_part_tmp_path(source, raw_dir=None):
+    """
+    Temporary path inside today's partition of `source`, for callers that
+    stream a part themselves before handing it to commit_raw_file().
+    """
+    directory = raw_path(_partition(source, datetime.now(timezone.utc)), raw_dir)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".parquet.tmp", dir=directory)
+    os.close(fd)
+    return tmp_path
+
+
+def commit_raw_file(tmp_path, source, mode="snapshot", keys=None, rows=None,
+                    min_date=None, max_date=None, raw_dir=None, skip_unchanged=True, **extra):
+    """
+    Rename a fully written parquet file into today's partition of `source`
+    and record it in the manifest. Unless `skip_unchanged` is False, a file
+    byte-identical to the source's last part is discarded instead.
+    Returns the manifest entry (None when skipped).
+    """
+    raw_dir = raw_dir or RAW_DIR
+    now = datetime.now(timezone.utc)
+    partition = _partition(source, now)
+    os.makedirs(raw_path(partition, raw_dir), exist_ok=True)
+    sha256 = _file_sha256(tmp_path)
+
+    with _manifest_lock:
+        entries = load_manifest(raw_dir)
+        previous = [e for e in entries if e["source"] == source]
+        if skip_unchanged and previous and previous[-1]["sha256"] == sha256:
+            os.remove(tmp_path)
+            print(f"{source}: content unchanged since last write — nothing stored.")
+            return None
+
+        rel_path = os.path.join(partition, f"part-{now:%H%M%S%f}-{sha256[:8]}.parquet")
+        os.replace(tmp_path, raw_path(rel_path, raw_dir))
+        entry = {
+            "source": source,
+            "mode": mode,
+            "keys": list(keys or []),
+            "path": rel_path.replace("\\", "/"),
+            "ingest_date": f"{now:%Y-%m-%d}",
+            "written_at": now.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "rows": rows,
+            "min_date": min_date,
+            "max_date": max_date,
+            "sha256": sha256,
+            **extra,
+        }
+        entries.append(entry)
+        _save_manifest(entries, raw_dir)
+    return entry
+
+
+def write_raw(df, source, mode="snapshot", keys=None, date_column="date", raw_dir=None):
+    """
+    Atomically add `df` to the lake as a new part of `source` and record it
+    in the manifest (rows, min/max of `date_column`, sha256). Returns the
+    manifest entry, or None when the content matches the last part.
+    """
+    tmp_path = new_part_tmp_path(source, raw_dir)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        min_date, max_date = _date_bounds(df, date_column)
+        entry = commit_raw_file(tmp_path, source, mode, keys, int(len(df)), min_date, max_date, raw_dir)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if entry is not None:
+        print(f"Saved {len(df)} rows to {raw_path(entry['path'], raw_dir)}")
+    if mode == "append" and len(snapshot_entries(source, raw_dir)) > COMPACT_AFTER:
+        compact(source, raw_dir)
+    return entry
+
+
+# ── reads ────────────────────────────────────────────────────────────────
+def _dedup(df, keys):
+    if not keys:
+        return df.reset_index(drop=True)
+    df = df.drop_duplicates(subset=keys, keep="last")
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def read_snapshot(source, columns=None, raw_dir=None):
+    """Return the latest consistent snapshot of `source` as a DataFrame (empty if none)."""
+    entries = snapshot_entries(source, raw_dir)
+    if not entries:
+        return pd.DataFrame(columns=columns)
+    keys = entries[-1]["keys"]
+    read_columns = None if columns is None else list(dict.fromkeys([*columns, *keys]))
+    frames = [pd.read_parquet(raw_path(e["path"], raw_dir), columns=read_columns) for e in entries]
+    df = _dedup(pd.concat(frames, ignore_index=True), keys)
+    return df if columns is None else df[columns]
+
+
+# ── maintenance ──────────────────────────────────────────────────────────
+def compact(source, raw_dir=None):
+    """
+    Merge the parts of an append source into a single part. The compacted
+    file is written and registered before the old parts are deleted.
+    """
+    raw_dir = raw_dir or RAW_DIR
+    entries = snapshot_entries(source, raw_dir)
+    if len(entries) <= 1 or entries[-1]["mode"] != "append":
+        return None
+    print(f"Compacting {len(entries)} parts of {source}...")
+    df = read_snapshot(source, raw_dir=raw_dir)
+
+    tmp_path = new_part_tmp_path(source, raw_dir)
+    df.to_parquet(tmp_path, index=False)
+    min_date, max_date = _date_bounds(df, "date")
+    # Until the old entries are dropped, readers see old + compacted parts,
+    # which deduplicate to the same snapshot.
+    entry = commit_raw_file(tmp_path, source, "append", entries[-1]["keys"], int(len(df)),
+                            min_date, max_date, raw_dir, skip_unchanged=False,
+                            compacted_from=len(entries))
+
+    old_paths = {e["path"] for e in entries}
+    with _manifest_lock:
+        manifest = [e for e in load_manifest(raw_dir) if e["path"] not in old_paths]
+        _save_manifest(manifest, raw_dir)
+
+    for path in old_paths:
+        full = raw_path(path, raw_dir)
+        if os.path.exists(full):
+            os.remove(full)
+        directory = os.path.dirname(full)
+        if os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+    return entry
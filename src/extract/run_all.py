@@ -0,0 +1,100 @@
+"""
+Single extraction entry point.
+Runs every source concurrently on one shared pooled HTTP session and writes
+each extract atomically into the raw lake (see raw_store), so the extract takes as long as the
+slowest source rather than the sum of all of them.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from src.extract import commodities_api, ecb_api, insee_api, openfoodfacts_api
+from src.extract.http_cache import save_pending
+from src.extract.http_client import build_session
+from src.extract.raw_store import write_raw
+
+# Non-critical sources may fail without failing the run (same policy as the workflow).
+# `fetch` gets the shared session, the --full flag and a list collecting the HTTP
+# cache entries to save once the extract is written (see http_cache.save_pending).
+SOURCES = [
+    {
+        "name": ecb_api.SOURCE,
+        "critical": True,
+        "fetch": lambda session, full, pending: ecb_api.fetch_ecb_fx(session=session, use_cache=not full,
+                                                                       pending=pending),
+    },
+    {
+        "name": insee_api.SOURCE,
+        "critical": True,
+        "fetch": lambda session, full, pending: insee_api.fetch_insee_cpi(session=session, use_cache=not full,
+                                                                            pending=pending),
+    },
+    {
+        "name": commodities_api.SOURCE,
+        "mode": "append",
+        "keys": commodities_api.KEYS,
+        "critical": True,
+        "fetch": lambda session, full, pending: commodities_api.extract_commodities(full=full),
+    },
+    {
+        "name": openfoodfacts_api.SOURCE,
+        "critical": False,
+        "fetch": lambda session, full, pending: openfoodfacts_api.fetch_open_food_facts(page_size=500, session=session),
+    },
+]
+
+
+async def _run_source(source, session, full):
+    name = source["name"]
+    start = time.perf_counter()
+    try:
+        pending = []
+        df = await asyncio.to_thread(source["fetch"], session, full, pending)
+        if df is None:
+            print(f"✓ {name}: unchanged upstream, raw file kept ({time.perf_counter() - start:.1f}s)")
+            return True
+        if df.empty:
+            raise ValueError("no rows returned")
+        await asyncio.to_thread(write_raw, df, name, source.get("mode", "snapshot"), source.get("keys"))
+        save_pending(pending)
+    except Exception as e:
+        print(f"✗ {name} failed after {time.perf_counter() - start:.1f}s: {e}")
+        return False
+    print(f"✓ {name}: {len(df)} rows in {time.perf_counter() - start:.1f}s")
+    return True
+
+
+async def run_all(sources=None, session=None, full=False):
+    """Run the given sources concurrently and return {source name: succeeded}."""
+    sources = SOURCES if sources is None else sources
+    session = session or build_session()
+    try:
+        results = await asyncio.gather(*(_run_source(s, session, full) for s in sources))
+    finally:
+        session.close()
+    return {s["name"]: ok for s, ok in zip(sources, results)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract all raw sources concurrently.")
+    parser.add_argument("--only", nargs="+", choices=[s["name"] for s in SOURCES],
+                        help="Restrict the run to these sources.")
+    parser.add_argument("--full", action="store_true",
+                        help="Disable incremental extraction where a source supports it.")
+    args = parser.parse_args(argv)
+
+    sources = [s for s in SOURCES if not args.only or s["name"] in args.only]
+    start = time.perf_counter()
+    results = asyncio.run(run_all(sources, full=args.full))
+    print(f"Extraction finished in {time.perf_counter() - start:.1f}s")
+
+    failed_critical = [s["name"] for s in sources if s["critical"] and not results[s["name"]]]
+    if failed_critical:
+        print(f"Critical sources failed: {', '.join(failed_critical)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,161 +1,295 @@
 """
 DuckDB transformation layer.
-Reads raw Parquet files from data/raw/ and builds dimensional models + an analytics mart in data/marts/.
+Reads the latest raw snapshots from the data/raw/ lake and builds dimensional models + an analytics mart in data/marts/.
+
+With `--incremental`, only the partitions touched by raw changes since the
+last build are recomputed (plus the lookback the window functions need) and
+patched into the existing marts; the first run, or a run without a build
+state, falls back to a full build.
+
+With `--warehouse`, marts are materialised as tables of a persistent DuckDB
+file (data/warehouse.duckdb) and dependent marts read those tables directly;
+the parquet files in data/marts/ are then exported as a final publish step.
 """
+import argparse
 import duckdb
+import glob
+import hashlib
+import inspect
+import json
 import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from src.extract import raw_store
+from src.transform import commodity_classifier, passthrough, scenarios
+from src.transform.commodity_classifier import COMMODITY_KEYWORDS, classify_products
+from src.transform.features import compile_features, feature_lookback
+from src.transform.passthrough import MAX_LAG, lagged_passthrough, rolling_passthrough
+from src.transform.scenarios import simulate_squeeze
+from src.transform.warehouse import MARTS_DIR, STATE_FILE, WAREHOUSE_PATH, parquet_relation
 
 RAW_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", "raw")
-MARTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", "marts")
 
+# Flat files written before the partitioned lake, read when a source has no manifest entry yet.
+LEGACY_RAW_FILES = {
+    "ecb": "ecb_fx_eur_usd.parquet",
+    "insee": "insee_cpi_france.parquet",
+    "commodities": "commodities_prices.parquet",
+    "openfoodfacts": "openfoodfacts_products.parquet",
+}
+
+# Sort order of each published parquet mart.
+MART_ORDER = {
+    "fact_price_pyramid": "resolution, commodity, date",
+    "dim_date": "date",
+    "dim_product": "product_id",
+    "bridge_product_commodity": "product_id, commodity",
+    "fact_commodities": "commodity, date",
+    "fact_inflation": "category, date",
+    "fact_fx": "date",
+    "fact_commodities_eur": "commodity, date",
+    "mart_category_pressure": "inflation_category, commodity, date",
+    "mart_momentum": "commodity, date",
+    "mart_passthrough_lags": "inflation_category, commodity, lag_months",
+    "mart_pass_through": "inflation_category, commodity, date",
+    "mart_squeeze_scenarios": "inflation_category, horizon_months",
+}
+
+# Parquet layout of the published marts ("*" holds the defaults). Rows are
+# always written in MART_ORDER (key, then date), so each row group spans a
+# narrow key range and readers filtering on the key skip the others by their
+# min/max statistics. `partition_by` optionally writes a mart as Hive
+# partitions (<name>.parquet/<column>=<value>/*.parquet) instead of one file.
+MART_LAYOUT = {
+    "*": {"compression": "zstd", "row_group_size": 16_384, "partition_by": None},
+    # Read one category or commodity at a time by the dashboard.
+    "mart_category_pressure": {"row_group_size": 2_048},
+    "fact_inflation": {"row_group_size": 2_048},
+    "fact_commodities": {"row_group_size": 2_048},
+}
+
+# Country partition of the Open Food Facts bulk export read into dim_product
+OFF_COUNTRY = "france"
+
+# Months in each window of the rolling pass-through regressions (mart_pass_through)
+PASSTHROUGH_WINDOW = 24
+
+# Monte Carlo squeeze scenarios (mart_squeeze_scenarios): paths, horizons in
+# months, "bootstrap" or "gbm", and the seed that makes reruns reproducible.
+SCENARIOS = {"paths": 20_000, "horizons": (3, 6, 12), "method": "bootstrap", "seed": 42}
+
+# Levels of the commodity price pyramid (fact_price_pyramid), as DATE_TRUNC parts.
+PYRAMID_RESOLUTIONS = ["day", "week", "month"]
+
+# Map INSEE inflation categories to commodity names
+CATEGORY_COMMODITY_MAP = [
+    ("Coffee, Tea, Cocoa", "Cocoa"),
+    ("Coffee, Tea, Cocoa", "Coffee"),
+    ("Sugar, Jam, Honey, Chocolate", "Sugar"),
+    ("Sugar, Jam, Honey, Chocolate", "Cocoa"),
+    ("Bread & Cereals", "Wheat"),
+]
+
+
+# ── fact definitions ─────────────────────────────────────────────────────
+# Window features of each fact, compiled by features.compile_features() into
+# a single window pass per table.
+FEATURES = {
+    "fact_commodities": {
+        "columns": ["date", "commodity", "price_usd"], "partition_by": ["commodity"], "value": "price_usd",
+        "features": {
+            "wow_change_pct": ("pct_change", 1),      # WoW % change (1 week)
+            "yoy_change_pct": ("pct_change", 52),     # YoY % change (~52 weeks)
+            "rolling_13w_avg": ("rolling_mean", 13),  # Rolling 13-week average (~3 months)
+            "rolling_13w_std": ("rolling_std", 13),
+            "rolling_13w_min": ("rolling_min", 13),
+            "rolling_13w_max": ("rolling_max", 13),
+            "zscore_13w": ("zscore", 13),
+            "drawdown_52w_pct": ("drawdown", 52),     # % below the 52-week high
+            "change_4w_pct": ("pct_change", 4),       # momentum
+            "change_12w_pct": ("pct_change", 12),
+        },
+    },
+    "fact_inflation": {
+        "columns": ["date", "category", "cpi_index", "idbank"], "partition_by": ["category"], "value": "cpi_index",
+        "features": {
+            "yoy_inflation_pct": ("pct_change", 12),  # YoY % change in CPI
+            "mom_change_pct": ("pct_change", 1),      # MoM % change
+        },
+    },
+    "fact_fx": {
+        "columns": ["date", "fx_eur_usd"], "value": "fx_eur_usd",
+        "features": {
+            "yoy_change_pct": ("pct_change", 12),
+        },
+    },
+}
+
+def _monthly_fx(where: str = None) -> str:
+    return f"""(
+                SELECT * FROM (
+                    SELECT
+                        DATE_TRUNC('month', date) AS date,
+                        AVG(fx_eur_usd) AS fx_eur_usd
+                    FROM {_raw("ecb")}
+                    GROUP BY 1
+                )
+                WHERE {where or "TRUE"}
+            )"""
+
+def _weekly_prices(marts, where: str = None) -> str:
+    return f"""(
+                SELECT date, commodity, close_usd AS price_usd
+                FROM {marts.ref("fact_price_pyramid")}
+                WHERE resolution = 'week' AND ({where or "TRUE"})
+            )"""
+
+# Per fact: the rows it is computed from (`base`, optionally filtered), the
+# keys it is partitioned by, the base columns compared to detect restated rows
+# and how many earlier rows per key its window features read. `grain` is the
+# DATE_TRUNC part a raw date is rounded down to when the fact aggregates it.
+FACTS = {
+    "fact_commodities": {
+        "source": "commodities", "keys": ["commodity"], "values": ["price_usd"], "grain": "week",
+        "lookback": feature_lookback(FEATURES["fact_commodities"]),
+        "base": _weekly_prices,
+    },
+    "fact_inflation": {
+        "source": "insee", "keys": ["category"], "values": ["cpi_index", "idbank"],
+        "lookback": feature_lookback(FEATURES["fact_inflation"]),
+        "base": lambda marts, where=None: _raw("insee", where),
+    },
+    "fact_fx": {
+        "source": "ecb", "keys": [], "values": ["fx_eur_usd"],
+        "lookback": feature_lookback(FEATURES["fact_fx"]),
+        "base": lambda marts, where=None: _monthly_fx(where),
+    },
+}
 
-def build_marts():
+
+def build_marts(incremental=False, warehouse=None, force=False, workers=None):
+    """
+    Build every mart as the DAG declared in NODES: independent nodes run
+    concurrently on their own DuckDB cursors, and a node whose inputs and SQL
+    are unchanged since the last build is skipped (unless `force`).
+    `incremental` patches only what changed since the last build; `warehouse`
+    is the path of a DuckDB file to materialise marts in.
+    """
     os.makedirs(MARTS_DIR, exist_ok=True)
-    con = duckdb.connect()
+    con = duckdb.connect(warehouse) if warehouse else duckdb.connect()
+    marts = _MartWriter(con, warehouse=bool(warehouse))
+    state = {} if force else (_load_state() or {})
+    run = {
+        "incremental": incremental and "sources" in state,
+        "previous": state.get("sources"),
+        "fingerprints": {source: _fingerprint(source) for source in LEGACY_RAW_FILES},
+        # Per node: None = full rebuild, {} = unchanged, {key: first changed date} otherwise.
+        "changes": {},
+    }
+    if incremental and not run["incremental"]:
+        print("No previous build state — running a full build.")
 
-    # ── 1. dim_date ──────────────────────────────────────────────────────
-    print("Building dim_date...")
-    con.execute(f"""
-        COPY (
-            WITH dates AS (
-                SELECT DISTINCT date FROM read_parquet('{_p("insee_cpi_france.parquet")}')
-                UNION
-                SELECT DISTINCT date FROM read_parquet('{_p("commodities_prices.parquet")}')
+    start = time.perf_counter()
+    hashes, results = {}, {}
+    pending, running = list(NODES), {}
+    with ThreadPoolExecutor(max_workers=workers or len(NODES)) as pool:
+        while pending or running:
+            for name in [n for n in pending if all(dep in results for dep in _node_deps(n))]:
+                pending.remove(name)
+                hashes[name] = _node_hash(name, hashes, run["fingerprints"])
+                future = pool.submit(_run_node, marts.cursor(), name, hashes[name], state.get("nodes", {}), run)
+                running[future] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    marts.publish()
+    con.close()
+
+    _save_state(run["fingerprints"], {
+        name: {"hash": hashes[name], "sql": _sql_hash(name)}
+        for name, (status, _) in results.items() if status != "missing"
+    })
+    print("\nNode timings:")
+    for name in NODES:
+        status, seconds = results[name]
+        print(f"  {name:<24} {status:<9} {seconds:7.2f}s")
+    print(f"  {'total (wall clock)':<24} {'':<9} {time.perf_counter() - start:7.2f}s")
+    print("All marts built successfully!")
+
+
+# ── marts ────────────────────────────────────────────────────────────────
+def _price_pyramid_sql(marts) -> str:
+    # One scan of the daily rows, aggregated at every resolution. Old weekly
+    # parts and the legacy flat file only hold the close, used for O/H/L too.
+    columns = {row[0] for row in marts.con.execute(f"DESCRIBE SELECT * FROM {_raw('commodities')}").fetchall()}
+    ohlc = ",\n                       ".join(
+        f"{f'COALESCE({c}, price_usd)' if c in columns else 'price_usd'} AS {c}"
+        for c in ["open_usd", "high_usd", "low_usd"]
+    )
+    resolutions = ", ".join(f"({_sql_literal(r)})" for r in PYRAMID_RESOLUTIONS)
+    return f"""
+            WITH days AS (
+                SELECT DATE_TRUNC('day', date) AS date,
+                       commodity,
+                       {ohlc},
+                       price_usd
+                FROM {_raw("commodities")}
+                WHERE price_usd IS NOT NULL
             )
             SELECT
-                date,
-                EXTRACT(YEAR FROM date)    AS year,
-                EXTRACT(MONTH FROM date)   AS month,
-                EXTRACT(QUARTER FROM date) AS quarter,
-                strftime(date, '%B')       AS month_name
-            FROM dates
-            ORDER BY date
-        ) TO '{_m("dim_date.parquet")}' (FORMAT PARQUET)
-    """)
-
-    # ── 2. dim_product ───────────────────────────────────────────────────
-    off_path = _p("openfoodfacts_products.parquet")
-    if os.path.exists(off_path.replace("/", os.sep)):
-        print("Building dim_product...")
-        con.execute(f"""
-            COPY (
-                SELECT
-                    product_id,
-                    product_name,
-                    brand,
-                    category,
-                    nutriscore,
-                    origin_country,
-                    -- Flag ingredient-based commodity exposure
-                    CASE
-                        WHEN LOWER(category) LIKE '%chocolate%'
-                          OR LOWER(category) LIKE '%cacao%'
-                          OR LOWER(category) LIKE '%cocoa%'       THEN 'Cocoa'
-                        WHEN LOWER(category) LIKE '%coffee%'
-                          OR LOWER(category) LIKE '%café%'        THEN 'Coffee'
-                        WHEN LOWER(category) LIKE '%sugar%'
-                          OR LOWER(category) LIKE '%sucre%'
-                          OR LOWER(category) LIKE '%confiture%'
-                          OR LOWER(category) LIKE '%bonbon%'
-                          OR LOWER(category) LIKE '%candy%'       THEN 'Sugar'
-                        WHEN LOWER(category) LIKE '%bread%'
-                          OR LOWER(category) LIKE '%pain%'
-                          OR LOWER(category) LIKE '%cereal%'
-                          OR LOWER(category) LIKE '%céréal%'
-                          OR LOWER(category) LIKE '%flour%'
-                          OR LOWER(category) LIKE '%farine%'
-                          OR LOWER(category) LIKE '%wheat%'
-                          OR LOWER(category) LIKE '%biscuit%'     THEN 'Wheat'
-                        ELSE 'Other'
-                    END AS primary_commodity_exposure
-                FROM read_parquet('{off_path}')
-                WHERE product_id IS NOT NULL
-            ) TO '{_m("dim_product.parquet")}' (FORMAT PARQUET)
-        """)
-    else:
-        print("⚠ Skipping dim_product — openfoodfacts_products.parquet not found (non-critical source)")
+                r.resolution,
+                DATE_TRUNC(r.resolution, d.date) AS date,
+                d.commodity,
+                ARG_MIN(d.open_usd, d.date)  AS open_usd,
+                MAX(d.high_usd)              AS high_usd,
+                MIN(d.low_usd)               AS low_usd,
+                ARG_MAX(d.price_usd, d.date) AS close_usd,
+                AVG(d.price_usd)             AS mean_usd,
+                COUNT(*)                     AS n_obs,
+                MAX(d.date)                  AS last_date
+            FROM days d
+            CROSS JOIN (VALUES {resolutions}) r(resolution)
+            GROUP BY ALL
+    """
 
-    # ── 3. fact_commodities ──────────────────────────────────────────────
-    print("Building fact_commodities...")
-    con.execute(f"""
-        COPY (
-            SELECT
-                date,
-                commodity,
-                price_usd,
-                -- WoW % change (1 week)
-                (price_usd - LAG(price_usd, 1) OVER (PARTITION BY commodity ORDER BY date))
-                    / NULLIF(LAG(price_usd, 1) OVER (PARTITION BY commodity ORDER BY date), 0) * 100
-                    AS wow_change_pct,
-                -- YoY % change (~52 weeks)
-                (price_usd - LAG(price_usd, 52) OVER (PARTITION BY commodity ORDER BY date))
-                    / NULLIF(LAG(price_usd, 52) OVER (PARTITION BY commodity ORDER BY date), 0) * 100
-                    AS yoy_change_pct,
-                -- Rolling 13-week average (~3 months)
-                AVG(price_usd) OVER (PARTITION BY commodity ORDER BY date ROWS BETWEEN 12 PRECEDING AND CURRENT ROW)
-                    AS rolling_13w_avg
-            FROM read_parquet('{_p("commodities_prices.parquet")}')
-            ORDER BY commodity, date
-        ) TO '{_m("fact_commodities.parquet")}' (FORMAT PARQUET)
-    """)
-
-    # ── 4. fact_inflation ────────────────────────────────────────────────
-    print("Building fact_inflation...")
-    con.execute(f"""
-        COPY (
-            SELECT
-                date,
-                category,
-                cpi_index,
-                idbank,
-                -- YoY % change in CPI
-                (cpi_index - LAG(cpi_index, 12) OVER (PARTITION BY category ORDER BY date))
-                    / NULLIF(LAG(cpi_index, 12) OVER (PARTITION BY category ORDER BY date), 0) * 100
-                    AS yoy_inflation_pct,
-                -- MoM % change
-                (cpi_index - LAG(cpi_index, 1) OVER (PARTITION BY category ORDER BY date))
-                    / NULLIF(LAG(cpi_index, 1) OVER (PARTITION BY category ORDER BY date), 0) * 100
-                    AS mom_change_pct
-            FROM read_parquet('{_p("insee_cpi_france.parquet")}')
-            ORDER BY category, date
-        ) TO '{_m("fact_inflation.parquet")}' (FORMAT PARQUET)
-    """)
-
-    # ── 5. fact_fx ───────────────────────────────────────────────────────
-    print("Building fact_fx...")
-    con.execute(f"""
-        COPY (
-            WITH monthly_fx AS (
+def _commodity_monthly_sql(marts) -> str:
+    # Month-end close from the pyramid, with the YoY of the week holding that close.
+    return f"""
                 SELECT
-                    DATE_TRUNC('month', date) AS date,
-                    AVG(fx_eur_usd) AS fx_eur_usd
-                FROM read_parquet('{_p("ecb_fx_eur_usd.parquet")}')
-                GROUP BY 1
-            )
-            SELECT
-                date,
-                fx_eur_usd,
-                (fx_eur_usd - LAG(fx_eur_usd, 12) OVER (ORDER BY date))
-                    / NULLIF(LAG(fx_eur_usd, 12) OVER (ORDER BY date), 0) * 100
-                    AS yoy_change_pct
-            FROM monthly_fx
-            ORDER BY date
-        ) TO '{_m("fact_fx.parquet")}' (FORMAT PARQUET)
-    """)
-
-    # ── 6. mart_category_pressure ────────────────────────────────────────
-    # Inflation is monthly, so resample weekly commodity data to monthly for the join.
-    print("Building mart_category_pressure...")
-    con.execute(f"""
-        COPY (
+                    p.commodity,
+                    p.date,
+                    p.close_usd AS price_usd,
+                    f.yoy_change_pct
+                FROM {marts.ref("fact_price_pyramid")} p
+                LEFT JOIN {marts.ref("fact_commodities")} f
+                       ON f.commodity = p.commodity AND f.date = DATE_TRUNC('week', p.last_date)
+                WHERE p.resolution = 'month'
+    """
+
+def _category_pressure_sql(marts) -> str:
+    # Inflation is monthly, so commodities are taken at the pyramid's monthly level for the join.
+    mapping = " UNION ALL\n                ".join(
+        f"SELECT {_sql_literal(category)} AS inflation_category, {_sql_literal(commodity)} AS commodity"
+        for category, commodity in CATEGORY_COMMODITY_MAP
+    )
+    return f"""
             WITH commodity_monthly AS (
+                {_commodity_monthly_sql(marts)}
+            ),
+            -- Weeks go to the month of their close (price_date), as on the USD side,
+            -- not of their Monday.
+            commodity_eur_monthly AS (
                 SELECT
                     commodity,
-                    DATE_TRUNC('month', date) AS date,
-                    LAST(price_usd ORDER BY date) AS price_usd,
-                    LAST(yoy_change_pct ORDER BY date) AS yoy_change_pct
-                FROM read_parquet('{_m("fact_commodities.parquet")}')
-                GROUP BY commodity, DATE_TRUNC('month', date)
+                    DATE_TRUNC('month', price_date) AS date,
+                    LAST(price_eur ORDER BY price_date) AS price_eur,
+                    LAST(eur_yoy_change_pct ORDER BY price_date) AS eur_yoy_change_pct
+                FROM {marts.ref("fact_commodities_eur")}
+                GROUP BY commodity, DATE_TRUNC('month', price_date)
             ),
             inflation AS (
                 SELECT
@@ -163,19 +297,14 @@ def build_marts():
                     date,
                     cpi_index,
                     yoy_inflation_pct
-                FROM read_parquet('{_m("fact_inflation.parquet")}')
+                FROM {marts.ref("fact_inflation")}
             ),
             fx AS (
                 SELECT date, fx_eur_usd, yoy_change_pct AS fx_yoy_pct
-                FROM read_parquet('{_m("fact_fx.parquet")}')
+                FROM {marts.ref("fact_fx")}
             ),
-            -- Map INSEE inflation categories to commodity names
             mapping AS (
-                SELECT 'Coffee, Tea, Cocoa' AS inflation_category, 'Cocoa'  AS commodity UNION ALL
-                SELECT 'Coffee, Tea, Cocoa',                        'Coffee'            UNION ALL
-                SELECT 'Sugar, Jam, Honey, Chocolate',              'Sugar'             UNION ALL
-                SELECT 'Sugar, Jam, Honey, Chocolate',              'Cocoa'             UNION ALL
-                SELECT 'Bread & Cereals',                           'Wheat'
+                {mapping}
             )
             SELECT
                 i.date,
@@ -188,53 +317,609 @@ def build_marts():
                 f.fx_eur_usd,
                 f.fx_yoy_pct,
                 -- Pressure score: if commodity cost rises faster than consumer inflation
-                COALESCE(c.yoy_change_pct, 0) - COALESCE(i.yoy_inflation_pct, 0) AS cost_squeeze_score
+                COALESCE(c.yoy_change_pct, 0) - COALESCE(i.yoy_inflation_pct, 0) AS cost_squeeze_score,
+                -- Same score on the EUR cost a French buyer pays
+                e.price_eur           AS commodity_price_eur,
+                e.eur_yoy_change_pct  AS commodity_eur_yoy_pct,
+                COALESCE(e.eur_yoy_change_pct, 0) - COALESCE(i.yoy_inflation_pct, 0) AS cost_squeeze_score_eur
             FROM inflation i
             INNER JOIN mapping m ON i.inflation_category = m.inflation_category
             LEFT  JOIN commodity_monthly c ON m.commodity = c.commodity AND i.date = c.date
+            LEFT  JOIN commodity_eur_monthly e ON m.commodity = e.commodity AND i.date = e.date
             LEFT  JOIN fx f ON i.date = f.date
             WHERE c.price_usd IS NOT NULL
-            ORDER BY i.date, i.inflation_category
-        ) TO '{_m("mart_category_pressure.parquet")}' (FORMAT PARQUET)
-    """)
-
-    # ── 7. mart_momentum ─────────────────────────────────────────────────
-    # Short-term momentum: last 16 weeks of prices + 4-week and 12-week changes.
-    print("Building mart_momentum...")
-    con.execute(f"""
-        COPY (
-            WITH ranked AS (
+    """
+
+def _commodities_eur_sql(marts) -> str:
+    # Each commodity observation takes the latest ECB fixing on or before the day
+    # of its close (price_date: the week's last trading day in the pyramid, while
+    # date is the week's Monday). EUR/USD is USD per EUR. EUR YoY compares with the
+    # EUR price 52 weeks earlier, as-of as well, so it holds for weekly and daily
+    # series alike.
+    return f"""
+            WITH fx AS (
+                SELECT date, fx_eur_usd
+                FROM {_raw("ecb")}
+                WHERE fx_eur_usd IS NOT NULL
+            ),
+            closes AS (
+                SELECT c.*, p.last_date AS price_date
+                FROM {marts.ref("fact_commodities")} c
+                JOIN {marts.ref("fact_price_pyramid")} p
+                  ON p.resolution = 'week' AND p.commodity = c.commodity AND p.date = c.date
+            ),
+            eur AS (
                 SELECT
-                    date,
-                    commodity,
-                    price_usd,
-                    wow_change_pct,
-                    rolling_13w_avg,
-                    ROW_NUMBER() OVER (PARTITION BY commodity ORDER BY date DESC) AS rn
-                FROM read_parquet('{_m("fact_commodities.parquet")}')
+                    c.date,
+                    c.commodity,
+                    c.price_date,
+                    c.price_usd,
+                    c.yoy_change_pct AS usd_yoy_change_pct,
+                    f.date AS fx_date,
+                    f.fx_eur_usd,
+                    c.price_usd / f.fx_eur_usd AS price_eur
+                FROM closes c
+                ASOF LEFT JOIN fx f ON c.price_date >= f.date
             )
+            SELECT
+                e.*,
+                (e.price_eur - p.price_eur) / NULLIF(p.price_eur, 0) * 100 AS eur_yoy_change_pct
+            FROM eur e
+            ASOF LEFT JOIN eur p ON e.commodity = p.commodity AND e.date - INTERVAL 52 WEEK >= p.date
+    """
+
+def _momentum_sql(marts, where: str = None) -> str:
+    # Short-term momentum: last 16 weeks of prices + 4-week and 12-week changes (features of fact_commodities).
+    return f"""
             SELECT
                 date,
                 commodity,
                 price_usd,
                 wow_change_pct,
                 rolling_13w_avg,
-                -- 4-week change
-                (price_usd - LEAD(price_usd, 4) OVER (PARTITION BY commodity ORDER BY date DESC))
-                    / NULLIF(LEAD(price_usd, 4) OVER (PARTITION BY commodity ORDER BY date DESC), 0) * 100
-                    AS change_4w_pct,
-                -- 12-week change
-                (price_usd - LEAD(price_usd, 12) OVER (PARTITION BY commodity ORDER BY date DESC))
-                    / NULLIF(LEAD(price_usd, 12) OVER (PARTITION BY commodity ORDER BY date DESC), 0) * 100
-                    AS change_12w_pct
-            FROM ranked
-            WHERE rn <= 16
-            ORDER BY commodity, date
-        ) TO '{_m("mart_momentum.parquet")}' (FORMAT PARQUET)
-    """)
+                change_4w_pct,
+                change_12w_pct
+            FROM {marts.ref("fact_commodities")}
+            WHERE {where or "TRUE"}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY commodity ORDER BY date DESC) <= 16
+    """
 
-    con.close()
-    print("All marts built successfully!")
+def _passthrough_sql(marts) -> str:
+    # Every category × commodity pair, flagged when it is in CATEGORY_COMMODITY_MAP;
+    # the peak lag is the one with the highest correlation of its pair (the
+    # shortest lag on ties, so each pair has exactly one).
+    mapped = ", ".join(f"({_sql_literal(category)}, {_sql_literal(commodity)})"
+                       for category, commodity in CATEGORY_COMMODITY_MAP)
+    return f"""
+            SELECT
+                inflation_category,
+                commodity,
+                lag_months::INTEGER AS lag_months,
+                n_obs::INTEGER AS n_obs,
+                correlation::DOUBLE AS correlation,
+                passthrough_ratio::DOUBLE AS passthrough_ratio,
+                (inflation_category, commodity) IN ({mapped}) AS mapped,
+                correlation IS NOT NULL AND ROW_NUMBER() OVER (
+                    PARTITION BY inflation_category, commodity
+                    ORDER BY correlation DESC NULLS LAST, lag_months
+                ) = 1 AS is_peak_lag
+            FROM passthrough
+    """
+
+def _pressure_changes(changes):
+    """
+    First month to recompute per (inflation_category, commodity) pair, from
+    the changes of the three facts it joins (fact_commodities_eur only derives
+    from fact_commodities and the ECB rates, so it adds no later change unless
+    it was rebuilt). None means rebuild everything.
+    """
+    if any(changes[name] is None for name in [*FACTS, "fact_commodities_eur"]):
+        return None
+    fx_from = changes["fact_fx"].get(())
+    bounds = {}
+    for category, commodity in CATEGORY_COMMODITY_MAP:
+        commodity_from = changes["fact_commodities"].get((commodity,))
+        if commodity_from is not None:
+            commodity_from = pd.Timestamp(commodity_from).to_period("M").to_timestamp()
+        dates = [d for d in (commodity_from, changes["fact_inflation"].get((category,)), fx_from) if d is not None]
+        if dates:
+            bounds[(category, commodity)] = min(pd.Timestamp(d) for d in dates)
+    return bounds
+
+
+# ── incremental builds ───────────────────────────────────────────────────
+def _fingerprint(source: str) -> list:
+    """Identity of a raw source's current snapshot: part hashes, or file stats for flat files."""
+    entries = raw_store.snapshot_entries(source, RAW_DIR)
+    if entries:
+        fingerprint = [e["sha256"] for e in entries]
+    else:
+        fingerprint = _file_stats([os.path.join(RAW_DIR, LEGACY_RAW_FILES[source])])
+    if source == "openfoodfacts":
+        fingerprint += _file_stats(glob.glob(_p("openfoodfacts_dump/*/*.parquet")))
+    return fingerprint
+
+def _file_stats(paths) -> list:
+    return [f"{os.path.basename(p)}:{os.stat(p).st_size}:{os.stat(p).st_mtime_ns}"
+            for p in sorted(paths) if os.path.exists(p)]
+
+def _load_state():
+    path = os.path.join(MARTS_DIR, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_state(fingerprints, nodes):
+    path = os.path.join(MARTS_DIR, STATE_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"sources": fingerprints, "nodes": nodes}, f, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+def _changed_partitions(marts, name, fact, previous, fingerprints):
+    """
+    Which partitions of a fact must be recomputed: None for the whole table,
+    otherwise {key tuple: first changed date}, empty when the source is unchanged.
+
+    Parts appended to an append source since the last build are the delta
+    themselves; any other change is found by diffing the new base rows
+    against the stored fact.
+    """
+    source = fact["source"]
+    if previous is None or not marts.exists(name):
+        return None
+    if fingerprints[source] == previous.get(source):
+        return {}
+
+    keys = fact["keys"]
+    entries = raw_store.snapshot_entries(source, RAW_DIR)
+    known = set(previous.get(source) or [])
+    if entries and entries[-1]["mode"] == "append" and known <= {e["sha256"] for e in entries}:
+        new_parts = ", ".join(f"'{_p(e['path'])}'" for e in entries if e["sha256"] not in known)
+        first = f"MIN(DATE_TRUNC('{fact['grain']}', date))" if "grain" in fact else "MIN(date)"
+        query = f"""
+            SELECT {", ".join([*keys, first])}
+            FROM read_parquet([{new_parts}])
+            {"GROUP BY ALL" if keys else ""}
+        """
+    else:
+        key_cols = [f"COALESCE(n.{k}, o.{k})" for k in keys]
+        on = " AND ".join([*(f"n.{k} = o.{k}" for k in keys), "n.date = o.date"])
+        differs = " OR ".join(["n.date IS NULL", "o.date IS NULL",
+                               *(f"n.{v} IS DISTINCT FROM o.{v}" for v in fact["values"])])
+        query = f"""
+            SELECT {", ".join([*key_cols, "MIN(COALESCE(n.date, o.date))"])}
+            FROM {fact["base"](marts)} n
+            FULL OUTER JOIN {marts.ref(name)} o ON {on}
+            WHERE {differs}
+            {"GROUP BY ALL" if keys else ""}
+        """
+    return {tuple(row[:-1]): row[-1] for row in marts.con.execute(query).fetchall() if row[-1] is not None}
+
+def _build_fact(marts, name, fact, changed):
+    keys = fact["keys"]
+    if changed is None:
+        print(f"Building {name}...")
+        marts.write(compile_features(FEATURES[name], fact["base"](marts)), name)
+        return "built"
+    if not changed:
+        return "unchanged"
+
+    # Start each changed key `lookback` stored rows before its first change,
+    # so the window functions see the same history as in a full build.
+    print(f"Patching {name} ({len(changed)} partitions)...")
+    window = f"PARTITION BY {', '.join(keys)}" if keys else ""
+    rows = marts.con.execute(f"""
+        SELECT {", ".join([*keys, "MIN(date)"])}
+        FROM (
+            SELECT {", ".join([*keys, "date"])},
+                   ROW_NUMBER() OVER ({window} ORDER BY date DESC) AS rn
+            FROM {marts.ref(name)}
+            WHERE {_partition_filter(keys, changed, "<")}
+        )
+        WHERE rn <= {fact["lookback"]}
+        {"GROUP BY ALL" if keys else ""}
+    """).fetchall()
+    read_from = dict(changed)
+    read_from.update({tuple(row[:-1]): row[-1] for row in rows if row[-1] is not None})
+
+    recomputed = f"""
+        SELECT * FROM ({compile_features(FEATURES[name], fact["base"](marts, _partition_filter(keys, read_from)))})
+        WHERE {_partition_filter(keys, changed)}
+    """
+    marts.patch(name, _partition_filter(keys, changed), recomputed)
+    return "patched"
+
+def _partition_filter(keys, bounds, op=">="):
+    """SQL predicate selecting, for each key tuple in `bounds`, its rows dated `op` the bound."""
+    clauses = []
+    for key, bound in bounds.items():
+        terms = [f"{k} = {_sql_literal(v)}" for k, v in zip(keys, key)]
+        terms.append(f"date {op} TIMESTAMP '{pd.Timestamp(bound):%Y-%m-%d %H:%M:%S}'")
+        clauses.append(f"({' AND '.join(terms)})")
+    return " OR ".join(clauses) or "FALSE"
+
+
+# ── DAG nodes ────────────────────────────────────────────────────────────
+# Each node builds one mart and returns its status: "built", "patched",
+# "unchanged" or "missing" (no input). `patchable` is True when an
+# incremental run may patch the existing mart (same SQL as last build).
+def _fact_node(marts, name, run, patchable):
+    fact = FACTS[name]
+    # A fact reading a node that was rebuilt from scratch is rebuilt as well.
+    patchable = patchable and all(run["changes"].get(dep) is not None for dep in _node_deps(name))
+    changed = _changed_partitions(marts, name, fact, run["previous"] if patchable else None, run["fingerprints"])
+    run["changes"][name] = changed
+    return _build_fact(marts, name, fact, changed)
+
+def _dim_date_node(marts, name, run, patchable):
+    print("Building dim_date...")
+    marts.write(f"""
+            WITH dates AS (
+                SELECT DISTINCT date FROM {_raw("insee")}
+                UNION
+                SELECT DISTINCT date FROM {_raw("commodities")}
+            )
+            SELECT
+                date,
+                EXTRACT(YEAR FROM date)    AS year,
+                EXTRACT(MONTH FROM date)   AS month,
+                EXTRACT(QUARTER FROM date) AS quarter,
+                strftime(date, '%B')       AS month_name
+            FROM dates
+    """, name)
+    return "built"
+
+def _off_source():
+    """SQL relation of the product catalogue, or None when there is none."""
+    # Prefer the bulk-export partition of OFF_COUNTRY (openfoodfacts_dump.py) over the search API sample.
+    off_dump = _p(f"openfoodfacts_dump/country={OFF_COUNTRY}/*.parquet")
+    if glob.glob(off_dump):
+        return f"read_parquet('{off_dump}', union_by_name = true)"
+    if _has_raw("openfoodfacts"):
+        return _raw("openfoodfacts")
+    return None
+
+def _product_bridge_node(marts, name, run, patchable):
+    off_source = _off_source()
+    if not off_source:
+        return "missing"
+    print("Building bridge_product_commodity...")
+    columns = {row[0] for row in marts.con.execute(f"DESCRIBE SELECT * FROM {off_source}").fetchall()}
+    # Older extracts only kept the first category.
+    text = [f"{'categories' if 'categories' in columns else 'category'} AS categories"]
+    if "ingredients_text" in columns:
+        text.append("ingredients_text")
+    products = marts.con.execute(f"""
+        SELECT product_id, {", ".join(text)}
+        FROM {off_source}
+        WHERE product_id IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY product_id) = 1
+    """).df()
+    # Serial: this runs on a DAG worker thread, next to DuckDB queries on sibling cursors.
+    bridge = classify_products(products, workers=1)
+    marts.con.register("product_bridge", bridge)
+    try:
+        marts.write(f"""
+            SELECT product_id::VARCHAR AS product_id, commodity::VARCHAR AS commodity,
+                   weight::DOUBLE AS weight, matches::INTEGER AS matches
+            FROM product_bridge
+        """, name)
+    finally:
+        marts.con.unregister("product_bridge")
+    return "built"
+
+def _dim_product_node(marts, name, run, patchable):
+    off_source = _off_source()
+    if not off_source:
+        print("⚠ Skipping dim_product — openfoodfacts_products.parquet not found (non-critical source)")
+        return "missing"
+
+    # Primary exposure: the highest-weight commodity of the bridge, ties broken
+    # in COMMODITY_KEYWORDS order; 'Other' when no keyword matched.
+    priority = ", ".join(_sql_literal(c) for c in COMMODITY_KEYWORDS)
+    print("Building dim_product...")
+    marts.write(f"""
+                WITH primary_exposure AS (
+                    SELECT product_id, commodity
+                    FROM {marts.ref("bridge_product_commodity")}
+                    QUALIFY ROW_NUMBER() OVER (
+                        PARTITION BY product_id ORDER BY weight DESC, list_position([{priority}], commodity)
+                    ) = 1
+                )
+                SELECT
+                    p.product_id,
+                    p.product_name,
+                    p.brand,
+                    p.category,
+                    p.nutriscore,
+                    p.origin_country,
+                    COALESCE(e.commodity, 'Other') AS primary_commodity_exposure
+                FROM {off_source} p
+                LEFT JOIN primary_exposure e ON p.product_id = e.product_id
+                WHERE p.product_id IS NOT NULL
+    """, name)
+    return "built"
+
+def _price_pyramid_node(marts, name, run, patchable):
+    if not _has_raw("commodities"):
+        run["changes"][name] = None
+        return "missing"
+    print(f"Building fact_price_pyramid ({', '.join(PYRAMID_RESOLUTIONS)})...")
+    marts.write(_price_pyramid_sql(marts), name)
+    # Rebuilt from the same raw rows as fact_commodities, whose changes cover it,
+    # unless its SQL changed.
+    run["changes"][name] = {} if patchable else None
+    return "built"
+
+def _commodities_eur_node(marts, name, run, patchable):
+    if not _has_raw("ecb"):
+        run["changes"][name] = None
+        return "missing"
+    print("Building fact_commodities_eur...")
+    marts.write(_commodities_eur_sql(marts), name)
+    # A same-SQL rebuild only reflects its inputs' changes, already tracked per fact.
+    run["changes"][name] = {} if patchable else None
+    return "built"
+
+def _category_pressure_node(marts, name, run, patchable):
+    pressure = _pressure_changes(run["changes"]) if patchable else None
+    if pressure is None:
+        print("Building mart_category_pressure...")
+        marts.write(_category_pressure_sql(marts), name)
+        return "built"
+    if not pressure:
+        return "unchanged"
+    print(f"Patching mart_category_pressure ({len(pressure)} category/commodity pairs)...")
+    changed = _partition_filter(["inflation_category", "commodity"], pressure)
+    marts.patch(name, changed, f"SELECT * FROM ({_category_pressure_sql(marts)}) WHERE {changed}")
+    return "patched"
+
+def _momentum_node(marts, name, run, patchable):
+    momentum = run["changes"]["fact_commodities"] if patchable else None
+    if momentum is None:
+        print("Building mart_momentum...")
+        marts.write(_momentum_sql(marts), name)
+        return "built"
+    if not momentum:
+        return "unchanged"
+    print(f"Patching mart_momentum ({len(momentum)} commodities)...")
+    changed = f"commodity IN ({', '.join(_sql_literal(key[0]) for key in momentum)})"
+    marts.patch(name, changed, _momentum_sql(marts, changed))
+    return "patched"
+
+def _monthly_yoy(marts):
+    """Wide (month × series) YoY % frames of the inflation categories and commodities."""
+    # Commodities at month end, as in mart_category_pressure.
+    commodities = marts.con.execute(f"""
+        SELECT date, commodity, yoy_change_pct AS yoy
+        FROM ({_commodity_monthly_sql(marts)})
+    """).df().pivot(index="date", columns="commodity", values="yoy")
+    inflation = marts.con.execute(f"""
+        SELECT DATE_TRUNC('month', date) AS date, category, LAST(yoy_inflation_pct ORDER BY date) AS yoy
+        FROM {marts.ref("fact_inflation")}
+        GROUP BY ALL
+    """).df().pivot(index="date", columns="category", values="yoy")
+    return inflation, commodities
+
+def _passthrough_node(marts, name, run, patchable):
+    print(f"Building mart_passthrough_lags (lags 0-{MAX_LAG} months)...")
+    marts.con.register("passthrough", lagged_passthrough(*_monthly_yoy(marts)))
+    try:
+        marts.write(_passthrough_sql(marts), name)
+    finally:
+        marts.con.unregister("passthrough")
+    return "built"
+
+def _rolling_passthrough_node(marts, name, run, patchable):
+    # Each pair is regressed at its peak lag from mart_passthrough_lags.
+    print(f"Building mart_pass_through ({PASSTHROUGH_WINDOW}-month rolling elasticities)...")
+    inflation, commodities = _monthly_yoy(marts)
+    fx = marts.con.execute(f"SELECT date, yoy_change_pct FROM {marts.ref('fact_fx')}").df()
+    lags = marts.con.execute(f"""
+        SELECT inflation_category, commodity, lag_months
+        FROM {marts.ref("mart_passthrough_lags")}
+        WHERE is_peak_lag
+    """).df()
+    rolling = rolling_passthrough(inflation, commodities, fx.set_index("date")["yoy_change_pct"], lags,
+                                  window=PASSTHROUGH_WINDOW)
+    marts.con.register("rolling_passthrough", rolling)
+    try:
+        marts.write(f"""
+            SELECT
+                date::DATE AS date,
+                inflation_category::VARCHAR AS inflation_category,
+                commodity::VARCHAR AS commodity,
+                lag_months::INTEGER AS lag_months,
+                n_obs::INTEGER AS n_obs,
+                elasticity::DOUBLE AS elasticity,
+                fx_elasticity::DOUBLE AS fx_elasticity,
+                intercept::DOUBLE AS intercept,
+                r_squared::DOUBLE AS r_squared
+            FROM rolling_passthrough
+        """, name)
+    finally:
+        marts.con.unregister("rolling_passthrough")
+    return "built"
+
+def _scenario_node(marts, name, run, patchable):
+    print(f"Building mart_squeeze_scenarios ({SCENARIOS['paths']:,} {SCENARIOS['method']} paths)...")
+    # Month-end commodity prices from the pyramid, joined to the monthly FX rate.
+    prices = marts.con.execute(f"""
+        SELECT date, commodity, close_usd AS price_usd
+        FROM {marts.ref("fact_price_pyramid")}
+        WHERE resolution = 'month'
+    """).df().pivot(index="date", columns="commodity", values="price_usd")
+    fx = marts.con.execute(f"SELECT date, fx_eur_usd FROM {marts.ref('fact_fx')}").df().set_index("date")
+    cpi_yoy = marts.con.execute(f"""
+        SELECT category, yoy_inflation_pct
+        FROM {marts.ref("fact_inflation")}
+        WHERE yoy_inflation_pct IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY category ORDER BY date DESC) = 1
+    """).df().set_index("category")["yoy_inflation_pct"]
+    # Equal weight for each commodity mapped to a category.
+    exposure = pd.crosstab(*zip(*CATEGORY_COMMODITY_MAP), normalize="index")
+    result = simulate_squeeze(prices.join(fx, how="inner"), exposure, cpi_yoy, **SCENARIOS)
+    marts.con.register("scenarios", result)
+    try:
+        marts.write(f"""
+            SELECT
+                inflation_category::VARCHAR AS inflation_category,
+                horizon_months::INTEGER AS horizon_months,
+                method::VARCHAR AS method,
+                paths::INTEGER AS paths,
+                cpi_yoy_pct::DOUBLE AS cpi_yoy_pct,
+                mean_squeeze::DOUBLE AS mean_squeeze,
+                p05_squeeze::DOUBLE AS p05_squeeze,
+                p25_squeeze::DOUBLE AS p25_squeeze,
+                p50_squeeze::DOUBLE AS p50_squeeze,
+                p75_squeeze::DOUBLE AS p75_squeeze,
+                p95_squeeze::DOUBLE AS p95_squeeze,
+                prob_squeeze::DOUBLE AS prob_squeeze
+            FROM scenarios
+        """, name)
+    finally:
+        marts.con.unregister("scenarios")
+    return "built"
+
+# The mart DAG. `inputs` are raw sources ("raw:<source>") or other nodes;
+# `sql` lists the functions (or modules) whose source text defines the node, and
+# `params` any constant it depends on, both hashed to detect SQL changes.
+NODES = {
+    "fact_price_pyramid": {"inputs": ["raw:commodities"], "build": _price_pyramid_node, "sql": [_price_pyramid_sql],
+                           "params": lambda: PYRAMID_RESOLUTIONS},
+    "fact_commodities": {"inputs": ["raw:commodities", "fact_price_pyramid"], "build": _fact_node,
+                         "sql": [_build_fact, _weekly_prices, compile_features],
+                         "params": lambda: FEATURES["fact_commodities"]},
+    "fact_inflation": {"inputs": ["raw:insee"], "build": _fact_node,
+                       "sql": [_build_fact, compile_features], "params": lambda: FEATURES["fact_inflation"]},
+    "fact_fx": {"inputs": ["raw:ecb"], "build": _fact_node,
+                "sql": [_build_fact, _monthly_fx, compile_features], "params": lambda: FEATURES["fact_fx"]},
+    "fact_commodities_eur": {"inputs": ["fact_commodities", "fact_price_pyramid", "raw:ecb"], "build": _commodities_eur_node,
+                             "sql": [_commodities_eur_sql]},
+    "dim_date": {"inputs": ["raw:insee", "raw:commodities"], "build": _dim_date_node},
+    "bridge_product_commodity": {"inputs": ["raw:openfoodfacts"], "build": _product_bridge_node,
+                                 "sql": [_off_source, commodity_classifier]},
+    "dim_product": {"inputs": ["raw:openfoodfacts", "bridge_product_commodity"], "build": _dim_product_node,
+                    "sql": [_off_source]},
+    "mart_category_pressure": {"inputs": ["fact_price_pyramid", "fact_commodities", "fact_inflation", "fact_fx",
+                                          "fact_commodities_eur"],
+                               "build": _category_pressure_node, "sql": [_category_pressure_sql, _commodity_monthly_sql],
+                               "params": lambda: CATEGORY_COMMODITY_MAP},
+    "mart_momentum": {"inputs": ["fact_commodities"], "build": _momentum_node, "sql": [_momentum_sql]},
+    "mart_passthrough_lags": {"inputs": ["fact_price_pyramid", "fact_commodities", "fact_inflation"],
+                              "build": _passthrough_node,
+                              "sql": [_passthrough_sql, _monthly_yoy, _commodity_monthly_sql, passthrough],
+                              "params": lambda: CATEGORY_COMMODITY_MAP},
+    "mart_pass_through": {"inputs": ["fact_price_pyramid", "fact_commodities", "fact_inflation", "fact_fx",
+                                     "mart_passthrough_lags"],
+                          "build": _rolling_passthrough_node, "sql": [_monthly_yoy, _commodity_monthly_sql, passthrough],
+                          "params": lambda: PASSTHROUGH_WINDOW},
+    "mart_squeeze_scenarios": {"inputs": ["fact_price_pyramid", "fact_inflation", "fact_fx"], "build": _scenario_node,
+                               "sql": [scenarios], "params": lambda: [SCENARIOS, CATEGORY_COMMODITY_MAP]},
+}
+
+def _node_deps(name):
+    return [dep for dep in NODES[name]["inputs"] if not dep.startswith("raw:")]
+
+def _sql_hash(name):
+    """
+    Hash of what defines a node's output: its build and SQL functions, its
+    params, the helpers every mart goes through (raw reads, the parquet COPY),
+    its layout and sort order and, for a fact, its FACTS entry.
+    """
+    node = NODES[name]
+    digest = hashlib.sha256()
+    for fn in [node["build"], *node.get("sql", []), _raw, _copy]:
+        digest.update(inspect.getsource(fn).encode())
+    digest.update(repr(node.get("params", lambda: None)()).encode())
+    digest.update(repr([_layout(name), MART_ORDER.get(name)]).encode())
+    if name in FACTS:
+        fact = FACTS[name]
+        digest.update(repr({k: v for k, v in fact.items() if k != "base"}).encode())
+        digest.update(inspect.getsource(fact["base"]).encode())
+    return digest.hexdigest()
+
+def _node_hash(name, hashes, fingerprints):
+    """Hash of a node's SQL and of its inputs: raw fingerprints and upstream node hashes."""
+    inputs = [fingerprints[dep[4:]] if dep.startswith("raw:") else hashes[dep] for dep in NODES[name]["inputs"]]
+    return hashlib.sha256(json.dumps([_sql_hash(name), inputs]).encode()).hexdigest()
+
+def _run_node(marts, name, node_hash, previous_nodes, run):
+    """Run one node on its own cursor; returns (status, seconds)."""
+    start = time.perf_counter()
+    previous = previous_nodes.get(name, {})
+    try:
+        if previous.get("hash") == node_hash and marts.exists(name):
+            print(f"{name} unchanged — skipped.")
+            run["changes"][name] = {}
+            status = "skipped"
+        else:
+            patchable = run["incremental"] and previous.get("sql") == _sql_hash(name) and marts.exists(name)
+            status = NODES[name]["build"](marts, name, run, patchable)
+    finally:
+        marts.con.close()
+    return status, time.perf_counter() - start
+
+
+# ── mart storage ─────────────────────────────────────────────────────────
+class _MartWriter:
+    """
+    Where marts are materialised: parquet files in MARTS_DIR, or tables of a
+    persistent warehouse whose changed tables are exported to parquet by publish().
+    """
+
+    def __init__(self, con, warehouse=False):
+        self.con = con
+        self.warehouse = warehouse
+        self._written = set()
+
+    def cursor(self):
+        """Writer on a new cursor of the same database, for one concurrently running node."""
+        writer = _MartWriter(self.con.cursor(), self.warehouse)
+        writer._written = self._written
+        return writer
+
+    def ref(self, name: str) -> str:
+        """SQL relation of a mart built earlier in the run (or by a previous run)."""
+        return name if self.warehouse else parquet_relation(_m(f"{name}.parquet"))
+
+    def exists(self, name: str) -> bool:
+        if self.warehouse:
+            return bool(self.con.execute(
+                "SELECT 1 FROM duckdb_tables() WHERE table_name = ?", [name]).fetchall())
+        return os.path.exists(os.path.join(MARTS_DIR, f"{name}.parquet"))
+
+    def write(self, query: str, name: str):
+        if self.warehouse:
+            self.con.execute(f"CREATE OR REPLACE TABLE {name} AS {query}")
+            self._written.add(name)
+        else:
+            _copy(self.con, query, name)
+
+    def patch(self, name: str, changed: str, recomputed: str):
+        """Replace the rows of a mart matching `changed` with the recomputed ones."""
+        if self.warehouse:
+            self.con.execute("BEGIN TRANSACTION")
+            self.con.execute(f"DELETE FROM {name} WHERE {changed}")
+            self.con.execute(f"INSERT INTO {name} BY NAME SELECT * FROM ({recomputed})")
+            self.con.execute("COMMIT")
+            self._written.add(name)
+            return
+        _copy(self.con, f"""
+            SELECT * FROM {self.ref(name)} WHERE NOT ({changed})
+            UNION ALL BY NAME
+            SELECT * FROM ({recomputed})
+        """, name)
+
+    def publish(self):
+        """Export the warehouse tables written in this run (or missing on disk) to parquet."""
+        if not self.warehouse:
+            return
+        for name in MART_ORDER:
+            if self.exists(name) and (name in self._written or not os.path.exists(_m(f"{name}.parquet"))):
+                print(f"Publishing {name}.parquet...")
+                _copy(self.con, f"SELECT * FROM {name}", name)
 
 
 # ── helpers ──────────────────────────────────────────────────────────────
@@ -242,10 +927,84 @@ def _p(filename: str) -> str:
     """Return absolute path for a raw parquet file (forward-slash for DuckDB)."""
     return os.path.join(RAW_DIR, filename).replace("\\", "/")
 
+def _has_raw(source: str) -> bool:
+    """True when the lake holds a snapshot of `source` or its legacy flat file exists."""
+    return raw_store.has_snapshot(source, RAW_DIR) or os.path.exists(os.path.join(RAW_DIR, LEGACY_RAW_FILES[source]))
+
+def _raw(source: str, where: str = None) -> str:
+    """
+    SQL relation for the latest consistent snapshot of a raw source.
+    Globs the source's Hive partitions: the ingest_date filter prunes the
+    partitions outside the snapshot and the file filter keeps only parts
+    listed in the manifest. Append sources keep the latest row per key.
+    `where` filters rows before deduplication, so it reaches the scan.
+    """
+    where = where or "TRUE"
+    entries = raw_store.snapshot_entries(source, RAW_DIR)
+    if not entries:
+        return f"(SELECT * FROM read_parquet('{_p(LEGACY_RAW_FILES[source])}') WHERE {where})"
+
+    dates = ", ".join(sorted({f"DATE '{e['ingest_date']}'" for e in entries}))
+    files = ", ".join(f"'{os.path.basename(e['path'])}'" for e in entries)
+    keys = entries[-1]["keys"]
+    dedup = ""
+    if keys:
+        dedup = (f"QUALIFY ROW_NUMBER() OVER (PARTITION BY {', '.join(keys)} "
+                 f"ORDER BY ingest_date DESC, parse_filename(filename) DESC) = 1")
+    return f"""(
+        SELECT * EXCLUDE (source, ingest_date, filename)
+        FROM read_parquet('{raw_store.source_glob(source, RAW_DIR)}', hive_partitioning = true, filename = true,
+                          union_by_name = true)
+        WHERE ingest_date IN ({dates}) AND parse_filename(filename) IN ({files}) AND ({where})
+        {dedup}
+    )"""
+
 def _m(filename: str) -> str:
     """Return absolute path for a mart parquet file (forward-slash for DuckDB)."""
     return os.path.join(MARTS_DIR, filename).replace("\\", "/")
 
+def _layout(name: str) -> dict:
+    return {**MART_LAYOUT["*"], **MART_LAYOUT.get(name, {})}
+
+def _copy(con, query: str, name: str):
+    """
+    COPY `query` to <name>.parquet in the mart's layout, sorted by MART_ORDER
+    (the only place marts are sorted), through a temp file (or directory), so
+    readers never see a partial mart.
+    """
+    path, layout = _m(f"{name}.parquet"), _layout(name)
+    options = ["FORMAT PARQUET", f"COMPRESSION {layout['compression']}", f"ROW_GROUP_SIZE {layout['row_group_size']}"]
+    if layout["partition_by"]:
+        options.append(f"PARTITION_BY ({layout['partition_by']})")
+    _remove(f"{path}.tmp")
+    con.execute(f"COPY (SELECT * FROM ({query}) ORDER BY {MART_ORDER[name]}) TO '{path}.tmp' ({', '.join(options)})")
+    if os.path.isdir(path) or os.path.isdir(f"{path}.tmp"):
+        # Directories cannot be replaced atomically: swap them in with two renames.
+        _remove(f"{path}.old")
+        if os.path.exists(path):
+            os.replace(path, f"{path}.old")
+        os.replace(f"{path}.tmp", path)
+        _remove(f"{path}.old")
+    else:
+        os.replace(f"{path}.tmp", path)
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def _sql_literal(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
 
 if __name__ == "__main__":
-    build_marts()
+    parser = argparse.ArgumentParser(description="Build the DuckDB marts from the raw lake.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Recompute only the partitions touched by raw changes since the last build.")
+    parser.add_argument("--warehouse", nargs="?", const=WAREHOUSE_PATH, default=None,
+                        help=f"Materialise marts in a persistent DuckDB file (default {WAREHOUSE_PATH}).")
+    parser.add_argument("--force", action="store_true", help="Rebuild every node, even when unchanged.")
+    parser.add_argument("--workers", type=int, default=None, help="Max nodes running concurrently.")
+    args = parser.parse_args()
+    build_marts(incremental=args.incremental, warehouse=args.warehouse, force=args.force, workers=args.workers)
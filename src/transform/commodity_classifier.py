@@ -0,0 +1,171 @@
+"""
+Keyword classifier for the commodity exposure of products (dim_product).
+
+The full category list and ingredient text of every product are scanned
+with one compiled regex built from a French/English keyword dictionary.
+Matches are counted per commodity, and category hits weigh more than
+ingredient hits. The result is a weighted multi-label exposure: one bridge
+row per (product, commodity), with weights summing to 1 per product. Text
+is accent-folded first, so "blé" and "ble" match the same keyword.
+Negations ("sans sucres ajoutés", "sans gluten") rule a commodity out for
+the product, and neutral phrases ("farine de riz") are matched and ignored.
+Each text column is joined in Arrow and scanned as one string rather than
+row by row; hits are scored with bincounts. Large inputs are split into
+chunks classified on a (spawned) process pool.
+"""
+import multiprocessing
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Keywords per commodity; plural endings (s, x, es) are matched automatically.
+# The order of the commodities breaks ties for the primary exposure.
+COMMODITY_KEYWORDS = {
+    "Cocoa": ["cacao", "cocoa", "chocolat", "chocolate", "gianduja"],
+    "Coffee": ["café", "coffee", "espresso", "expresso", "cappuccino", "arabica", "robusta"],
+    "Sugar": ["sucre", "sugar", "glucose", "fructose", "saccharose", "sucrose", "dextrose",
+              "sirop", "syrup", "confiture", "jam", "bonbon", "candy", "candies", "confiserie",
+              "confectionery", "caramel"],
+    "Wheat": ["blé", "wheat", "froment", "épeautre", "spelt", "farine", "flour", "pain", "bread",
+              "biscuit", "semoule", "semolina", "pasta", "pâtes alimentaires", "brioche", "viennoiserie"],
+}
+
+# Phrases that rule a commodity out for the whole product ("sans sucres
+# ajoutés", "biscuits sans gluten"): its hits in every field are dropped.
+NEGATIONS = {
+    "Sugar": ["sans sucre", "sans sucre ajouté", "sugar free", "sugar-free", "no added sugar", "no sugar",
+              "without sugar", "unsweetened"],
+    "Wheat": ["sans gluten", "gluten free", "gluten-free", "sans blé", "wheat free", "wheat-free"],
+}
+
+# Phrases containing a keyword that say nothing about its commodity, e.g.
+# flours of other grains. Matched (longest first) and ignored.
+NEUTRAL = ["farine de riz", "farine de maïs", "farine de sarrasin", "farine de pois chiche", "farine de coco",
+           "farine d'avoine", "farine de châtaigne", "farine de soja", "farine de lupin", "farine d'amande",
+           "rice flour", "corn flour", "buckwheat flour", "chickpea flour", "coconut flour", "almond flour",
+           "oat flour", "soy flour", "pain de sucre", "sucre de coco"]
+
+# Text columns scanned, with the weight of one keyword hit in each.
+TEXT_FIELDS = {"categories": 2.0, "ingredients_text": 1.0}
+
+BRIDGE_COLUMNS = ["product_id", "commodity", "weight", "matches"]
+
+COMMODITIES = list(COMMODITY_KEYWORDS)
+
+
+def _fold(text):
+    """Lower-case and strip accents from a string."""
+    return unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+
+
+# Folded phrase -> code: i for a hit of COMMODITIES[i], len(COMMODITIES) + i
+# for a negation of it, -1 for a neutral phrase.
+_KEYWORD_CODE = {
+    **{_fold(k): -1 for k in NEUTRAL},
+    **{_fold(k): len(COMMODITIES) + COMMODITIES.index(c) for c, keywords in NEGATIONS.items() for k in keywords},
+    **{_fold(k): COMMODITIES.index(c) for c, keywords in COMMODITY_KEYWORDS.items() for k in keywords},
+}
+_KEYWORD_COMMODITY = {k: COMMODITIES[code] for k, code in _KEYWORD_CODE.items() if 0 <= code < len(COMMODITIES)}
+
+
+def _trie(words):
+    """Regex matching any of `words`, factored by common prefixes (far fewer backtracks than a flat alternation)."""
+    root = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+    return build(root)
+
+
+# Greedy matching tries the longest phrase first, so "farine de riz" wins over "farine".
+PATTERN = re.compile(r"\b(" + _trie(_KEYWORD_CODE) + r")(?:s|x|es)?\b")
+# Same pattern, plus the newline that separates products in a joined text.
+_SCAN = re.compile(r"\n|" + PATTERN.pattern)
+# Code of every _SCAN match; a newline captures nothing.
+_NEWLINE = -2
+_SCAN_CODE = {**_KEYWORD_CODE, "": _NEWLINE}
+
+
+def _joined(text):
+    """The rows of a string Series as one folded, newline-separated string (joined in Arrow, folded once)."""
+    rows = pa.table({"text": text.fillna("")})["text"].combine_chunks().cast(pa.large_string())
+    if pc.any(pc.match_substring(rows, "\n")).as_py():
+        rows = pc.replace_substring(rows, "\n", " ")
+    single = pa.LargeListArray.from_arrays(pa.array([0, len(rows)], type=pa.int64()), rows)
+    return _fold(pc.binary_join(single, pa.scalar("\n", type=pa.large_string()))[0].as_py())
+
+
+def _scan(text):
+    """
+    (row, code) arrays for every keyword hit in a string Series (codes as in
+    _KEYWORD_CODE). The rows are scanned as one joined text, which is far
+    cheaper than per-row string calls; a hit's row is the number of newlines
+    before it.
+    """
+    hits = _SCAN.findall(_joined(text))
+    codes = np.fromiter(map(_SCAN_CODE.__getitem__, hits), dtype=np.int64, count=len(hits))
+    newline = codes == _NEWLINE
+    return np.cumsum(newline)[~newline], codes[~newline]
+
+
+def _classify_chunk(products):
+    n, k = len(products), len(COMMODITIES)
+    score, matches = np.zeros(n * k), np.zeros(n * k, dtype=int)
+    negated = np.zeros(n * k, dtype=bool)
+    for field, weight in TEXT_FIELDS.items():
+        if field not in products:
+            continue
+        rows, codes = _scan(products[field])
+        hit = (codes >= 0) & (codes < k)
+        cells = rows[hit] * k + codes[hit]
+        matches += np.bincount(cells, minlength=n * k)
+        score += weight * np.bincount(cells, minlength=n * k)
+        negation = codes >= k
+        negated[rows[negation] * k + codes[negation] - k] = True
+    score[negated] = 0
+
+    cells = np.flatnonzero(score)
+    if not len(cells):
+        return pd.DataFrame(columns=BRIDGE_COLUMNS)
+    row, commodity = np.divmod(cells, k)
+    total = np.bincount(row, weights=score[cells], minlength=n)
+    return pd.DataFrame({
+        "product_id": products["product_id"].to_numpy()[row],
+        "commodity": np.array(COMMODITIES, dtype=object)[commodity],
+        "weight": score[cells] / total[row],
+        "matches": matches[cells],
+    })
+
+
+def classify_products(products, workers=None, chunk_size=50_000):
+    """
+    Bridge rows (product_id, commodity, weight, matches) for a frame with a
+    product_id column and any of the TEXT_FIELDS. Products without a keyword
+    hit get no row. Inputs larger than `chunk_size` are classified in chunks
+    on `workers` processes (default: all cores; serial on one core).
+    """
+    workers = workers or os.cpu_count() or 1
+    if len(products) <= chunk_size or workers == 1:
+        return _classify_chunk(products)
+    chunks = [products.iloc[i:i + chunk_size] for i in range(0, len(products), chunk_size)]
+    # Spawned, not forked: callers may be threads of the mart DAG with live DuckDB connections.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        frames = [f for f in pool.map(_classify_chunk, chunks) if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=BRIDGE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
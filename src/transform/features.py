@@ -0,0 +1,95 @@
+"""
+Declarative window features for the fact tables.
+
+A spec lists the pass-through columns of a table and its features as
+{output column: (kind, size[, column])}; compile_features() turns it into one
+SELECT whose window aggregates are computed once each, in an inner query
+over named WINDOW clauses that share the same partition and sort. The
+outer query only combines them, so adding a feature adds a column, not a scan.
+
+Kinds (`size` in rows, `column` defaults to the spec's `value`):
+  pct_change    % change vs `size` rows earlier
+  rolling_mean  mean / std / min / max over the last `size` rows
+  rolling_std
+  rolling_min
+  rolling_max
+  zscore        (value - rolling mean) / rolling std over `size` rows
+  drawdown      % below the rolling max over `size` rows (<= 0)
+"""
+
+AGGREGATES = {
+    "rolling_mean": "AVG",
+    "rolling_std": "STDDEV_SAMP",
+    "rolling_min": "MIN",
+    "rolling_max": "MAX",
+}
+
+
+def feature_lookback(spec):
+    """Rows of history before a row that its features read (for incremental recomputes)."""
+    sizes = [feature[1] if feature[0] == "pct_change" else feature[1] - 1
+             for feature in spec["features"].values()]
+    return max(sizes, default=0)
+
+
+def compile_features(spec, rows):
+    """
+    SQL computing `spec` over the relation `rows`. Output columns are the
+    spec's `columns` followed by its features, in declaration order.
+    """
+    partition = spec.get("partition_by", [])
+    order_by = spec.get("order_by", "date")
+    partition_clause = f"PARTITION BY {', '.join(partition)} " if partition else ""
+    windows = {}
+    inner = {}
+
+    def window(size=None):
+        name = "w" if size is None else f"w{size}"
+        frame = "" if size is None else f" ROWS BETWEEN {size - 1} PRECEDING AND CURRENT ROW"
+        windows[name] = f"{partition_clause}ORDER BY {order_by}{frame}"
+        return name
+
+    def aggregate(kind, column, size):
+        alias = f"_{kind}_{column}_{size}"
+        inner[alias] = f"{AGGREGATES[kind]}({column}) OVER {window(size)}"
+        return alias
+
+    def lag(column, periods):
+        alias = f"_lag_{column}_{periods}"
+        inner[alias] = f"LAG({column}, {periods}) OVER {window()}"
+        return alias
+
+    outer = []
+    for name, (kind, size, *column) in spec["features"].items():
+        column = column[0] if column else spec["value"]
+        if kind == "pct_change":
+            previous = lag(column, size)
+            expr = f"({column} - {previous}) / NULLIF({previous}, 0) * 100"
+        elif kind in AGGREGATES:
+            expr = aggregate(kind, column, size)
+        elif kind == "zscore":
+            mean, std = aggregate("rolling_mean", column, size), aggregate("rolling_std", column, size)
+            expr = f"({column} - {mean}) / NULLIF({std}, 0)"
+        elif kind == "drawdown":
+            peak = aggregate("rolling_max", column, size)
+            expr = f"({column} / NULLIF({peak}, 0) - 1) * 100"
+        else:
+            raise ValueError(f"Unknown feature kind {kind!r} for {name}")
+        outer.append(f"{expr} AS {name}")
+
+    columns = spec["columns"]
+    outer_columns = ",\n                ".join([*columns, *outer])
+    inner_columns = ",\n                    ".join([*columns, *(f"{e} AS {a}" for a, e in inner.items())])
+    window_clause = ""
+    if windows:
+        window_clause = "WINDOW " + ",\n                       ".join(f"{n} AS ({w})" for n, w in windows.items())
+    return f"""
+            SELECT
+                {outer_columns}
+            FROM (
+                SELECT
+                    {inner_columns}
+                FROM {rows}
+                {window_clause}
+            )
+    """
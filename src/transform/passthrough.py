@@ -0,0 +1,154 @@
+"""
+Lagged pass-through of commodity prices into consumer prices.
+
+For every (inflation category, commodity) pair and every lag of 0..MAX_LAG
+months, CPI YoY in month t is compared with commodity YoY in month t - lag:
+Pearson correlation, and the pass-through ratio, i.e. the OLS slope of CPI
+YoY on lagged commodity YoY (pp of CPI inflation per pp of commodity
+inflation).
+
+Both come from sufficient statistics (observation counts, sums, sums of
+squares and cross-products over the months where both series are observed).
+Each statistic is one tensor contraction of the month × category matrix with
+a lag × month × commodity stack of shifted commodity series, so all pairs and
+lags are computed at once, with no Python loop over pairs or lags.
+
+rolling_passthrough() estimates the elasticity over time: for each pair, at
+its lag, CPI YoY is regressed on lagged commodity YoY and FX YoY over a
+sliding window. Window sums of the regressors' products come from
+cumulative sums (one subtraction per window), and the normal equations of
+every pair and window are solved together in closed form.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_LAG = 18
+
+PASSTHROUGH_COLUMNS = ["inflation_category", "commodity", "lag_months", "n_obs", "correlation", "passthrough_ratio"]
+
+ROLLING_COLUMNS = ["date", "inflation_category", "commodity", "lag_months", "n_obs",
+                   "elasticity", "fx_elasticity", "intercept", "r_squared"]
+
+
+def _lag_stack(values, max_lag):
+    """(lag, month, series) array whose slice `lag` is `values` shifted down by `lag` months (NaN-padded)."""
+    stack = np.full((max_lag + 1, *values.shape), np.nan)
+    for lag in range(max_lag + 1):
+        stack[lag, lag:] = values[:len(values) - lag]
+    return stack
+
+
+def lagged_passthrough(inflation, commodities, max_lag=MAX_LAG, min_obs=12):
+    """
+    Correlation and pass-through ratio of every (category, commodity, lag).
+
+    `inflation` (month × category) and `commodities` (month × commodity) are
+    wide YoY % frames indexed by month start, NaN where a value is missing.
+    Returns one row per category, commodity and lag with at least `min_obs`
+    overlapping months, in PASSTHROUGH_COLUMNS.
+    """
+    if inflation.empty or commodities.empty:
+        return pd.DataFrame(columns=PASSTHROUGH_COLUMNS)
+    months = pd.date_range(min(inflation.index.min(), commodities.index.min()),
+                           max(inflation.index.max(), commodities.index.max()), freq="MS")
+    y = inflation.reindex(months).to_numpy(dtype=float)
+    x = _lag_stack(commodities.reindex(months).to_numpy(dtype=float), max_lag)
+
+    # Zero out missing values and count a month only where both series are observed.
+    y_mask, x_mask = ~np.isnan(y), ~np.isnan(x)
+    y, x = np.where(y_mask, y, 0.0), np.where(x_mask, x, 0.0)
+    y_mask, x_mask = y_mask.astype(float), x_mask.astype(float)
+
+    def pair_sums(a, b):
+        # (lag, category, commodity) sums over months of a[month, category] * b[lag, month, commodity]
+        return np.einsum("tk,ltc->lkc", a, b, optimize=True)
+
+    n = pair_sums(y_mask, x_mask)
+    sum_y, sum_x = pair_sums(y, x_mask), pair_sums(y_mask, x)
+    sum_yy, sum_xx = pair_sums(y * y, x_mask), pair_sums(y_mask, x * x)
+    sum_xy = pair_sums(y, x)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x ** 2 / n
+        var_y = sum_yy - sum_y ** 2 / n
+        correlation = cov / np.sqrt(var_x * var_y)
+        ratio = cov / var_x
+
+    lag, category, commodity = np.indices(n.shape).reshape(3, -1)
+    result = pd.DataFrame({
+        "inflation_category": inflation.columns.to_numpy()[category],
+        "commodity": commodities.columns.to_numpy()[commodity],
+        "lag_months": lag,
+        "n_obs": n.ravel().astype(int),
+        "correlation": correlation.ravel(),
+        "passthrough_ratio": ratio.ravel(),
+    })
+    result = result[result["n_obs"] >= min_obs].replace([np.inf, -np.inf], np.nan)
+    return result.reset_index(drop=True)
+
+
+def _window_sums(values, window):
+    """Sums of `values` (month × series) over each `window` consecutive months, via cumulative sums."""
+    cumulative = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+    return cumulative[window:] - cumulative[:-window]
+
+
+def rolling_passthrough(inflation, commodities, fx, lags, window=24, min_obs=18):
+    """
+    Rolling pass-through elasticity of every pair in `lags`.
+
+    `inflation` and `commodities` are wide YoY % frames as for
+    lagged_passthrough(), `fx` a Series of FX YoY % by month start, and
+    `lags` a frame of (inflation_category, commodity, lag_months). For each
+    pair and each `window`-month window ending at `date`, fits
+
+        cpi_yoy[t] = intercept + elasticity * commodity_yoy[t - lag] + fx_elasticity * fx_yoy[t]
+
+    by OLS on the months where all three are observed. Windows with fewer than
+    `min_obs` such months, or collinear regressors, are dropped.
+    """
+    lags = lags[lags["inflation_category"].isin(inflation.columns) & lags["commodity"].isin(commodities.columns)]
+    if lags.empty or fx.empty:
+        return pd.DataFrame(columns=ROLLING_COLUMNS)
+    months = pd.date_range(min(inflation.index.min(), commodities.index.min(), fx.index.min()),
+                           max(inflation.index.max(), commodities.index.max(), fx.index.max()), freq="MS")
+    if len(months) < window:
+        return pd.DataFrame(columns=ROLLING_COLUMNS)
+
+    # (month, pair) matrices: the pair's CPI series, its commodity series shifted by its lag, and FX.
+    lag = lags["lag_months"].to_numpy(dtype=int)
+    y = inflation.reindex(months).to_numpy(dtype=float)[:, inflation.columns.get_indexer(lags["inflation_category"])]
+    x = _lag_stack(commodities.reindex(months).to_numpy(dtype=float), lag.max())
+    x = x[lag, :, commodities.columns.get_indexer(lags["commodity"])].T
+    f = np.broadcast_to(fx.reindex(months).to_numpy(dtype=float)[:, None], y.shape)
+
+    observed = ~(np.isnan(y) | np.isnan(x) | np.isnan(f))
+    y, x, f = (np.where(observed, v, 0.0) for v in (y, x, f))
+    n, sx, sf, sy = (_window_sums(v, window) for v in (observed.astype(float), x, f, y))
+    sxx, sff, syy = (_window_sums(v * v, window) for v in (x, f, y))
+    sxf, sxy, sfy = _window_sums(x * f, window), _window_sums(x * y, window), _window_sums(f * y, window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Centred normal equations [[vxx, cxf], [cxf, vff]] @ [b_x, b_f] = [cxy, cfy], solved by Cramer's rule.
+        vxx, vff, vyy = sxx - sx * sx / n, sff - sf * sf / n, syy - sy * sy / n
+        cxf, cxy, cfy = sxf - sx * sf / n, sxy - sx * sy / n, sfy - sf * sy / n
+        det = vxx * vff - cxf * cxf
+        elasticity = (cxy * vff - cfy * cxf) / det
+        fx_elasticity = (cfy * vxx - cxy * cxf) / det
+        intercept = (sy - elasticity * sx - fx_elasticity * sf) / n
+        r_squared = (elasticity * cxy + fx_elasticity * cfy) / vyy
+    valid = (n >= min_obs) & (det > 1e-9 * vxx * vff)
+
+    end, pair = np.nonzero(valid)
+    return pd.DataFrame({
+        "date": months[window - 1:][end],
+        "inflation_category": lags["inflation_category"].to_numpy()[pair],
+        "commodity": lags["commodity"].to_numpy()[pair],
+        "lag_months": lag[pair],
+        "n_obs": n[end, pair].astype(int),
+        "elasticity": elasticity[end, pair],
+        "fx_elasticity": fx_elasticity[end, pair],
+        "intercept": intercept[end, pair],
+        "r_squared": r_squared[end, pair],
+    })
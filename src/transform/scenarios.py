@@ -0,0 +1,111 @@
+"""
+Monte Carlo cost-squeeze scenarios.
+
+Simulates joint monthly paths of commodity prices (USD) and EUR/USD, either
+by bootstrapping historical months (all series resampled together, which
+keeps their correlation) or by a correlated GBM calibrated on the same
+returns. Each path gives the EUR price of every commodity, hence its YoY
+change at each horizon (the 12 months before it mix observed history and
+simulated months). These YoY changes are averaged over the commodities of
+each inflation category and compared with the category's current CPI YoY,
+as cost_squeeze_score does, to give a distribution of forward squeeze
+scores per category and horizon.
+
+The engine is vectorised over paths and horizons. Paths are split into
+fixed-size shards, each seeded from SeedSequence(seed).spawn(), so results
+depend on the seed and the shard size but not on the number of workers.
+Shards can run on a process pool.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+FX = "fx_eur_usd"
+PERCENTILES = [5, 25, 50, 75, 95]
+SCENARIO_COLUMNS = ["inflation_category", "horizon_months", "method", "paths", "cpi_yoy_pct", "mean_squeeze",
+                    *(f"p{q:02d}_squeeze" for q in PERCENTILES), "prob_squeeze"]
+
+
+def _simulate_shard(log_returns, paths, months, method, seed):
+    """(paths, months, series) cumulative log returns of one shard."""
+    rng = np.random.default_rng(seed)
+    if method == "bootstrap":
+        draws = log_returns[rng.integers(0, len(log_returns), (paths, months))]
+    elif method == "gbm":
+        mean, cov = log_returns.mean(axis=0), np.cov(log_returns, rowvar=False)
+        draws = rng.multivariate_normal(mean, np.atleast_2d(cov), (paths, months), method="eigh")
+    else:
+        raise ValueError(f"Unknown scenario method {method!r}")
+    return np.cumsum(draws, axis=1)
+
+
+def _squeeze_shard(args):
+    history, log_returns, exposure, cpi_yoy, horizons, paths, method, seed = args
+    cumulative = _simulate_shard(log_returns, paths, max(horizons), method, seed)
+    # Log EUR prices of the commodities: 12 observed months, then the simulated ones.
+    past = history[-12:, :-1] - history[-12:, -1:]
+    future = history[-1] + cumulative
+    future = future[..., :-1] - future[..., -1:]
+    eur = np.concatenate([np.broadcast_to(past, (paths, *past.shape)), future], axis=1)
+    # Index 11 + h is month T + h, index h - 1 is twelve months earlier.
+    horizons = np.asarray(horizons)
+    yoy = (np.exp(eur[:, 11 + horizons] - eur[:, horizons - 1]) - 1) * 100
+    return yoy @ exposure - cpi_yoy
+
+
+def simulate_squeeze(prices, exposure, cpi_yoy, horizons=(3, 6, 12), paths=20_000, method="bootstrap",
+                     seed=0, shard_size=5_000, workers=1):
+    """
+    Forward cost-squeeze distribution per inflation category and horizon.
+
+    `prices` is a month × series frame of monthly commodity prices (USD) plus
+    the EUR/USD rate in column FX; `exposure` a category × commodity frame of
+    weights; `cpi_yoy` the current CPI YoY % per category. Each category's
+    weights are renormalised over the commodities with prices, and categories
+    without any are left out.
+    Simulates `paths` paths by `method` ("bootstrap" or "gbm") in shards of
+    `shard_size`, on `workers` processes (None: all cores). Returns one row per
+    category and horizon (in months, at most 12) in SCENARIO_COLUMNS.
+    """
+    commodities = [c for c in exposure.columns if c in prices.columns]
+    if not commodities or FX not in prices.columns or not 0 < max(horizons) <= 12:
+        return pd.DataFrame(columns=SCENARIO_COLUMNS)
+    levels = np.log(prices[[*commodities, FX]].dropna())
+    log_returns = levels.diff().dropna().to_numpy()
+    if len(levels) < 12 or len(log_returns) < 2:
+        return pd.DataFrame(columns=SCENARIO_COLUMNS)
+    # Weights are renormalised over the priced commodities; categories exposed to none are dropped.
+    weights = exposure.loc[exposure.index.intersection(cpi_yoy.dropna().index), commodities].fillna(0)
+    total = weights.sum(axis=1)
+    weights = weights[total > 0].div(total[total > 0], axis=0)
+    categories = weights.index
+    if categories.empty:
+        return pd.DataFrame(columns=SCENARIO_COLUMNS)
+    weights = weights.to_numpy()
+
+    shards = [min(shard_size, paths - start) for start in range(0, paths, shard_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    tasks = [(levels.to_numpy(), log_returns, weights.T, cpi_yoy[categories].to_numpy(), list(horizons),
+              size, method, shard_seed) for size, shard_seed in zip(shards, seeds)]
+    if workers == 1 or len(tasks) == 1:
+        squeeze = np.concatenate([_squeeze_shard(task) for task in tasks])
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            squeeze = np.concatenate(list(pool.map(_squeeze_shard, tasks)))
+
+    # squeeze is (paths, horizon, category); summaries are (horizon, category).
+    quantiles = np.percentile(squeeze, PERCENTILES, axis=0)
+    horizon, category = np.indices(squeeze.shape[1:]).reshape(2, -1)
+    result = pd.DataFrame({
+        "inflation_category": categories.to_numpy()[category],
+        "horizon_months": np.asarray(horizons)[horizon],
+        "method": method,
+        "paths": paths,
+        "cpi_yoy_pct": cpi_yoy[categories].to_numpy()[category],
+        "mean_squeeze": squeeze.mean(axis=0).ravel(),
+        **{f"p{q:02d}_squeeze": values.ravel() for q, values in zip(PERCENTILES, quantiles)},
+        "prob_squeeze": (squeeze > 0).mean(axis=0).ravel(),
+    })
+    return result
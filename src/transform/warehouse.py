@@ -0,0 +1,82 @@
+"""
+Read access to the marts for downstream consumers (dashboard, portfolio report).
+
+When build_marts ran with `--warehouse`, marts live as tables of a persistent
+DuckDB file; otherwise only the published parquet files in data/marts/ exist.
+read_mart() queries whichever is available and pushes the column list and row
+filter into DuckDB, so callers only decode what they use. Marts are written
+sorted by their key and date in small zstd row groups, so a filter on the key
+skips the row groups whose min/max statistics exclude it; a mart written with
+`partition_by` is a directory of Hive partitions read the same way.
+"""
+import os
+
+import duckdb
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+MARTS_DIR = os.path.join(DATA_DIR, "marts")
+# Raw fingerprints and node hashes of the last build (written by build_marts to MARTS_DIR).
+STATE_FILE = "_build_state.json"
+WAREHOUSE_PATH = os.environ.get("FMCG_WAREHOUSE") or os.path.join(DATA_DIR, "warehouse.duckdb")
+
+
+def connect(path=None):
+    """Read-only connection to the warehouse file (raises if it does not exist)."""
+    return duckdb.connect(path or WAREHOUSE_PATH, read_only=True)
+
+
+def _has_table(con, name):
+    return bool(con.execute("SELECT 1 FROM duckdb_tables() WHERE table_name = ?", [name]).fetchall())
+
+
+def _connect_if_readable(path):
+    """Read-only connection to the warehouse, None if it does not exist or a build holds its write lock."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return connect(path)
+    except (duckdb.IOException, duckdb.ConnectionException):
+        return None
+
+
+def has_mart(name, path=None, marts_dir=None):
+    """True when the mart exists as a warehouse table or a parquet file."""
+    con = _connect_if_readable(path or WAREHOUSE_PATH)
+    if con is not None:
+        with con:
+            if _has_table(con, name):
+                return True
+    return os.path.exists(os.path.join(marts_dir or MARTS_DIR, f"{name}.parquet"))
+
+
+def parquet_relation(path):
+    """SQL relation of a mart parquet file, or of its Hive-partitioned directory."""
+    path = path.replace("\\", "/")
+    if os.path.isdir(path):
+        return f"read_parquet('{path}/**/*.parquet', hive_partitioning = true)"
+    return f"read_parquet('{path}')"
+
+
+def read_mart(name, columns=None, where=None, params=None, path=None, marts_dir=None, warehouse=True):
+    """
+    Load a mart as a DataFrame, from the warehouse table when there is one
+    (and `warehouse` is set) and from its published parquet file otherwise,
+    including while a build holds the warehouse's write lock. `columns` and
+    `where` (a SQL predicate, with `?` placeholders bound from `params`) are
+    evaluated by DuckDB.
+    """
+    select = ", ".join(columns) if columns else "*"
+    predicate = where or "TRUE"
+    path = path or WAREHOUSE_PATH
+    con = _connect_if_readable(path) if warehouse else None
+    if con is not None:
+        with con:
+            if _has_table(con, name):
+                return con.execute(f"SELECT {select} FROM {name} WHERE {predicate}", params).df()
+
+    parquet = os.path.join(marts_dir or MARTS_DIR, f"{name}.parquet")
+    if not os.path.exists(parquet):
+        raise FileNotFoundError(f"Mart {name} not found in {path} or {parquet}")
+    with duckdb.connect() as con:
+        return con.execute(f"SELECT {select} FROM {parquet_relation(parquet)} WHERE {predicate}", params).df()
+
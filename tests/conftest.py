@@ -0,0 +1,82 @@
+"""
+Shared fixtures: a small synthetic copy of data/raw/ so the transform and
+dashboard layers can be exercised without calling the upstream APIs.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+COMMODITY_BASE = {"Cocoa": 3000.0, "Coffee": 2.5, "Sugar": 0.2, "Wheat": 6.0}
+CPI_CATEGORIES = [
+    "All Items", "Food Products", "Bread & Cereals", "Meat", "Dairy, Cheese & Eggs",
+    "Oils & Fats", "Sugar, Jam, Honey, Chocolate", "Coffee, Tea, Cocoa",
+]
+
+
+def make_raw_frames(end="2025-06-30", weeks=160, months=66, seed=7):
+    """Synthetic raw extracts with the same columns as the real extractors."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end)
+
+    week_dates = pd.date_range(end=end, periods=weeks, freq="W-MON")
+    commodities = pd.concat([
+        pd.DataFrame({
+            "date": week_dates,
+            "price_usd": base * np.exp(np.cumsum(rng.normal(0.002, 0.03, weeks))),
+            "commodity": name,
+        })
+        for name, base in COMMODITY_BASE.items()
+    ], ignore_index=True)
+
+    month_dates = pd.date_range(end=end, periods=months, freq="MS")
+    cpi = pd.concat([
+        pd.DataFrame({
+            "date": month_dates,
+            "cpi_index": 100 * np.exp(np.cumsum(rng.normal(0.002, 0.003, months))),
+            "category": category,
+            "idbank": f"{1763852 + i:09d}",
+        })
+        for i, category in enumerate(CPI_CATEGORIES)
+    ], ignore_index=True)
+
+    day_dates = pd.bdate_range(end=end, periods=weeks * 5)
+    fx = pd.DataFrame({
+        "date": day_dates,
+        "fx_eur_usd": 1.08 * np.exp(np.cumsum(rng.normal(0, 0.003, len(day_dates)))),
+    })
+
+    products = pd.DataFrame({
+        "product_id": ["1", "2", "3", "4"],
+        "product_name": ["Chocolat noir", "Café moulu", "Baguette", "Eau"],
+        "brand": ["Lindt", "Carte Noire", "Paul", "Evian"],
+        "category": ["Chocolats", "Cafés", "Pains", "Boissons"],
+        "nutriscore": ["E", "A", "A", "A"],
+        "origin_country": ["Unknown"] * 4,
+    })
+    return {
+        "commodities_prices.parquet": commodities,
+        "insee_cpi_france.parquet": cpi,
+        "ecb_fx_eur_usd.parquet": fx,
+        "openfoodfacts_products.parquet": products,
+    }
+
+
+@pytest.fixture
+def raw_dir(tmp_path):
+    """A data/raw/ directory populated with synthetic extracts."""
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    for filename, df in make_raw_frames().items():
+        df.to_parquet(raw / filename, index=False)
+    return raw
+
+
+@pytest.fixture
+def marts_env(raw_dir, tmp_path, monkeypatch):
+    """Points build_marts at the synthetic raw dir and a temporary marts dir."""
+    from src.transform import build_marts
+
+    marts = tmp_path / "marts"
+    monkeypatch.setattr(build_marts, "RAW_DIR", str(raw_dir))
+    monkeypatch.setattr(build_marts, "MARTS_DIR", str(marts))
+    return {"raw": raw_dir, "marts": marts}
@@ -0,0 +1,320 @@
+"""
+Dashboard data layer and pages, on marts built from the synthetic raw data.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.dashboard import data
+from src.transform import build_marts
+
+
+@pytest.fixture
+def dashboard_marts(marts_env, monkeypatch):
+    build_marts.build_marts()
+    cache = data.MartCache(str(marts_env["marts"]), check_interval=0)
+    monkeypatch.setattr(data, "marts", cache)
+    return cache
+
+
+class TestMartCache:
+
+    def test_loads_once_and_shares(self, dashboard_marts, monkeypatch):
+        reads = []
+        read_mart = data.read_mart
+        monkeypatch.setattr(data, "read_mart", lambda name, **kw: reads.append(name) or read_mart(name, **kw))
+
+        first = data.mart("fact_commodities")
+        assert data.mart("fact_commodities") is first
+        assert reads == ["fact_commodities"]
+        assert data.mart_version("fact_commodities") is not None
+
+    def test_reloads_after_rebuild(self, dashboard_marts, marts_env):
+        before = data.mart("mart_category_pressure")
+        version = data.mart_version("mart_category_pressure")
+
+        cocoa = before[before["commodity"] == "Cocoa"]
+        trimmed = before.drop(cocoa.index)
+        path = marts_env["marts"] / "mart_category_pressure.parquet"
+        trimmed.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+
+        assert data.mart_version("mart_category_pressure") != version
+        after = data.mart("mart_category_pressure")
+        assert len(after) == len(before) - len(cocoa)
+
+    def test_check_interval_throttles_stat(self, dashboard_marts, marts_env):
+        cache = data.MartCache(str(marts_env["marts"]), check_interval=3600)
+        version = cache.version("fact_fx")
+        os.remove(marts_env["marts"] / "fact_fx.parquet")
+        assert cache.version("fact_fx") == version
+
+    def test_missing_mart(self, dashboard_marts):
+        assert data.mart_version("mart_unknown") is None
+        with pytest.raises(FileNotFoundError):
+            data.mart("mart_unknown")
+
+
+class TestMartIndex:
+
+    def test_slices_match_filters(self, dashboard_marts):
+        df = data.mart("mart_category_pressure")
+        index = data.mart_index("mart_category_pressure", "inflation_category", "commodity")
+        assert index.children() == sorted(df["inflation_category"].unique())
+
+        for category in index.children():
+            expected = df[df["inflation_category"] == category]
+            assert len(index.get(category)) == len(expected)
+            assert index.children(category) == sorted(expected["commodity"].unique())
+            for commodity in index.children(category):
+                series = index.get(category, commodity)
+                mask = expected[expected["commodity"] == commodity].sort_values("date")
+                assert series["date"].is_monotonic_increasing
+                assert series["cost_squeeze_score"].tolist() == pytest.approx(
+                    mask["cost_squeeze_score"].tolist(), nan_ok=True)
+        assert index.get("Unknown").empty
+        assert index.get("Meat", "Unknown").empty
+
+    def test_built_once_per_version(self, dashboard_marts, marts_env):
+        index = data.mart_index("fact_commodities", "commodity")
+        assert data.mart_index("fact_commodities", "commodity") is index
+
+        path = marts_env["marts"] / "fact_commodities.parquet"
+        df = pd.read_parquet(path)
+        df[df["commodity"] != "Cocoa"].to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+        assert "Cocoa" not in data.mart_index("fact_commodities", "commodity").children()
+
+
+class TestPages:
+
+    @pytest.fixture
+    def app(self, dashboard_marts):
+        from src.dashboard import app
+        return app
+
+    def test_layouts_render_from_current_marts(self, app):
+        import dash
+
+        for page in dash.page_registry.values():
+            assert callable(page["layout"])
+            assert page["layout"]() is not None
+        assert len(dash.page_registry) == 4
+
+    def test_inflation_callback(self, app):
+        import sys
+
+        # Dash imports the page modules from the pages folder, as pages.<name>.
+        inflation = sys.modules["pages.inflation"]
+        fig, fig2 = inflation.update_charts("Bread & Cereals")
+        names = {trace.name for trace in fig.data}
+        assert "CPI: Bread & Cereals (YoY %)" in names
+        assert len(fig2.data) > 0
+
+    def test_overview_zoom_redraws_visible_range(self, app):
+        import sys
+
+        overview = sys.modules["pages.overview"]
+        zoom = overview._on_zoom(overview.TREND_CHARTS["overview-fx"])
+        fig = zoom({"xaxis.range[0]": "2024-01-01", "xaxis.range[1]": "2024-03-31"})
+        dates = pd.to_datetime(fig.data[0].x)
+        assert dates.min() >= pd.Timestamp("2024-01-01") and dates.max() <= pd.Timestamp("2024-03-31")
+        assert list(fig.layout.xaxis.range) == ["2024-01-01", "2024-03-31"]
+        assert zoom({"autosize": True}) is overview.dash.no_update
+
+
+class TestClientsideMode:
+
+    @pytest.fixture
+    def inflation(self, dashboard_marts):
+        import sys
+
+        from src.dashboard import app  # noqa: F401  (registers the pages)
+        return sys.modules["pages.inflation"]
+
+    def test_payload_matches_server_figures(self, inflation):
+        payload = inflation.series_payload()
+        assert "template" in payload["layout"]
+        fig, fig2 = inflation.update_charts("Bread & Cereals")
+        series = payload["categories"]["Bread & Cereals"]
+
+        lines = fig.data[:-1]
+        assert [c["name"] for c in series["commodities"]] == [t.name.split(" (")[0] for t in lines]
+        for commodity, trace in zip(series["commodities"], lines):
+            assert commodity["dates"] == pd.to_datetime(trace.x).strftime("%Y-%m-%d").tolist()
+            assert commodity["yoy"] == pytest.approx([None if pd.isna(v) else v for v in trace.y])
+        assert series["cpi"] == pytest.approx([None if pd.isna(v) else v for v in fig.data[-1].y])
+
+    @pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+    def test_clientside_callback_draws_the_category(self, inflation, tmp_path):
+        script = tmp_path / "update.js"
+        script.write_text(
+            "global.window = {dash_clientside: {no_update: null}};\n"
+            f"const update = {inflation.CLIENTSIDE_UPDATE};\n"
+            "const store = JSON.parse(require('fs').readFileSync(0, 'utf8'));\n"
+            "console.log(JSON.stringify([update('Bread & Cereals', store), update('Unknown', store)]));\n"
+        )
+        result = subprocess.run(["node", str(script)], input=json.dumps(inflation.series_payload()),
+                                capture_output=True, text=True, check=True)
+        (fig, fig2), missing = json.loads(result.stdout)
+        server, server2 = inflation.update_charts("Bread & Cereals")
+
+        assert [t["name"] for t in fig["data"]] == [t.name for t in server.data]
+        assert [t["name"] for t in fig2["data"]] == [t.name for t in server2.data]
+        assert fig["layout"]["title"]["text"] == server.layout.title.text
+        assert missing == [None, None]
+
+    def test_mode_registers_a_clientside_callback(self):
+        code = (
+            "import dash._callback as cb\n"
+            "from src.dashboard import app\n"
+            "charts = [c for c in cb.GLOBAL_CALLBACK_LIST if 'inflation-vs-commodity-chart' in c['output']]\n"
+            "print(len(charts), 'clientside_function' in charts[0])\n"
+        )
+        env = {**os.environ, "FMCG_DASH_CLIENTSIDE": "1"}
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        assert result.stdout.split() == ["1", "True"]
+
+
+class TestMemoize:
+
+    @pytest.fixture
+    def calls(self):
+        return []
+
+    def _squeeze_by_category(self, calls, **options):
+        from src.dashboard.cache import memoize
+
+        @memoize("mart_category_pressure", **options)
+        def squeeze(category):
+            calls.append(category)
+            df = data.mart("mart_category_pressure")
+            return df.loc[df["inflation_category"] == category, "cost_squeeze_score"].sum()
+        return squeeze
+
+    def test_hits_until_mart_changes(self, dashboard_marts, marts_env, calls):
+        squeeze = self._squeeze_by_category(calls)
+        first = squeeze("Bread & Cereals")
+        assert squeeze("Bread & Cereals") == first
+        assert calls == ["Bread & Cereals"]
+        assert squeeze.cache_info()["hits"] == 1
+
+        path = marts_env["marts"] / "mart_category_pressure.parquet"
+        df = pd.read_parquet(path)
+        df["cost_squeeze_score"] = df["cost_squeeze_score"] * 2
+        df.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+        assert squeeze("Bread & Cereals") == pytest.approx(2 * first)
+        assert len(calls) == 2
+
+    def test_lru_and_ttl(self, dashboard_marts, calls, monkeypatch):
+        squeeze = self._squeeze_by_category(calls, maxsize=1)
+        squeeze("Bread & Cereals"), squeeze("Meat"), squeeze("Bread & Cereals")
+        assert calls == ["Bread & Cereals", "Meat", "Bread & Cereals"]
+        assert squeeze.cache_info()["size"] == 1
+
+        calls.clear()
+        squeeze = self._squeeze_by_category(calls, ttl=60)
+        squeeze("Meat")
+        clock = time.monotonic() + 61
+        monkeypatch.setattr(time, "monotonic", lambda: clock)
+        squeeze("Meat")
+        assert calls == ["Meat", "Meat"]
+
+    def test_list_and_dict_inputs(self, dashboard_marts, calls):
+        from src.dashboard.cache import memoize
+
+        @memoize("fact_fx")
+        def visible(categories, relayout):
+            calls.append(categories)
+            return len(categories)
+
+        assert visible(["Meat", "Bread & Cereals"], {"xaxis.range[0]": "2024-01-01", "autosize": True}) == 2
+        assert visible(["Meat", "Bread & Cereals"], {"autosize": True, "xaxis.range[0]": "2024-01-01"}) == 2
+        assert visible(["Meat"], None) == 1
+        assert calls == [["Meat", "Bread & Cereals"], ["Meat"]]
+
+    def test_disk_store_shared_between_workers(self, dashboard_marts, calls, tmp_path, monkeypatch):
+        monkeypatch.setenv("FMCG_DASH_CACHE_DIR", str(tmp_path / "callbacks"))
+        worker_1 = self._squeeze_by_category(calls)
+        worker_2 = self._squeeze_by_category(calls)
+        expected = worker_1("Meat")
+        assert worker_2("Meat") == expected
+        assert calls == ["Meat"]
+        assert worker_2.cache_info()["disk_hits"] == 1
+
+    def test_disk_store_is_bounded(self, tmp_path, monkeypatch):
+        from src.dashboard.cache import _DiskStore
+
+        clock = [1_050]
+        monkeypatch.setattr(time, "time", lambda: clock[0])
+        store = _DiskStore(str(tmp_path), maxsize=2, ttl=60)
+        for i, key in enumerate(["a", "b", "c"]):
+            store.set(key, i)
+            os.utime(tmp_path / f"{key}.pkl", (1_000 + i, 1_000 + i))
+        store.prune()
+        assert sorted(os.listdir(tmp_path)) == ["b.pkl", "c.pkl"]
+        assert store.get("a", 60) is None and store.get("c", 60) == 2
+
+        clock[0] = 1_062
+        store.prune()
+        assert os.listdir(tmp_path) == ["c.pkl"]
+        with pytest.raises(Exception):
+            store.set("d", lambda: None)
+        assert os.listdir(tmp_path) == ["c.pkl"]
+
+
+class TestDownsample:
+
+    def test_lttb_keeps_shape(self):
+        from src.dashboard.downsample import lttb
+
+        rng = np.random.default_rng(0)
+        x = np.arange(10_000, dtype=float)
+        y = np.cumsum(rng.normal(size=x.size))
+        y[4321] += 500.0
+
+        kept = lttb(x, y, 200)
+        assert len(kept) == 200
+        assert kept[0] == 0 and kept[-1] == x.size - 1
+        assert np.all(np.diff(kept) > 0)
+        assert 4321 in kept
+        assert np.array_equal(lttb(x[:50], y[:50], 200), np.arange(50))
+
+    def test_downsample_per_trace_and_range(self):
+        from src.dashboard.downsample import downsample
+
+        dates = pd.date_range("2000-01-03", periods=3_000, freq="D")
+        df = pd.DataFrame({
+            "date": np.tile(dates, 2),
+            "price_usd": np.r_[np.sin(np.arange(3_000) / 50), np.cos(np.arange(3_000) / 50)],
+            "commodity": np.repeat(["Cocoa", "Sugar"], 3_000),
+        })
+        df.loc[5, "price_usd"] = np.nan
+
+        out = downsample(df, "date", "price_usd", n_out=100, by="commodity")
+        assert out.groupby("commodity").size().tolist() == [100, 100]
+        assert out["price_usd"].notna().all()
+        assert out.groupby("commodity")["date"].apply(lambda d: d.is_monotonic_increasing).all()
+
+        zoomed = downsample(df, "date", "price_usd", n_out=100, by="commodity",
+                            x_range=("2003-01-01", "2003-03-31"))
+        assert zoomed["date"].between("2003-01-01", "2003-03-31").all()
+        assert zoomed.groupby("commodity").size().tolist() == [90, 90]
+
+    def test_relayout_range(self):
+        from src.dashboard.downsample import relayout_range
+
+        assert relayout_range({"xaxis.range[0]": "2024-01-01", "xaxis.range[1]": "2024-06-01"}) == (
+            "2024-01-01", "2024-06-01")
+        assert relayout_range({"xaxis.range": ["2024-01-01", "2024-06-01"]}) == ("2024-01-01", "2024-06-01")
+        assert relayout_range({"xaxis.autorange": True}) is None
+        assert relayout_range({"autosize": True}) is False
+        assert relayout_range(None) is False
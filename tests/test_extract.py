@@ -0,0 +1,501 @@
+"""
+Unit tests for the extraction layer.
+Runs fully offline against synthetic frames and local stand-ins.
+"""
+import pandas as pd
+import pytest
+
+from src.extract import commodities_api
+
+
+def _prices(commodity, dates, prices):
+    return pd.DataFrame({
+        "date": pd.to_datetime(dates),
+        "price_usd": prices,
+        "commodity": commodity,
+    })
+
+
+class TestCommoditiesIncremental:
+
+    def test_watermarks_from_stored_parts(self, tmp_path):
+        from src.extract.raw_store import write_raw
+
+        assert commodities_api.load_watermarks(str(tmp_path)) == {}
+        write_raw(pd.concat([
+            _prices("Cocoa", ["2024-01-01", "2024-01-08"], [100.0, 101.0]),
+            _prices("Sugar", ["2024-01-01"], [0.2]),
+        ]), commodities_api.SOURCE, "append", commodities_api.KEYS, raw_dir=str(tmp_path))
+
+        watermarks = commodities_api.load_watermarks(str(tmp_path))
+        assert watermarks == {
+            "Cocoa": pd.Timestamp("2024-01-08"),
+            "Sugar": pd.Timestamp("2024-01-01"),
+        }
+
+    def test_appended_tail_restates_overlap(self, tmp_path):
+        from src.extract.raw_store import read_snapshot, write_raw
+
+        for df in [_prices("Cocoa", ["2024-01-01", "2024-01-08"], [100.0, 101.0]),
+                   _prices("Cocoa", ["2024-01-08", "2024-01-15"], [105.0, 106.0])]:
+            write_raw(df, commodities_api.SOURCE, "append", commodities_api.KEYS, raw_dir=str(tmp_path))
+
+        merged = read_snapshot(commodities_api.SOURCE, raw_dir=str(tmp_path))
+        assert merged["date"].tolist() == list(pd.to_datetime(["2024-01-01", "2024-01-08", "2024-01-15"]))
+        assert merged["price_usd"].tolist() == [100.0, 105.0, 106.0]
+
+
+class _FakeTicker:
+    """Stand-in for yf.Ticker returning a short daily series per symbol."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, start, end, interval, auto_adjust):
+        if self.symbol == "BAD=F":
+            raise RuntimeError("provider error")
+        assert interval == commodities_api.INTERVAL
+        index = pd.date_range("2024-01-01", periods=3, freq="B", tz="America/New_York")
+        close = [250.0, 260.0, 270.0]
+        return pd.DataFrame({"Open": [245.0, 250.0, 260.0], "High": [255.0, 265.0, 275.0], "Low": close,
+                             "Close": close}, index=index)
+
+
+class TestCommoditiesConcurrentDownload:
+
+    def test_per_ticker_isolation_and_cents_normalisation(self, monkeypatch):
+        monkeypatch.setattr(commodities_api.yf, "Ticker", _FakeTicker)
+        df = commodities_api.fetch_commodities_data(
+            commodities={"Cocoa": "CC=F", "Coffee": "KC=F", "Broken": "BAD=F"},
+            max_workers=2,
+        )
+
+        assert set(df["commodity"]) == {"Cocoa", "Coffee"}
+        assert df.loc[df["commodity"] == "Cocoa", "price_usd"].tolist() == [250.0, 260.0, 270.0]
+        assert df.loc[df["commodity"] == "Coffee", "price_usd"].tolist() == [2.5, 2.6, 2.7]
+        assert df.loc[df["commodity"] == "Coffee", "high_usd"].tolist() == [2.55, 2.65, 2.75]
+        assert df.loc[df["commodity"] == "Cocoa", "open_usd"].tolist() == [245.0, 250.0, 260.0]
+        assert df["date"].dt.tz is None
+
+
+class TestExtractOrchestrator:
+
+    def test_sources_run_concurrently_and_write_atomically(self, tmp_path, monkeypatch):
+        import asyncio
+        import threading
+
+        from src.extract import raw_store, run_all
+
+        monkeypatch.setattr(raw_store, "RAW_DIR", str(tmp_path))
+        # Each source waits for the other two: run one after another, they would break the barrier.
+        barrier = threading.Barrier(3, timeout=10)
+        overlapped = []
+
+        def slow_source(rows):
+            def fetch(session, full, pending):
+                barrier.wait()
+                overlapped.append(rows)
+                return pd.DataFrame({"value": range(rows)})
+            return fetch
+
+        def broken(session, full, pending):
+            raise RuntimeError("upstream down")
+
+        sources = [
+            {"name": f"s{i}", "critical": True, "fetch": slow_source(i + 1)}
+            for i in range(3)
+        ] + [{"name": "flaky", "critical": False, "fetch": broken}]
+
+        results = asyncio.run(run_all.run_all(sources))
+
+        assert results == {"s0": True, "s1": True, "s2": True, "flaky": False}
+        assert sorted(overlapped) == [1, 2, 3], "sources did not run concurrently"
+        assert len(raw_store.read_snapshot("s2")) == 3
+        assert sorted(e["source"] for e in raw_store.load_manifest()) == ["s0", "s1", "s2"]
+        assert not list(tmp_path.rglob("*.tmp"))
+
+
+def _conditional_handler(state):
+    """Handler serving `state["body"]`, answering 304 when If-None-Match matches `state["etag"]`."""
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["requests"].append(dict(self.headers))
+            etag = state.get("etag")
+            if etag and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = state["body"]
+            self.send_response(200)
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def sdmx_server():
+    """Local stand-in for the ECB/INSEE endpoints."""
+    import threading
+    from http.server import ThreadingHTTPServer
+
+    state = {"body": b"v1", "etag": '"v1"', "requests": []}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _conditional_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_address[1]}/data"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+class TestConditionalGetCache:
+
+    def test_miss_hit_and_revalidate(self, sdmx_server, tmp_path):
+        from src.extract.http_cache import cached_get
+
+        url, params = sdmx_server["url"], {"startPeriod": "2020-01"}
+
+        # miss: nothing cached, full body fetched
+        assert cached_get(url, params, cache_dir=str(tmp_path)) == (200, b"v1", True)
+        assert "If-None-Match" not in sdmx_server["requests"][-1]
+
+        # hit: conditional request answered with 304, cached body returned
+        assert cached_get(url, params, cache_dir=str(tmp_path)) == (200, b"v1", False)
+        assert sdmx_server["requests"][-1]["If-None-Match"] == '"v1"'
+
+        # revalidate: upstream changed, new body replaces the cached one
+        sdmx_server.update(body=b"v2", etag='"v2"')
+        assert cached_get(url, params, cache_dir=str(tmp_path)) == (200, b"v2", True)
+        assert cached_get(url, params, cache_dir=str(tmp_path)) == (200, b"v2", False)
+
+    def test_identical_body_without_validators_is_unchanged(self, sdmx_server, tmp_path):
+        from src.extract.http_cache import cached_get
+
+        sdmx_server["etag"] = None
+        assert cached_get(sdmx_server["url"], cache_dir=str(tmp_path))[2] is True
+        assert cached_get(sdmx_server["url"], cache_dir=str(tmp_path))[2] is False
+        # nothing stored on the caller side yet: content must be reported as changed
+        assert cached_get(sdmx_server["url"], cache_dir=str(tmp_path), revalidate=False)[2] is True
+
+    def test_ecb_extract_skips_parsing_when_unchanged(self, sdmx_server, tmp_path, monkeypatch):
+        from src.extract import ecb_api, http_cache, raw_store
+
+        monkeypatch.setattr(ecb_api, "ECB_URL", sdmx_server["url"])
+        monkeypatch.setattr(http_cache, "CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.setattr(raw_store, "RAW_DIR", str(tmp_path / "raw"))
+        sdmx_server["body"] = b"TIME_PERIOD,OBS_VALUE\n2024-01-02,1.09\n2024-01-03,1.10\n"
+
+        pending = []
+        df = ecb_api.fetch_ecb_fx(pending=pending)
+        assert len(df) == 2
+        raw_store.write_raw(df, ecb_api.SOURCE)
+        http_cache.save_pending(pending)
+
+        assert ecb_api.fetch_ecb_fx() is None
+        assert len(ecb_api.fetch_ecb_fx(use_cache=False)) == 2
+
+
+    def test_validators_saved_only_after_raw_write(self, sdmx_server, tmp_path, monkeypatch):
+        from src.extract import ecb_api, http_cache, raw_store
+
+        monkeypatch.setattr(ecb_api, "ECB_URL", sdmx_server["url"])
+        monkeypatch.setattr(http_cache, "CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.setattr(raw_store, "RAW_DIR", str(tmp_path / "raw"))
+        sdmx_server["body"] = b"TIME_PERIOD,OBS_VALUE\n2024-01-02,1.09\n"
+        raw_store.write_raw(pd.DataFrame({"date": pd.to_datetime(["2023-12-29"]), "fx_eur_usd": [1.1]}),
+                            ecb_api.SOURCE)
+
+        # The new data was fetched but never written (failed parse or raw write): still changed next run.
+        assert len(ecb_api.fetch_ecb_fx(pending=[])) == 1
+        assert not list((tmp_path / "cache").iterdir())
+        assert "If-None-Match" not in sdmx_server["requests"][-1]
+        assert len(ecb_api.fetch_ecb_fx(pending=[])) == 1
+
+
+class TestSdmxStreamingParser:
+
+    def test_parses_mapped_series_into_columns(self):
+        from src.extract.insee_api import parse_sdmx_observations
+
+        content = (
+            b'<?xml version="1.0" encoding="UTF-8"?>'
+            b'<message:StructureSpecificData xmlns:message="urn:sdmx:message">'
+            b'<message:DataSet>'
+            b'<Series IDBANK="001"><Obs TIME_PERIOD="2024-01" OBS_VALUE="100.5"/>'
+            b'<Obs TIME_PERIOD="2024-02" OBS_VALUE="101.0"/></Series>'
+            b'<Series IDBANK="999"><Obs TIME_PERIOD="2024-01" OBS_VALUE="7"/></Series>'
+            b'<Series IDBANK="002"><Obs TIME_PERIOD="2024-01" OBS_VALUE="99.0"/>'
+            b'<Obs TIME_PERIOD="2024-02"/></Series>'
+            b'</message:DataSet></message:StructureSpecificData>'
+        )
+        df = parse_sdmx_observations(content, {"001": "Meat", "002": "Oils & Fats"})
+
+        assert df.columns.tolist() == ["date", "cpi_index", "category", "idbank"]
+        assert df["idbank"].tolist() == ["001", "001", "002"]
+        assert df["category"].tolist() == ["Meat", "Meat", "Oils & Fats"]
+        assert df["cpi_index"].tolist() == [100.5, 101.0, 99.0]
+        assert df["date"].tolist() == list(pd.to_datetime(["2024-01-01", "2024-02-01", "2024-01-01"]))
+
+
+class TestInseeChunkedFanOut:
+
+    def test_chunks_respect_url_and_series_limits(self):
+        from src.extract.insee_api import INSEE_URL, chunk_idbanks
+
+        ids = [f"{i:09d}" for i in range(250)]
+        chunks = chunk_idbanks(ids, max_url_length=300, max_series=20)
+
+        assert [i for chunk in chunks for i in chunk] == ids
+        assert all(len(chunk) <= 20 for chunk in chunks)
+        assert all(len(f"{INSEE_URL}/{'+'.join(chunk)}") <= 300 for chunk in chunks)
+
+    def test_chunks_are_fetched_and_merged_with_metadata(self, tmp_path, monkeypatch):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        from src.extract import http_cache, insee_api, raw_store
+
+        requested = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                ids = self.path.split("?")[0].rsplit("/", 1)[-1].split("+")
+                requested.append(ids)
+                series = "".join(
+                    f'<Series IDBANK="{i}"><Obs TIME_PERIOD="2024-01" OBS_VALUE="{int(i)}"/></Series>'
+                    for i in ids
+                )
+                body = f"<m:Data xmlns:m='urn:m'><m:DataSet>{series}</m:DataSet></m:Data>".encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            monkeypatch.setattr(insee_api, "INSEE_URL", f"http://127.0.0.1:{server.server_address[1]}/data")
+            monkeypatch.setattr(http_cache, "CACHE_DIR", str(tmp_path / "cache"))
+            monkeypatch.setattr(raw_store, "RAW_DIR", str(tmp_path / "raw"))
+            registry = {
+                f"{i:09d}": {"category": f"Cat {i}", "label_fr": "", "group": "Food" if i else "Headline"}
+                for i in range(30)
+            }
+            chunks = insee_api.chunk_idbanks(list(registry), max_series=7)
+            monkeypatch.setattr(insee_api, "chunk_idbanks", lambda ids: chunks)
+
+            df = insee_api.fetch_insee_cpi(registry=registry)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert len(requested) == 5
+        assert len(df) == 30
+        assert set(df["category"]) == {f"Cat {i}" for i in range(30)}
+        assert df.loc[df["idbank"] == "000000000", "category_group"].item() == "Headline"
+        assert (df["cpi_index"] == df["idbank"].astype(int)).all()
+
+
+class TestOpenFoodFactsCrawl:
+
+    def test_crawl_resumes_from_checkpoint_and_writes_row_groups(self, tmp_path, monkeypatch):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlsplit
+
+        import pyarrow.parquet as pq
+        import requests
+
+        from src.extract import openfoodfacts_api, raw_store
+
+        state = {"pages": [], "fail": {1, 3}}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                page, size = int(query["page"][0]), int(query["page_size"][0])
+                state["pages"].append(page)
+                if page in state["fail"]:
+                    state["fail"].discard(page)
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                products = [
+                    {"_id": str(i), "product_name": f"P{i}", "brands": "Brand, Other",
+                     "categories": "Snacks, Biscuits", "nutriscore_grade": "b"}
+                    for i in range((page - 1) * size, min(page * size, 25))
+                ]
+                body = json.dumps({"count": 25, "products": products}).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        monkeypatch.setattr(openfoodfacts_api, "OFF_SEARCH_URL", f"http://127.0.0.1:{server.server_address[1]}/")
+        monkeypatch.setattr(raw_store, "RAW_DIR", str(tmp_path))
+        try:
+            crawl = lambda: openfoodfacts_api.crawl_open_food_facts(
+                page_size=10, workers=2, rate_per_min=6000, session=requests.Session())
+            # A failed first page (page count unknown) is reported like any other page.
+            assert crawl() is None
+            assert state["pages"] == [1]
+            assert crawl() is None
+            assert sorted(state["pages"]) == [1, 1, 2, 3]
+            assert crawl() == 25
+            assert sorted(state["pages"]) == [1, 1, 2, 3, 3]
+            # A committed crawl leaves no checkpoint: the next one fetches every page again.
+            assert not (tmp_path / openfoodfacts_api.CRAWL_DIR).joinpath("france").exists()
+            assert crawl() == 25
+            assert sorted(state["pages"]) == [1, 1, 1, 2, 2, 3, 3, 3]
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        entry, = raw_store.source_entries(openfoodfacts_api.SOURCE)
+        assert entry["rows"] == 25
+        out = pq.ParquetFile(tmp_path / entry["path"])
+        assert out.metadata.num_row_groups == 3
+        df = out.read().to_pandas()
+        assert df["product_id"].tolist() == [str(i) for i in range(25)]
+        assert set(df["brand"]) == {"Brand"} and set(df["nutriscore"]) == {"B"}
+
+
+class TestOpenFoodFactsDump:
+
+    PRODUCTS = [
+        {"code": "1", "product_name": "Choco", "brands": "Milka,Mondelez", "categories": "Chocolates,Snacks",
+         "nutriscore_grade": "e", "countries_tags": ["en:france", "en:belgium"]},
+        {"code": "2", "product_name": "Baguette", "brands": "Paul", "categories": "Breads",
+         "nutriscore_grade": "a", "origins": "France", "countries_tags": ["en:france"]},
+        {"code": "3", "product_name": "Cereal", "brands": "Kellogg", "categories": "Cereals",
+         "nutriscore_grade": "c", "countries_tags": ["en:germany"]},
+        {"code": "4", "product_name": None, "brands": "NoName", "categories": "Other",
+         "countries_tags": ["en:france"]},
+    ]
+
+    def _read_partition(self, tmp_path):
+        return pd.read_parquet(tmp_path / "openfoodfacts_dump" / "country=france").sort_values("product_id")
+
+    def test_jsonl_dump_is_filtered_and_partitioned(self, tmp_path, monkeypatch):
+        import gzip
+        import json
+
+        from src.extract import openfoodfacts_dump, raw_store
+
+        monkeypatch.setattr(raw_store, "RAW_DIR", str(tmp_path))
+        path = tmp_path / "openfoodfacts-products.jsonl.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.writelines(json.dumps(p) + "\n" for p in self.PRODUCTS)
+
+        assert openfoodfacts_dump.ingest_off_dump(str(path), workers=2, batch_bytes=1) == 2
+        # One line per batch: one part per batch with a French line (the unnamed one is left empty).
+        assert len(list((tmp_path / "openfoodfacts_dump" / "country=france").iterdir())) == 3
+        df = self._read_partition(tmp_path)
+        assert df["product_id"].tolist() == ["1", "2"]
+        assert df["brand"].tolist() == ["Milka", "Paul"]
+        assert df["category"].tolist() == ["Chocolates", "Breads"]
+        assert df["origin_country"].tolist() == ["Unknown", "France"]
+
+    def test_csv_dump_matches_jsonl(self, tmp_path, monkeypatch):
+        import gzip
+
+        from src.extract import openfoodfacts_dump, raw_store
+
+        monkeypatch.setattr(raw_store, "RAW_DIR", str(tmp_path))
+        header = ["code", "url", "product_name", "brands", "categories", "origins", "countries_tags",
+                  "nutriscore_grade"]
+        path = tmp_path / "en.openfoodfacts.org.products.csv.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write("\t".join(header) + "\n")
+            for p in self.PRODUCTS:
+                row = {**p, "url": "", "countries_tags": ",".join(p["countries_tags"])}
+                f.write("\t".join(str(row.get(h) or "") for h in header) + "\n")
+
+        assert openfoodfacts_dump.ingest_off_dump(str(path), workers=2, batch_bytes=300) == 2
+        df = self._read_partition(tmp_path)
+        assert df["product_id"].tolist() == ["1", "2"]
+        assert df["nutriscore"].tolist() == ["E", "A"]
+        assert df["origin_country"].tolist() == ["Unknown", "France"]
+
+
+    def test_failed_ingest_leaves_no_staging(self, tmp_path, monkeypatch):
+        from src.extract import openfoodfacts_dump, raw_store
+
+        monkeypatch.setattr(raw_store, "RAW_DIR", str(tmp_path))
+        path = tmp_path / "openfoodfacts-products.jsonl.gz"
+        path.write_bytes(b"not a gzip file")
+
+        with pytest.raises(OSError):
+            openfoodfacts_dump.ingest_off_dump(str(path), workers=1)
+        assert not list((tmp_path / openfoodfacts_dump.STAGING_DIR).iterdir())
+        assert not (tmp_path / "openfoodfacts_dump").exists()
+
+
+class TestRawLake:
+
+    def test_snapshot_writes_are_partitioned_and_latest_wins(self, tmp_path):
+        from src.extract import raw_store
+
+        raw = str(tmp_path)
+        first = raw_store.write_raw(pd.DataFrame({"date": pd.to_datetime(["2024-01-01", "2024-03-01"]),
+                                                  "value": [1.0, 2.0]}), "ecb", raw_dir=raw)
+        assert first["path"].startswith("source=ecb/ingest_date=")
+        assert (first["rows"], first["min_date"], first["max_date"]) == (2, "2024-01-01", "2024-03-01")
+        assert len(first["sha256"]) == 64
+
+        raw_store.write_raw(pd.DataFrame({"date": pd.to_datetime(["2024-04-01"]), "value": [3.0]}),
+                            "ecb", raw_dir=raw)
+        assert raw_store.read_snapshot("ecb", raw_dir=raw)["value"].tolist() == [3.0]
+        assert not list(tmp_path.rglob("*.tmp"))
+
+    def test_identical_content_is_not_stored_twice(self, tmp_path):
+        from src.extract import raw_store
+
+        df = pd.DataFrame({"date": pd.to_datetime(["2024-01-01"]), "value": [1.0]})
+        assert raw_store.write_raw(df, "insee", raw_dir=str(tmp_path)) is not None
+        assert raw_store.write_raw(df, "insee", raw_dir=str(tmp_path)) is None
+        assert len(raw_store.load_manifest(str(tmp_path))) == 1
+        assert len(list(tmp_path.rglob("*.parquet"))) == 1
+
+    def test_unlisted_files_are_ignored(self, tmp_path):
+        from src.extract import raw_store
+
+        df = pd.DataFrame({"date": pd.to_datetime(["2024-01-01"]), "value": [1.0]})
+        entry = raw_store.write_raw(df, "ecb", raw_dir=str(tmp_path))
+        # A part written by a crashed run never reaches the manifest.
+        df.assign(value=99.0).to_parquet(tmp_path / entry["path"].replace("part-", "part-0"), index=False)
+        assert raw_store.read_snapshot("ecb", raw_dir=str(tmp_path))["value"].tolist() == [1.0]
+
+    def test_append_parts_are_compacted(self, tmp_path, monkeypatch):
+        from src.extract import raw_store
+
+        monkeypatch.setattr(raw_store, "COMPACT_AFTER", 3)
+        raw = str(tmp_path)
+        for week in range(4):
+            dates = pd.date_range("2024-01-01", periods=week + 2, freq="W-MON")
+            raw_store.write_raw(_prices("Cocoa", dates, [float(week)] * len(dates)),
+                                "commodities", "append", ["commodity", "date"], raw_dir=raw)
+
+        entries = raw_store.load_manifest(raw)
+        assert len(entries) == 1 and entries[0]["compacted_from"] == 4
+        assert len(list(tmp_path.rglob("*.parquet"))) == 1
+        df = raw_store.read_snapshot("commodities", raw_dir=raw)
+        assert len(df) == 5 and df["price_usd"].tolist() == [3.0] * 5
@@ -6,44 +6,42 @@ import os
 import pandas as pd
 import pytest
 
+from src.extract import raw_store
+
 RAW_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "raw")
 MARTS_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "marts")
 
 
 class TestRawDataExtraction:
-    """Validate that raw parquet files exist and have expected structure."""
+    """Validate that raw snapshots exist in the lake and have expected structure."""
 
     def test_ecb_fx_data_exists(self):
-        path = os.path.join(RAW_DIR, "ecb_fx_eur_usd.parquet")
-        assert os.path.exists(path), "ECB FX data file missing"
-        df = pd.read_parquet(path)
+        assert raw_store.has_snapshot("ecb", RAW_DIR), "ECB FX data missing"
+        df = raw_store.read_snapshot("ecb", raw_dir=RAW_DIR)
         assert len(df) > 0, "ECB FX data is empty"
         assert "date" in df.columns
         assert "fx_eur_usd" in df.columns
         assert df["fx_eur_usd"].min() > 0, "FX rate should be positive"
 
     def test_commodities_data_exists(self):
-        path = os.path.join(RAW_DIR, "commodities_prices.parquet")
-        assert os.path.exists(path), "Commodities data file missing"
-        df = pd.read_parquet(path)
+        assert raw_store.has_snapshot("commodities", RAW_DIR), "Commodities data missing"
+        df = raw_store.read_snapshot("commodities", raw_dir=RAW_DIR)
         assert len(df) > 0, "Commodities data is empty"
         assert set(["Cocoa", "Coffee", "Sugar", "Wheat"]).issubset(set(df["commodity"].unique())), \
             "Missing expected commodities"
         assert df["price_usd"].min() > 0, "Commodity prices should be positive"
 
     def test_insee_cpi_data_exists(self):
-        path = os.path.join(RAW_DIR, "insee_cpi_france.parquet")
-        assert os.path.exists(path), "INSEE CPI data file missing"
-        df = pd.read_parquet(path)
+        assert raw_store.has_snapshot("insee", RAW_DIR), "INSEE CPI data missing"
+        df = raw_store.read_snapshot("insee", raw_dir=RAW_DIR)
         assert len(df) > 0, "INSEE CPI data is empty"
         assert df["category"].nunique() >= 5, "Should have at least 5 CPI categories"
         assert df["cpi_index"].min() > 0, "CPI index values should be positive"
 
     def test_openfoodfacts_data_exists(self):
-        path = os.path.join(RAW_DIR, "openfoodfacts_products.parquet")
-        if not os.path.exists(path):
-            pytest.skip("openfoodfacts_products.parquet ausente — fonte não-crítica (continue-on-error)")
-        df = pd.read_parquet(path)
+        if not raw_store.has_snapshot("openfoodfacts", RAW_DIR):
+            pytest.skip("openfoodfacts ausente — fonte não-crítica (continue-on-error)")
+        df = raw_store.read_snapshot("openfoodfacts", raw_dir=RAW_DIR)
         assert len(df) > 0, "Product catalog is empty"
         assert "product_name" in df.columns
         assert "brand" in df.columns
@@ -109,7 +107,7 @@ COMMODITY_PRICE_RANGES = {
 }
 
 def test_commodity_price_units():
-    df = pd.read_parquet("data/raw/commodities_prices.parquet")
+    df = raw_store.read_snapshot("commodities", raw_dir=RAW_DIR)
     for commodity, (lo, hi) in COMMODITY_PRICE_RANGES.items():
         rows = df[df["commodity"] == commodity]
         if rows.empty:
@@ -118,7 +116,7 @@ def test_commodity_price_units():
         assert lo <= latest <= hi, f"{commodity}: {latest:.4f} fora de [{lo}, {hi}]"
 
 def test_eurusd_range():
-    df = pd.read_parquet("data/raw/ecb_fx_eur_usd.parquet")
+    df = raw_store.read_snapshot("ecb", raw_dir=RAW_DIR)
     latest = float(df["fx_eur_usd"].iloc[-1])
     assert 0.85 <= latest <= 1.30, f"EUR/USD {latest:.4f} fora do range"
 
@@ -0,0 +1,674 @@
+"""
+Unit tests for the DuckDB transformation layer, run on synthetic raw data.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.transform import build_marts
+
+
+class TestBuildMarts:
+
+    def test_builds_all_marts(self, marts_env):
+        build_marts.build_marts()
+        for name in ["dim_date", "dim_product", "fact_price_pyramid", "fact_commodities", "fact_inflation", "fact_fx",
+                     "fact_commodities_eur", "mart_category_pressure", "mart_momentum", "mart_passthrough_lags",
+                     "mart_pass_through"]:
+            assert len(pd.read_parquet(marts_env["marts"] / f"{name}.parquet")) > 0, name
+
+    def test_commodities_eur_as_of_fx(self, marts_env):
+        build_marts.build_marts()
+        marts = marts_env["marts"]
+        eur = pd.read_parquet(marts / "fact_commodities_eur.parquet")
+        fx = pd.read_parquet(marts_env["raw"] / "ecb_fx_eur_usd.parquet").sort_values("date")
+        expected = pd.merge_asof(eur.sort_values("price_date"),
+                                 fx.rename(columns={"date": "fx_on", "fx_eur_usd": "fx"}),
+                                 left_on="price_date", right_on="fx_on")
+        assert len(eur) == len(pd.read_parquet(marts / "fact_commodities.parquet"))
+        assert (expected["fx_date"].isna() == expected["fx_on"].isna()).all()
+        matched = expected.dropna(subset=["fx_on"])
+        assert (matched["fx_date"] == matched["fx_on"]).all()
+        assert matched["price_eur"].to_numpy() == pytest.approx((matched["price_usd"] / matched["fx"]).to_numpy())
+
+        # Weekly prices: the as-of EUR YoY is the 52-row change, as for USD.
+        eur = eur.sort_values(["commodity", "date"])
+        yoy = eur.groupby("commodity")["price_eur"].pct_change(52, fill_method=None) * 100
+        pd.testing.assert_series_equal(eur["eur_yoy_change_pct"], yoy, check_names=False)
+
+        pressure = pd.read_parquet(marts / "mart_category_pressure.parquet").dropna(subset=["commodity_eur_yoy_pct"])
+        assert len(pressure) > 0
+        assert (pressure["cost_squeeze_score_eur"]
+                == pressure["commodity_eur_yoy_pct"] - pressure["yoy_inflation_pct"].fillna(0)).all()
+
+    def test_price_pyramid_from_daily_bars(self, marts_env):
+        rng = np.random.default_rng(1)
+        days = pd.bdate_range("2024-01-01", "2025-06-30")
+        close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.02, len(days))))
+        daily = pd.DataFrame({"date": days, "open_usd": close * 0.99, "high_usd": close * 1.02,
+                              "low_usd": close * 0.97, "price_usd": close, "commodity": "Cocoa"})
+        prices = pd.read_parquet(marts_env["raw"] / "commodities_prices.parquet")
+        pd.concat([prices[prices["commodity"] != "Cocoa"], daily]).to_parquet(
+            marts_env["raw"] / "commodities_prices.parquet", index=False)
+
+        build_marts.build_marts()
+        pyramid = pd.read_parquet(marts_env["marts"] / "fact_price_pyramid.parquet").query("commodity == 'Cocoa'")
+        bars = daily.set_index("date")
+        for resolution, rule in [("week", "W-SUN"), ("month", "MS")]:
+            level = pyramid[pyramid["resolution"] == resolution].set_index("date")
+            expected = bars.resample(rule, label="left" if rule == "MS" else "right").agg(
+                {"open_usd": "first", "high_usd": "max", "low_usd": "min", "price_usd": ["last", "mean", "size"]})
+            expected.columns = ["open_usd", "high_usd", "low_usd", "close_usd", "mean_usd", "n_obs"]
+            if resolution == "week":
+                expected.index = expected.index - pd.Timedelta(days=6)
+            pd.testing.assert_frame_equal(level[expected.columns], expected, check_dtype=False, check_names=False,
+                                          check_freq=False)
+        assert len(pyramid[pyramid["resolution"] == "day"]) == len(days)
+
+        # fact_commodities stays weekly: one close per week.
+        fact = pd.read_parquet(marts_env["marts"] / "fact_commodities.parquet").query("commodity == 'Cocoa'")
+        weekly = pyramid[pyramid["resolution"] == "week"]
+        assert fact["date"].tolist() == weekly["date"].tolist()
+        assert fact["price_usd"].tolist() == weekly["close_usd"].tolist()
+
+        # Weekly closes are converted at the fixing of their last trading day, not of the Monday.
+        eur = pd.read_parquet(marts_env["marts"] / "fact_commodities_eur.parquet").query("commodity == 'Cocoa'")
+        assert eur["price_date"].tolist() == weekly["last_date"].tolist()
+        assert (eur["fx_date"] == eur["price_date"]).all() and (eur["fx_date"] > eur["date"]).any()
+
+        # A week straddling two months counts in the month of its close, in EUR as in USD.
+        pressure = pd.read_parquet(marts_env["marts"] / "mart_category_pressure.parquet").query(
+            "commodity == 'Cocoa'").drop_duplicates("date").set_index("date")
+        month_end = eur.sort_values("price_date").groupby(eur["price_date"].dt.to_period("M").dt.to_timestamp()).last()
+        assert (eur["price_date"].dt.month != eur["date"].dt.month).any()
+        months = pressure.index.intersection(month_end.index)
+        assert len(months) > 0
+        assert pressure.loc[months, "commodity_price_eur"].tolist() == pytest.approx(
+            month_end.loc[months, "price_eur"].tolist())
+
+    def test_price_pyramid_reads_weekly_and_daily_parts(self, marts_env):
+        from src.extract import raw_store
+
+        raw = str(marts_env["raw"])
+        path = marts_env["raw"] / "commodities_prices.parquet"
+        weekly = pd.read_parquet(path)
+        path.unlink()
+        raw_store.write_raw(weekly, "commodities", "append", ["commodity", "date"], raw_dir=raw)
+        days = pd.bdate_range(weekly["date"].max() + pd.Timedelta(days=7), periods=10)
+        daily = pd.DataFrame({"date": days, "open_usd": 1.0, "high_usd": 3.0, "low_usd": 0.5, "price_usd": 2.0,
+                              "commodity": "Wheat"})
+        raw_store.write_raw(daily, "commodities", "append", ["commodity", "date"], raw_dir=raw)
+
+        build_marts.build_marts()
+        pyramid = pd.read_parquet(marts_env["marts"] / "fact_price_pyramid.parquet")
+        wheat = pyramid[(pyramid["commodity"] == "Wheat") & (pyramid["resolution"] == "week")]
+        assert wheat["n_obs"].tolist()[-3:] == [1, 5, 5]
+        assert wheat["high_usd"].iloc[-1] == 3.0
+        old = wheat.iloc[0]
+        assert old["open_usd"] == old["high_usd"] == old["low_usd"] == old["close_usd"]
+
+    def test_dim_product_prefers_bulk_dump_partitions(self, marts_env):
+        partition = marts_env["raw"] / "openfoodfacts_dump" / "country=france"
+        partition.mkdir(parents=True)
+        pd.DataFrame({
+            "product_id": ["10", "11"], "product_name": ["Sucre", "Farine"], "brand": ["Daddy", "Francine"],
+            "category": ["Sucres", "Farines de blé"], "nutriscore": ["E", "A"], "origin_country": ["France"] * 2,
+        }).to_parquet(partition / "part-00000.parquet", index=False)
+        # Other countries' partitions are not part of dim_product.
+        other = marts_env["raw"] / "openfoodfacts_dump" / "country=germany"
+        other.mkdir()
+        pd.read_parquet(partition).assign(product_id=["20", "21"]).to_parquet(other / "part-00000.parquet")
+
+        build_marts.build_marts()
+        dim = pd.read_parquet(marts_env["marts"] / "dim_product.parquet").sort_values("product_id")
+        assert dim["product_id"].tolist() == ["10", "11"]
+        assert dim["primary_commodity_exposure"].tolist() == ["Sugar", "Wheat"]
+
+    def test_reads_latest_lake_snapshot(self, marts_env):
+        from src.extract import raw_store
+
+        raw = str(marts_env["raw"])
+        frames = {}
+        for path in marts_env["raw"].glob("*.parquet"):
+            frames[path.name] = pd.read_parquet(path)
+            path.unlink()
+        raw_store.write_raw(frames["ecb_fx_eur_usd.parquet"], "ecb", raw_dir=raw)
+        raw_store.write_raw(frames["insee_cpi_france.parquet"], "insee", raw_dir=raw)
+        raw_store.write_raw(frames["openfoodfacts_products.parquet"], "openfoodfacts", raw_dir=raw)
+        prices = frames["commodities_prices.parquet"]
+        cutoff = prices["date"].max() - pd.Timedelta(weeks=4)
+        raw_store.write_raw(prices[prices["date"] <= cutoff], "commodities", "append",
+                            ["commodity", "date"], raw_dir=raw)
+        # Second append restates the overlap with a different price.
+        tail = prices[prices["date"] >= cutoff].assign(price_usd=lambda d: d["price_usd"] * 2)
+        raw_store.write_raw(tail, "commodities", "append", ["commodity", "date"], raw_dir=raw)
+
+        build_marts.build_marts()
+        fact = pd.read_parquet(marts_env["marts"] / "fact_commodities.parquet")
+        assert len(fact) == len(prices)
+        merged = fact.merge(tail, on=["commodity", "date"])
+        assert len(merged) == len(tail)
+        assert (merged["price_usd_x"] == merged["price_usd_y"]).all()
+
+
+class TestIncrementalBuild:
+
+    MARTS = ["dim_date", "dim_product", "fact_price_pyramid", "fact_commodities", "fact_inflation", "fact_fx",
+             "fact_commodities_eur", "mart_category_pressure", "mart_momentum"]
+
+    @staticmethod
+    def _lake(marts_env):
+        """Move the fixture's flat files into the raw lake, holding back the last 6 weeks of prices."""
+        from src.extract import raw_store
+
+        raw = str(marts_env["raw"])
+        frames = {}
+        for path in marts_env["raw"].glob("*.parquet"):
+            frames[path.name] = pd.read_parquet(path)
+            path.unlink()
+        raw_store.write_raw(frames["ecb_fx_eur_usd.parquet"], "ecb", raw_dir=raw)
+        raw_store.write_raw(frames["insee_cpi_france.parquet"], "insee", raw_dir=raw)
+        raw_store.write_raw(frames["openfoodfacts_products.parquet"], "openfoodfacts", raw_dir=raw)
+        prices = frames["commodities_prices.parquet"]
+        cutoff = prices["date"].max() - pd.Timedelta(weeks=6)
+        raw_store.write_raw(prices[prices["date"] <= cutoff], "commodities", "append",
+                            ["commodity", "date"], raw_dir=raw)
+        return frames, cutoff
+
+    def _assert_matches_full_build(self, marts_env, tmp_path, monkeypatch):
+        full = tmp_path / "full_marts"
+        monkeypatch.setattr(build_marts, "MARTS_DIR", str(full))
+        build_marts.build_marts()
+        for name in self.MARTS:
+            patched = pd.read_parquet(marts_env["marts"] / f"{name}.parquet")
+            rebuilt = pd.read_parquet(full / f"{name}.parquet")
+            pd.testing.assert_frame_equal(patched, rebuilt, check_exact=False, obj=name)
+
+    def test_appended_prices_patch_only_commodity_marts(self, marts_env, tmp_path, monkeypatch, capsys):
+        from src.extract import raw_store
+
+        frames, cutoff = self._lake(marts_env)
+        build_marts.build_marts(incremental=True)
+        inflation_mtime = (marts_env["marts"] / "fact_inflation.parquet").stat().st_mtime_ns
+
+        prices = frames["commodities_prices.parquet"]
+        tail = prices[(prices["date"] >= cutoff - pd.Timedelta(weeks=2)) & (prices["commodity"] != "Wheat")]
+        raw_store.write_raw(tail.assign(price_usd=tail["price_usd"] * 1.1), "commodities", "append",
+                            ["commodity", "date"], raw_dir=str(marts_env["raw"]))
+        capsys.readouterr()
+        build_marts.build_marts(incremental=True)
+
+        out = capsys.readouterr().out
+        assert "Patching fact_commodities (3 partitions)" in out
+        assert "fact_inflation unchanged — skipped." in out and "dim_product unchanged — skipped." in out
+        assert (marts_env["marts"] / "fact_inflation.parquet").stat().st_mtime_ns == inflation_mtime
+        self._assert_matches_full_build(marts_env, tmp_path, monkeypatch)
+
+    def test_restated_snapshot_is_diffed_against_stored_fact(self, marts_env, tmp_path, monkeypatch, capsys):
+        from src.extract import raw_store
+
+        frames, _ = self._lake(marts_env)
+        build_marts.build_marts(incremental=True)
+
+        cpi = frames["insee_cpi_france.parquet"].copy()
+        restated = (cpi["category"] == "Bread & Cereals") & (cpi["date"] >= cpi["date"].max() - pd.DateOffset(months=20))
+        cpi.loc[restated, "cpi_index"] += 0.5
+        raw_store.write_raw(cpi, "insee", raw_dir=str(marts_env["raw"]))
+        capsys.readouterr()
+        build_marts.build_marts(incremental=True)
+
+        out = capsys.readouterr().out
+        assert "Patching fact_inflation (1 partitions)" in out
+        assert "Patching mart_category_pressure (1 category/commodity pairs)" in out
+        assert "fact_commodities unchanged — skipped." in out
+        self._assert_matches_full_build(marts_env, tmp_path, monkeypatch)
+
+
+class TestWarehouse:
+
+    def test_warehouse_tables_match_parquet_build(self, marts_env, tmp_path, monkeypatch):
+        import duckdb
+
+        db = str(tmp_path / "warehouse.duckdb")
+        build_marts.build_marts(warehouse=db)
+        with duckdb.connect(db, read_only=True) as con:
+            tables = {row[0] for row in con.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+        assert tables == set(build_marts.MART_ORDER)
+
+        published = {name: pd.read_parquet(marts_env["marts"] / f"{name}.parquet") for name in tables}
+        plain = tmp_path / "plain_marts"
+        monkeypatch.setattr(build_marts, "MARTS_DIR", str(plain))
+        build_marts.build_marts()
+        for name, df in published.items():
+            rebuilt = pd.read_parquet(plain / f"{name}.parquet")
+            if name == "dim_product":
+                df, rebuilt = (d.sort_values("product_id", ignore_index=True) for d in (df, rebuilt))
+            pd.testing.assert_frame_equal(df, rebuilt, check_exact=False, obj=name)
+
+    def test_incremental_patch_in_place(self, marts_env, tmp_path, capsys):
+        from src.extract import raw_store
+        from src.transform.warehouse import read_mart
+
+        db = str(tmp_path / "warehouse.duckdb")
+        build_marts.build_marts(warehouse=db)
+        prices = pd.read_parquet(marts_env["raw"] / "commodities_prices.parquet")
+        last = prices["date"].max()
+        new_week = pd.DataFrame({"date": [last + pd.Timedelta(weeks=1)], "price_usd": [9.0], "commodity": ["Wheat"]})
+        raw_store.write_raw(pd.concat([prices, new_week]), "commodities", "append",
+                            ["commodity", "date"], raw_dir=str(marts_env["raw"]))
+        capsys.readouterr()
+        build_marts.build_marts(incremental=True, warehouse=db)
+
+        out = capsys.readouterr().out
+        assert "Publishing fact_commodities.parquet" in out and "Publishing fact_fx.parquet" not in out
+        wheat = read_mart("fact_commodities", ["date", "price_usd"], "commodity = ?", ["Wheat"], path=db)
+        assert len(wheat) == len(prices[prices["commodity"] == "Wheat"]) + 1
+        assert wheat.sort_values("date")["price_usd"].iloc[-1] == 9.0
+        assert len(pd.read_parquet(marts_env["marts"] / "fact_commodities.parquet")) == len(prices) + 1
+
+    def test_read_mart_falls_back_to_parquet(self, marts_env, tmp_path):
+        from src.transform.warehouse import has_mart, read_mart
+
+        build_marts.build_marts()
+        missing_db = str(tmp_path / "none.duckdb")
+        df = read_mart("fact_inflation", ["date", "yoy_inflation_pct"], "category = ?", ["Meat"],
+                       path=missing_db, marts_dir=str(marts_env["marts"]))
+        assert list(df.columns) == ["date", "yoy_inflation_pct"] and len(df) == 66
+        assert not has_mart("mart_scenarios", path=missing_db, marts_dir=str(marts_env["marts"]))
+
+    def test_read_mart_while_a_build_holds_the_warehouse(self, marts_env, tmp_path):
+        import subprocess
+        import sys
+
+        from src.transform.warehouse import has_mart, read_mart
+
+        build_marts.build_marts()
+        db = str(tmp_path / "warehouse.duckdb")
+        writer = subprocess.Popen(
+            [sys.executable, "-c", f"import duckdb, sys; con = duckdb.connect({db!r}); "
+                                   "con.execute('CREATE TABLE fact_fx AS SELECT 1 AS x'); print(flush=True); "
+                                   "sys.stdin.read()"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        try:
+            writer.stdout.readline()
+            df = read_mart("fact_fx", path=db, marts_dir=str(marts_env["marts"]))
+            assert "fx_eur_usd" in df.columns
+            assert has_mart("fact_fx", path=db, marts_dir=str(marts_env["marts"]))
+        finally:
+            writer.communicate()
+
+
+class TestMartDag:
+
+    def test_unchanged_nodes_are_skipped(self, marts_env, capsys):
+        build_marts.build_marts()
+        capsys.readouterr()
+        build_marts.build_marts()
+        out = capsys.readouterr().out
+        for name in build_marts.NODES:
+            assert f"{name} unchanged — skipped." in out
+            assert f"  {name:<24} skipped" in out
+        assert "total (wall clock)" in out
+
+        build_marts.build_marts(force=True)
+        assert "skipped" not in capsys.readouterr().out
+
+    def test_sql_change_rebuilds_node_and_dependents_only(self, marts_env, monkeypatch, capsys):
+        build_marts.build_marts()
+        monkeypatch.setattr(build_marts, "CATEGORY_COMMODITY_MAP", build_marts.CATEGORY_COMMODITY_MAP[:2])
+        capsys.readouterr()
+        build_marts.build_marts(incremental=True)
+
+        out = capsys.readouterr().out
+        assert "Building mart_category_pressure..." in out
+        assert "fact_commodities unchanged — skipped." in out
+        pressure = pd.read_parquet(marts_env["marts"] / "mart_category_pressure.parquet")
+        assert set(pressure["inflation_category"]) == {"Coffee, Tea, Cocoa"}
+
+    def test_layout_and_order_changes_rebuild_the_node(self, marts_env, monkeypatch, capsys):
+        build_marts.build_marts()
+        monkeypatch.setitem(build_marts.MART_LAYOUT, "dim_date", {"row_group_size": 64})
+        monkeypatch.setitem(build_marts.MART_ORDER, "mart_momentum", "date, commodity")
+        capsys.readouterr()
+        build_marts.build_marts(incremental=True)
+
+        out = capsys.readouterr().out
+        assert "Building dim_date..." in out and "Building mart_momentum..." in out
+        assert "fact_commodities unchanged — skipped." in out
+        momentum = pd.read_parquet(marts_env["marts"] / "mart_momentum.parquet")
+        assert momentum["date"].is_monotonic_increasing
+
+    def test_independent_nodes_run_concurrently(self, marts_env, monkeypatch):
+        import threading
+        import time
+
+        active, peak, lock = [0], [0], threading.Lock()
+        run_node = build_marts._run_node
+
+        def tracked(*args):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            try:
+                return run_node(*args)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        monkeypatch.setattr(build_marts, "_run_node", tracked)
+        build_marts.build_marts()
+        assert peak[0] >= 3
+        assert (marts_env["marts"] / "mart_momentum.parquet").exists()
+
+
+class TestFeatureEngine:
+
+    SPEC = {
+        "columns": ["date", "series", "value"], "partition_by": ["series"], "value": "value",
+        "features": {
+            "chg_1": ("pct_change", 1),
+            "chg_3": ("pct_change", 3),
+            "mean_4": ("rolling_mean", 4),
+            "std_4": ("rolling_std", 4),
+            "min_4": ("rolling_min", 4),
+            "max_4": ("rolling_max", 4),
+            "z_4": ("zscore", 4),
+            "dd_5": ("drawdown", 5),
+        },
+    }
+
+    def test_features_match_pandas(self):
+        import duckdb
+        import numpy as np
+
+        from src.transform.features import compile_features
+
+        rng = np.random.default_rng(1)
+        df = pd.concat([
+            pd.DataFrame({"date": pd.date_range("2024-01-01", periods=30, freq="W-MON"),
+                          "series": name, "value": 100 * np.exp(np.cumsum(rng.normal(0, 0.05, 30)))})
+            for name in ["a", "b"]
+        ], ignore_index=True)
+        out = duckdb.sql(f"{compile_features(self.SPEC, 'df')} ORDER BY series, date").df()
+
+        g = df.groupby("series")["value"]
+        roll = lambda fn: g.transform(lambda s: getattr(s.rolling(4, min_periods=1), fn)())
+        expected = {
+            "chg_1": g.pct_change(1) * 100,
+            "chg_3": g.pct_change(3) * 100,
+            "mean_4": roll("mean"),
+            "std_4": roll("std"),
+            "min_4": roll("min"),
+            "max_4": roll("max"),
+            "z_4": (df["value"] - roll("mean")) / roll("std"),
+            "dd_5": (df["value"] / g.transform(lambda s: s.rolling(5, min_periods=1).max()) - 1) * 100,
+        }
+        assert list(out.columns) == ["date", "series", "value", *self.SPEC["features"]]
+        for name, values in expected.items():
+            np.testing.assert_allclose(out[name].to_numpy(dtype=float), values.to_numpy(dtype=float),
+                                       rtol=1e-9, equal_nan=True, err_msg=name)
+
+    def test_shared_aggregates_are_computed_once(self):
+        from src.transform.features import compile_features, feature_lookback
+
+        sql = compile_features(self.SPEC, "t")
+        assert sql.count("WINDOW ") == 1
+        assert sql.count("AVG(value) OVER") == 1  # mean_4 and z_4 share it
+        assert sql.count("MAX(value) OVER") == 2  # 4- and 5-row frames
+        assert sql.count("LAG(value, 1) OVER") == 1
+        assert feature_lookback(self.SPEC) == 4
+        assert feature_lookback(build_marts.FEATURES["fact_commodities"]) == 52
+
+
+class TestCommodityClassifier:
+
+    PRODUCTS = pd.DataFrame({
+        "product_id": ["1", "2", "3", "4", "5"],
+        "categories": ["Snacks sucrés, Chocolats, Chocolats noirs", "Cafés moulus", "Pains, Pains de mie",
+                       "Boissons, Eaux", "Céréales pour petit-déjeuner"],
+        "ingredients_text": ["Pâte de cacao, sucre, beurre de cacao", "café arabica",
+                             "Farine de BLE, eau, sel, levure", None, "flocons d'avoine, sucre, chocolat"],
+    })
+
+    def test_multi_label_weights(self):
+        from src.transform.commodity_classifier import classify_products
+
+        bridge = classify_products(self.PRODUCTS).set_index(["product_id", "commodity"])["weight"]
+        assert bridge.groupby(level=0).sum().round(9).eq(1).all()
+        assert bridge["1"].to_dict() == pytest.approx({"Cocoa": 2 / 3, "Sugar": 1 / 3})
+        assert bridge["3"].to_dict() == {"Wheat": 1.0}
+        # Oat breakfast cereals: "céréales" alone says nothing about wheat.
+        assert bridge["5"].to_dict() == pytest.approx({"Sugar": 0.5, "Cocoa": 0.5})
+        assert "4" not in bridge.index.get_level_values(0)
+
+    def test_negations_and_other_grains(self):
+        from src.transform.commodity_classifier import classify_products
+
+        products = pd.DataFrame({
+            "product_id": ["y", "g", "r", "f"],
+            "categories": ["Yaourts sans sucres ajoutés", "Biscuits sans gluten", "Galettes de riz",
+                           "Pains, Pains de mie"],
+            "ingredients_text": ["lait entier, ferments lactiques", "farine de riz, sucre, huile",
+                                 "riz complet, farine de maïs", "Farine, eau, sel"],
+        })
+        bridge = classify_products(products).set_index(["product_id", "commodity"])["weight"]
+        assert "y" not in bridge.index.get_level_values(0)
+        assert bridge["g"].to_dict() == {"Sugar": 1.0}
+        assert "r" not in bridge.index.get_level_values(0)
+        assert bridge["f"].to_dict() == {"Wheat": 1.0}
+
+    def test_parallel_chunks_match_single_pass(self):
+        from src.transform.commodity_classifier import classify_products
+
+        many = pd.concat([self.PRODUCTS.assign(product_id=self.PRODUCTS["product_id"] + f"-{i}") for i in range(40)],
+                         ignore_index=True)
+        serial = classify_products(many, workers=1).sort_values(["product_id", "commodity"], ignore_index=True)
+        parallel = classify_products(many, workers=2, chunk_size=37).sort_values(["product_id", "commodity"],
+                                                                                 ignore_index=True)
+        pd.testing.assert_frame_equal(serial, parallel)
+
+    def test_dim_product_uses_bridge(self, marts_env):
+        partition = marts_env["raw"] / "openfoodfacts_dump" / "country=france"
+        partition.mkdir(parents=True)
+        self.PRODUCTS.assign(product_name="x", brand="b", category=self.PRODUCTS["categories"].str.split(",").str[0],
+                             nutriscore="A", origin_country="France").to_parquet(partition / "part-00000.parquet")
+
+        build_marts.build_marts()
+        dim = pd.read_parquet(marts_env["marts"] / "dim_product.parquet").sort_values("product_id")
+        assert dim["primary_commodity_exposure"].tolist() == ["Cocoa", "Coffee", "Wheat", "Other", "Cocoa"]
+        bridge = pd.read_parquet(marts_env["marts"] / "bridge_product_commodity.parquet")
+        assert len(bridge[bridge["product_id"] == "5"]) == 2
+
+
+class TestPassthrough:
+
+    @staticmethod
+    def series(seed=11, months=72):
+        rng = np.random.default_rng(seed)
+        index = pd.date_range("2019-01-01", periods=months, freq="MS")
+        commodities = pd.DataFrame(rng.normal(0, 10, (months, 3)), index=index, columns=["Cocoa", "Coffee", "Wheat"])
+        # Food CPI follows Wheat 6 months later at 0.3x; a second category is noise.
+        inflation = pd.DataFrame({
+            "Bread & Cereals": 0.3 * commodities["Wheat"].shift(6) + rng.normal(0, 0.1, months),
+            "Meat": rng.normal(0, 1, months),
+        }, index=index)
+        inflation.iloc[:3] = float("nan")
+        commodities.iloc[-5:, 0] = float("nan")
+        return inflation, commodities
+
+    def test_matches_pairwise_pandas(self):
+        from src.transform.passthrough import lagged_passthrough
+
+        inflation, commodities = self.series()
+        result = lagged_passthrough(inflation, commodities, max_lag=18)
+        assert len(result) == 2 * 3 * 19
+        for row in result.sample(20, random_state=0).itertuples():
+            y = inflation[row.inflation_category]
+            x = commodities[row.commodity].shift(row.lag_months)
+            both = pd.concat([y, x], axis=1).dropna()
+            assert row.n_obs == len(both)
+            assert row.correlation == pytest.approx(both.iloc[:, 0].corr(both.iloc[:, 1]))
+            assert row.passthrough_ratio == pytest.approx(both.cov().iloc[0, 1] / both.iloc[:, 1].var())
+
+    def test_recovers_lag_and_ratio(self):
+        from src.transform.passthrough import lagged_passthrough
+
+        inflation, commodities = self.series()
+        pair = lagged_passthrough(inflation, commodities).query(
+            "inflation_category == 'Bread & Cereals' and commodity == 'Wheat'")
+        peak = pair.loc[pair["correlation"].idxmax()]
+        assert peak["lag_months"] == 6
+        assert peak["passthrough_ratio"] == pytest.approx(0.3, abs=0.01)
+
+    def test_mart_covers_every_pair(self, marts_env):
+        build_marts.build_marts()
+        mart = pd.read_parquet(marts_env["marts"] / "mart_passthrough_lags.parquet")
+        pairs = mart[["inflation_category", "commodity"]].drop_duplicates()
+        assert len(pairs) == 8 * 4
+        assert mart["lag_months"].between(0, 18).all()
+        assert mart.groupby(["inflation_category", "commodity"])["is_peak_lag"].sum().eq(1).all()
+        assert set(map(tuple, mart.loc[mart["mapped"], ["inflation_category", "commodity"]].drop_duplicates()
+                       .to_numpy())) == set(build_marts.CATEGORY_COMMODITY_MAP)
+
+    def test_peak_lag_ties_pick_the_shortest_lag(self):
+        import duckdb
+
+        con = duckdb.connect()
+        con.register("passthrough", pd.DataFrame({
+            "inflation_category": "Meat", "commodity": "Cocoa", "lag_months": [0, 1, 2, 3],
+            "n_obs": 60, "correlation": [0.4, 0.9, 0.9, None], "passthrough_ratio": 0.1}))
+        mart = con.sql(build_marts._passthrough_sql(None)).df().sort_values("lag_months")
+        assert mart["is_peak_lag"].tolist() == [False, True, False, False]
+
+    def test_rolling_regression_matches_lstsq(self):
+        from src.transform.passthrough import rolling_passthrough
+
+        inflation, commodities = self.series()
+        fx = pd.Series(np.random.default_rng(5).normal(0, 5, len(inflation)), index=inflation.index)
+        lags = pd.DataFrame({"inflation_category": ["Bread & Cereals", "Meat"], "commodity": ["Wheat", "Cocoa"],
+                             "lag_months": [6, 2]})
+        result = rolling_passthrough(inflation, commodities, fx, lags, window=24, min_obs=18)
+        assert result.groupby("inflation_category")["date"].min().to_dict() == {
+            "Bread & Cereals": pd.Timestamp("2020-12-01"), "Meat": pd.Timestamp("2020-12-01")}
+        for row in result.sample(10, random_state=1).itertuples():
+            months = pd.date_range(end=row.date, periods=24, freq="MS")
+            data = pd.concat([inflation[row.inflation_category], commodities[row.commodity].shift(row.lag_months),
+                              fx], axis=1).loc[months].dropna().to_numpy()
+            design = np.column_stack([np.ones(len(data)), data[:, 1:]])
+            coef = np.linalg.lstsq(design, data[:, 0], rcond=None)[0]
+            assert row.n_obs == len(data)
+            assert [row.intercept, row.elasticity, row.fx_elasticity] == pytest.approx(coef)
+        wheat = result[result["commodity"] == "Wheat"]
+        assert wheat["elasticity"].between(0.28, 0.32).all()
+        assert wheat["r_squared"].gt(0.99).all()
+
+    def test_pass_through_mart_uses_peak_lags(self, marts_env):
+        build_marts.build_marts()
+        marts = marts_env["marts"]
+        rolling = pd.read_parquet(marts / "mart_pass_through.parquet")
+        peaks = pd.read_parquet(marts / "mart_passthrough_lags.parquet").query("is_peak_lag")
+        assert len(rolling) > 0
+        merged = rolling.merge(peaks, on=["inflation_category", "commodity"], suffixes=("", "_peak"))
+        assert len(merged) == len(rolling)
+        assert (merged["lag_months"] == merged["lag_months_peak"]).all()
+        assert rolling["n_obs"].between(18, 24).all()
+
+
+class TestSqueezeScenarios:
+
+    EXPOSURE = pd.DataFrame({"Cocoa": [0.5, 0.0], "Coffee": [0.5, 0.0], "Wheat": [0.0, 1.0]},
+                            index=["Coffee, Tea, Cocoa", "Bread & Cereals"])
+    CPI_YOY = pd.Series({"Coffee, Tea, Cocoa": 2.0, "Bread & Cereals": 1.0})
+
+    @staticmethod
+    def prices(seed=3, months=60):
+        rng = np.random.default_rng(seed)
+        index = pd.date_range("2020-01-01", periods=months, freq="MS")
+        returns = rng.normal(0.005, [0.08, 0.06, 0.05, 0.02], (months, 4))
+        return pd.DataFrame(np.exp(np.cumsum(returns, axis=0)) * [3000, 2.5, 6, 1.1], index=index,
+                            columns=["Cocoa", "Coffee", "Wheat", "fx_eur_usd"])
+
+    def test_seeded_and_independent_of_workers(self):
+        from src.transform.scenarios import simulate_squeeze
+
+        args = (self.prices(), self.EXPOSURE, self.CPI_YOY)
+        serial = simulate_squeeze(*args, paths=4_000, shard_size=1_000, seed=7)
+        pooled = simulate_squeeze(*args, paths=4_000, shard_size=1_000, seed=7, workers=2)
+        pd.testing.assert_frame_equal(serial, pooled)
+        assert not simulate_squeeze(*args, paths=4_000, shard_size=1_000, seed=8).equals(serial)
+        quantiles = serial[["p05_squeeze", "p25_squeeze", "p50_squeeze", "p75_squeeze", "p95_squeeze"]]
+        assert (quantiles.diff(axis=1).iloc[:, 1:] >= 0).all().all()
+        assert len(serial) == 2 * 3
+
+    def test_constant_growth_gives_exact_squeeze(self):
+        from src.transform.scenarios import simulate_squeeze
+
+        index = pd.date_range("2020-01-01", periods=24, freq="MS")
+        growth = np.exp(0.01 * np.arange(24))
+        prices = pd.DataFrame({"Cocoa": growth, "Coffee": growth, "Wheat": growth, "fx_eur_usd": 1.0}, index=index)
+        for method in ["bootstrap", "gbm"]:
+            result = simulate_squeeze(prices, self.EXPOSURE, self.CPI_YOY, paths=500, method=method)
+            expected = (np.exp(0.12) - 1) * 100 - result["cpi_yoy_pct"]
+            for column in ["mean_squeeze", "p05_squeeze", "p95_squeeze"]:
+                assert result[column].to_numpy() == pytest.approx(expected.to_numpy())
+        with pytest.raises(ValueError):
+            simulate_squeeze(prices, self.EXPOSURE, self.CPI_YOY, paths=10, method="heston")
+
+    def test_exposure_renormalised_over_priced_commodities(self):
+        from src.transform.scenarios import simulate_squeeze
+
+        index = pd.date_range("2020-01-01", periods=24, freq="MS")
+        prices = pd.DataFrame({"Cocoa": np.exp(0.01 * np.arange(24)), "Wheat": 1.0, "fx_eur_usd": 1.0}, index=index)
+        exposure = pd.concat([self.EXPOSURE, pd.DataFrame({"Sugar": [1.0]}, index=["Sugar & Confectionery"])])
+        cpi_yoy = pd.concat([self.CPI_YOY, pd.Series({"Sugar & Confectionery": 3.0})])
+        result = simulate_squeeze(prices, exposure, cpi_yoy, horizons=(12,), paths=100).set_index(
+            "inflation_category")
+        # Coffee has no prices: Cocoa carries the whole weight of its category; Sugar's category is left out.
+        assert list(result.index) == ["Coffee, Tea, Cocoa", "Bread & Cereals"]
+        assert result["mean_squeeze"].to_dict() == pytest.approx({
+            "Coffee, Tea, Cocoa": (np.exp(0.12) - 1) * 100 - 2.0, "Bread & Cereals": -1.0})
+
+    def test_scenario_mart(self, marts_env):
+        build_marts.build_marts()
+        mart = pd.read_parquet(marts_env["marts"] / "mart_squeeze_scenarios.parquet")
+        categories = {category for category, _ in build_marts.CATEGORY_COMMODITY_MAP}
+        assert set(mart["inflation_category"]) == categories
+        assert len(mart) == len(categories) * len(build_marts.SCENARIOS["horizons"])
+        assert mart["prob_squeeze"].between(0, 1).all()
+
+
+class TestMartLayout:
+
+    def test_sorted_zstd_layout(self, marts_env):
+        import pyarrow.parquet as pq
+
+        build_marts.build_marts()
+        path = marts_env["marts"] / "mart_category_pressure.parquet"
+        meta = pq.ParquetFile(path).metadata
+        assert meta.row_group(0).column(0).compression == "ZSTD"
+        # Rows are clustered on the sort key, so row-group min/max stats are selective.
+        df = pd.read_parquet(path)
+        keys = list(zip(df["inflation_category"], df["commodity"], df["date"]))
+        assert keys == sorted(keys)
+
+    def test_partitioned_mart_and_filtered_reads(self, marts_env, monkeypatch):
+        from src.transform.warehouse import read_mart
+
+        monkeypatch.setitem(build_marts.MART_LAYOUT, "fact_commodities", {"partition_by": "commodity"})
+        build_marts.build_marts()
+        marts = marts_env["marts"]
+        assert (marts / "fact_commodities.parquet").is_dir()
+        assert len(list((marts / "fact_commodities.parquet").glob("commodity=*"))) == 4
+        # Dependent marts read the partitioned directory.
+        assert len(pd.read_parquet(marts / "mart_momentum.parquet")) == 4 * 16
+
+        cocoa = read_mart("fact_commodities", ["date", "price_usd"], "commodity = ?", ["Cocoa"], marts_dir=str(marts))
+        full = read_mart("fact_commodities", marts_dir=str(marts))
+        expected = full[full["commodity"] == "Cocoa"].sort_values("date")
+        assert cocoa["price_usd"].tolist() == expected["price_usd"].tolist()
+
+        # Switching back to a single file replaces the directory.
+        monkeypatch.setitem(build_marts.MART_LAYOUT, "fact_commodities", {})
+        build_marts.build_marts(force=True)
+        assert (marts / "fact_commodities.parquet").is_file()